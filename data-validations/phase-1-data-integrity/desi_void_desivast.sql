@@ -142,6 +142,8 @@ CREATE INDEX "idx_desivast_voids_algorithm" ON "raw_catalogs"."desivast_voids" U
 
 CREATE INDEX "idx_desivast_voids_radius" ON "raw_catalogs"."desivast_voids" USING BTREE ("radius_mpc_h");
 
+CREATE INDEX "idx_desivast_voids_source_file" ON "raw_catalogs"."desivast_voids" USING BTREE ("source_file", "ingestion_timestamp");
+
 COMMENT ON TABLE "raw_catalogs"."desivast_voids" IS 'Unified table containing cosmic void properties from all DESIVAST algorithms (REVOLVER, VIDE, ZOBOV, VoidFinder).';
 
 COMMENT ON COLUMN "raw_catalogs"."desivast_voids"."void_id" IS 'Unique serial identifier for each void entry in the database.';
@@ -30,6 +30,10 @@ CREATE TABLE "raw_catalogs"."fastspecfit_galaxies" (
   "age_gyr" float4,
   "metallicity" float4,
   "d4000" float4,
+  "x_mpc_h" float8,
+  "y_mpc_h" float8,
+  "z_mpc_h" float8,
+  "edge_distance_deg" float4,
   "healpix_id" int4 NOT NULL,
   "source_file" varchar(255) NOT NULL,
   "ingestion_timestamp" timestamptz DEFAULT (now())
@@ -49,6 +53,8 @@ CREATE INDEX "idx_fastspecfit_galaxies_sfr" ON "raw_catalogs"."fastspecfit_galax
 
 CREATE INDEX "idx_fastspecfit_galaxies_z" ON "raw_catalogs"."fastspecfit_galaxies" USING BTREE ("z");
 
+CREATE INDEX "idx_fastspecfit_galaxies_source_file" ON "raw_catalogs"."fastspecfit_galaxies" USING BTREE ("source_file", "ingestion_timestamp");
+
 COMMENT ON TABLE "raw_catalogs"."fastspecfit_galaxies" IS 'Galaxy properties from the DESI DR1 FastSpecFit catalog, containing over 6 million objects.';
 
 COMMENT ON COLUMN "raw_catalogs"."fastspecfit_galaxies"."targetid" IS 'Unique DESI target identifier (64-bit integer).';
@@ -57,4 +63,8 @@ COMMENT ON COLUMN "raw_catalogs"."fastspecfit_galaxies"."logmstar" IS 'Log10 of
 
 COMMENT ON COLUMN "raw_catalogs"."fastspecfit_galaxies"."sfr" IS 'Star Formation Rate in solar mass per year units.';
 
+COMMENT ON COLUMN "raw_catalogs"."fastspecfit_galaxies"."x_mpc_h" IS 'Comoving Cartesian x in Mpc/h, in the DESIVAST frame (flat LCDM, Omega_m = 0.315).';
+
+COMMENT ON COLUMN "raw_catalogs"."fastspecfit_galaxies"."edge_distance_deg" IS 'Angular distance in degrees to the survey footprint edge, from an NSIDE=256 HEALPix occupancy map.';
+
 COMMENT ON COLUMN "raw_catalogs"."fastspecfit_galaxies"."healpix_id" IS 'The HEALPix pixel number of the source file.';
@@ -129,7 +129,7 @@ def main():
         logging.info(f"Reading FastSpecFit data from {FASTSPEC_FILE}...")
         # Use astropy.io.fits to open the FITS file. The data is typically in the first extension (HDU 1).
         with fits.open(FASTSPEC_FILE) as hdul:
-            fastspec_data = hdul.[1]data
+            fastspec_data = hdul[1].data
             # Convert the FITS binary table data into a pandas DataFrame.
             df_fastspec = pd.DataFrame(fastspec_data)
         logging.info(f"Read {len(df_fastspec)} rows from FastSpecFit catalog.")
@@ -147,7 +147,7 @@ def main():
     try:
         logging.info(f"Reading DESIVAST data from {DESIVAST_FILE}...")
         with fits.open(DESIVAST_FILE) as hdul:
-            desivast_data = hdul.[1]data
+            desivast_data = hdul[1].data
             df_desivast = pd.DataFrame(desivast_data)
         logging.info(f"Read {len(df_desivast)} rows from DESIVAST catalog.")
 
@@ -17,7 +17,9 @@
 #   - Iterative Processing: Efficiently loops through all FastSpecFit FITS files in a
 #     specified directory.
 #   - In-Memory Transformation: Uses pandas and NumPy for rapid in-memory data manipulation,
-#     including column selection and error calculation from inverse variances.
+#     including column selection, error calculation from inverse variances, comoving
+#     Cartesian coordinates from a cached distance-redshift interpolator, and each galaxy's
+#     distance to the survey footprint edge from a precomputed HEALPix map.
 #   - High-Performance Loading: Leverages the PostgreSQL `COPY FROM` command via an in-memory
 #     buffer (`StringIO`) for bulk data ingestion. This method is orders of magnitude faster
 #     than traditional row-by-row INSERTs, which is essential for large astronomical datasets.
@@ -25,6 +27,10 @@
 #     `config.ini` file, separating configuration from code.
 #   - Robustness: Includes error handling for missing files, corrupted FITS files, and
 #     database transaction integrity with commit/rollback logic.
+#   - Inline Validation: Stage 1 metrics (NULL counts, min/max, range violations including
+#     non-positive IVAR, duplicate TARGETIDs) are computed per file as the data streams through
+#     and persisted per `source_file` in `raw_catalogs.ingestion_metrics`, so the Stage 1
+#     validator can read them instead of rescanning the table.
 #   - Dry Run Mode: A `--dry-run` command-line flag allows for a full simulation of the ETL
 #     process without making any changes to the database, facilitating testing and validation.
 #
@@ -47,6 +53,23 @@ import psycopg2
 from astropy.io import fits
 from astropy.table import Table
 
+# The comoving-distance interpolator is shared with the Phase 4 spatial tools so that galaxy
+# positions are persisted in exactly the frame the classifiers use.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'environmental-classification'))
+from cosmology_distances import redshift_to_cartesian
+from survey_footprint import SurveyFootprint
+from ingest_metrics import POSITIVE, IngestMetrics, clear_metrics, store_metrics
+
+# Allowed ranges for the inline Stage 1 metrics. IVARs are validated from the source columns,
+# since only the derived errors are loaded.
+FASTSPEC_RANGES = {
+    'ra': (0.0, 360.0),
+    'dec': (-90.0, 90.0),
+    'z': (0.0, np.inf),
+    'logmstar_ivar': (POSITIVE, np.inf),
+    'sfr_ivar': (POSITIVE, np.inf),
+}
+
 # --- HELPER FUNCTIONS ---
 # These functions encapsulate specific, reusable tasks like database configuration,
 # error calculation, and the core data loading mechanism.
@@ -104,11 +127,14 @@ def copy_from_stringio(df, db_name, table_name, dry_run=False):
         db_name (str): The name of the target database.
         table_name (str): The fully-qualified name of the target table (e.g., 'schema.table').
         dry_run (bool): If True, simulates the operation without writing to the database.
+
+    Returns:
+        bool: True if the rows were loaded (or would have been, in a dry run).
     """
     if dry_run:
         # In a dry run, simply report the action that would have been taken.
         print(f"  [DRY RUN] Would COPY {len(df)} rows into '{table_name}'")
-        return
+        return True
 
     # Create an in-memory text buffer (acting as a virtual file).
     buffer = StringIO()
@@ -142,17 +168,86 @@ def copy_from_stringio(df, db_name, table_name, dry_run=False):
             cursor.copy_expert(sql_command, buffer)
         # If the COPY command succeeds, commit the transaction to make the changes permanent.
         conn.commit()
+        return True
     except (Exception, psycopg2.DatabaseError) as error:
         # If any database error occurs during the process...
         print(f"Error during COPY for table {table_name}: {error}", file=sys.stderr)
         if conn:
             # ...roll back the transaction to leave the database in a clean state.
             conn.rollback()
+        return False
     finally:
         # Ensure the database connection is always closed, even if errors occurred.
         if conn:
             conn.close()
 
+def persist_metrics(metrics, db_name, table_name, source_file, dry_run=False):
+    """
+    Stores one file's inline validation metrics in `raw_catalogs.ingestion_metrics`.
+
+    Args:
+        metrics (IngestMetrics): The file's metrics.
+        db_name (str): The name of the target database.
+        table_name (str): The table the file was loaded into.
+        source_file (str): The file's name, as stored in the `source_file` column.
+        dry_run (bool): If True, the metrics are only reported.
+    """
+    if dry_run:
+        return
+
+    db_config = get_db_config()
+    conn = None
+    try:
+        conn = psycopg2.connect(
+            dbname=db_name,
+            user=db_config['user'],
+            password=db_config['password'],
+            host=db_config['host'],
+            port=db_config['port']
+        )
+        with conn.cursor() as cursor:
+            store_metrics(cursor, table_name, source_file, metrics)
+        conn.commit()
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error storing ingestion metrics for {source_file}: {error}", file=sys.stderr)
+        if conn:
+            conn.rollback()
+    finally:
+        if conn:
+            conn.close()
+
+def build_footprint(files, dry_run=False):
+    """
+    Builds the HEALPix survey footprint from the RA/Dec of every galaxy in `files`.
+
+    Only the METADATA RA and DEC columns are read (memory-mapped). The map is saved next to
+    the cosmology cache so the spatial analysis tools can reuse it.
+
+    Args:
+        files (list): Paths of the FastSpecFit FITS files.
+        dry_run (bool): If True, the map is only kept in memory and not saved.
+
+    Returns:
+        SurveyFootprint or None: The footprint, or None if healpy is not installed.
+    """
+    ra, dec = [], []
+    try:
+        for f_path in files:
+            with fits.open(f_path, memmap=True) as hdul:
+                ra.append(np.array(hdul['METADATA'].data['RA'], dtype=np.float64))
+                dec.append(np.array(hdul['METADATA'].data['DEC'], dtype=np.float64))
+        footprint = SurveyFootprint.from_positions(np.concatenate(ra), np.concatenate(dec))
+    except ImportError as error:
+        print(f"Warning: {error}. edge_distance_deg will be NULL.", file=sys.stderr)
+        return None
+    occupied = f"{footprint.mask.sum()} of {len(footprint.mask)} pixels occupied"
+    if dry_run:
+        print(f"[DRY RUN] Survey footprint built in memory: {occupied}, not saved")
+    else:
+        print(f"Survey footprint built: {occupied}, saved to {footprint.save()}")
+    return footprint
+
+
 # --- MAIN PROCESSOR FUNCTION ---
 
 def process_fastspecfit_files(base_path, db_name, dry_run=False):
@@ -183,8 +278,16 @@ def process_fastspecfit_files(base_path, db_name, dry_run=False):
                 port=db_config['port']
             )
             with conn.cursor() as cursor:
+                # Older deployments predate the persisted Cartesian coordinates; add them in place.
+                for col in ('x_mpc_h', 'y_mpc_h', 'z_mpc_h'):
+                    cursor.execute(f"ALTER TABLE {target_table} ADD COLUMN IF NOT EXISTS {col} DOUBLE PRECISION")
+                cursor.execute(f"ALTER TABLE {target_table} ADD COLUMN IF NOT EXISTS edge_distance_deg REAL")
+                # Per-file partitions are located through this index by incremental Stage 1 validation.
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_fastspecfit_galaxies_source_file "
+                               f"ON {target_table} (source_file, ingestion_timestamp)")
                 # `TRUNCATE TABLE` is faster than `DELETE FROM`. `RESTART IDENTITY` resets any auto-incrementing keys.
                 cursor.execute(f"TRUNCATE TABLE {target_table} RESTART IDENTITY")
+                clear_metrics(cursor, target_table)
             conn.commit()
             print("Table cleared successfully.")
         except (Exception, psycopg2.DatabaseError) as error:
@@ -202,11 +305,18 @@ def process_fastspecfit_files(base_path, db_name, dry_run=False):
         print(f"Error: No FastSpecFit files found in '{base_path}'.", file=sys.stderr)
         return
 
+    # Build the survey footprint from every galaxy's position before loading any file, so each
+    # galaxy's distance to the footprint edge is a single lookup during the main pass.
+    footprint = build_footprint(files, dry_run=dry_run)
+
     # Define the specific columns of scientific interest to extract.
     # This avoids loading unnecessary data, saving memory and disk space.
     meta_cols = ['TARGETID', 'RA', 'DEC', 'Z']
     specphot_cols = ['LOGMSTAR', 'LOGMSTAR_IVAR', 'SFR', 'SFR_IVAR', 'AGE', 'ZZSUN', 'DN4000']
 
+    # Metrics merged over every file, for the end-of-run summary and cross-file duplicates.
+    run_metrics = IngestMetrics(key_column='targetid')
+
     # Process each file individually.
     for i, f_path in enumerate(files):
         start_time = time.time()
@@ -247,17 +357,46 @@ def process_fastspecfit_files(base_path, db_name, dry_run=False):
                 df['metallicity'] = spec_table['ZZSUN']
                 df['d4000'] = spec_table['DN4000']
 
+                # Persist comoving Cartesian coordinates (Mpc/h) in the DESIVAST frame, matching
+                # the columns the void tables carry, so spatial analyses never recompute them.
+                xyz = redshift_to_cartesian(df['ra'].to_numpy(), df['dec'].to_numpy(), df['z'].to_numpy())
+                df['x_mpc_h'] = xyz[:, 0]
+                df['y_mpc_h'] = xyz[:, 1]
+                df['z_mpc_h'] = xyz[:, 2]
+
+                # Angular distance to the survey footprint edge (NULL when healpy is unavailable).
+                if footprint is not None:
+                    df['edge_distance_deg'] = footprint.edge_distance_at(df['ra'].to_numpy(), df['dec'].to_numpy())
+                else:
+                    df['edge_distance_deg'] = np.nan
+
                 # Add provenance columns to track the origin of each row.
                 # This is critical for data traceability and debugging.
                 df['healpix_id'] = int(file_name.split('hp')[-1].split('.')[0])
                 df['source_file'] = file_name
                 # --- End Transformation ---
 
+                # Inline validation on the in-memory chunk, before loading, so problems such as
+                # duplicate TARGETIDs are reported even when the database rejects the file. A
+                # file's duplicate count includes TARGETIDs already loaded from earlier files.
+                checked = df.drop(columns=['healpix_id', 'source_file'])
+                checked['logmstar_ivar'] = spec_table['LOGMSTAR_IVAR']
+                checked['sfr_ivar'] = spec_table['SFR_IVAR']
+                file_metrics = IngestMetrics.from_frame(checked, FASTSPEC_RANGES, key_column='targetid')
+                merged_metrics = run_metrics.merge(file_metrics)
+                file_metrics.duplicate_keys = merged_metrics.duplicate_keys - run_metrics.duplicate_keys
+                print(f"  > Inline validation: {file_metrics.summary()}")
+
                 # Load the processed DataFrame into the database.
-                copy_from_stringio(df, db_name, target_table, dry_run=dry_run)
+                if not copy_from_stringio(df, db_name, target_table, dry_run=dry_run):
+                    continue
                 if not dry_run:
                     print(f"  > Loaded {len(df)} rows into {target_table}.")
 
+                # Metrics are only kept for rows that were actually loaded.
+                run_metrics = merged_metrics
+                persist_metrics(file_metrics, db_name, target_table, file_name, dry_run=dry_run)
+
         except KeyError as e:
             # Handle cases where a FITS file is missing an expected column.
             print(f"Error processing file {file_name}: Missing expected column - {e}.", file=sys.stderr)
@@ -272,6 +411,7 @@ def process_fastspecfit_files(base_path, db_name, dry_run=False):
         rows_msg = f"{len(df)} rows found." if dry_run else f"{len(df)} rows loaded."
         print(f"  > {duration_msg} {rows_msg}")
 
+    print(f"Inline validation over {run_metrics.row_count} rows: {run_metrics.summary()}")
     print("--- FastSpecFit Ingestion Complete ---")
 
 
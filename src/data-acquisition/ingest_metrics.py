@@ -0,0 +1,188 @@
+#
+# =================================================================================================
+#
+# File: ingest_metrics.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Stage 1 integrity metrics computed while the ETLs stream data, so the validator does not
+#   have to rescan tables to find problems the ETL already had in memory.
+#
+#   For every chunk (one FITS file) the ETL builds an `IngestMetrics`: per column the row
+#   count, NULL/non-finite count, finite min/max and out-of-range count, plus the number of
+#   duplicate keys (e.g. TARGETID). Metrics are mergeable: counts add, extremes combine, and
+#   duplicates add together with the keys the two sides share, so chunks processed in any
+#   order or by any number of workers reduce to the same totals.
+#
+#   Each file's metrics are persisted to `raw_catalogs.ingestion_metrics`, one row per
+#   (table, source_file, column). A file's duplicate count includes keys already seen in
+#   earlier files, so summing the rows of a table gives exact table-wide totals.
+#
+# =================================================================================================
+#
+
+import numpy as np
+import pandas as pd
+from psycopg2.extras import execute_values
+
+METRICS_TABLE = "raw_catalogs.ingestion_metrics"
+
+METRICS_TABLE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {METRICS_TABLE} (
+    table_name TEXT NOT NULL,
+    source_file TEXT NOT NULL,
+    column_name TEXT NOT NULL,
+    row_count BIGINT NOT NULL,
+    null_count BIGINT NOT NULL,
+    min_value DOUBLE PRECISION,
+    max_value DOUBLE PRECISION,
+    range_violations BIGINT NOT NULL DEFAULT 0,
+    duplicate_keys BIGINT,
+    recorded_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (table_name, source_file, column_name)
+);
+"""
+
+# Lower bound for quantities that must be strictly positive (e.g. inverse variances).
+POSITIVE = np.finfo(np.float64).tiny
+
+
+def _column_metrics(values, value_range=None):
+    """
+    Computes one column's metrics.
+
+    Args:
+        values (array-like): The column's values.
+        value_range (tuple, optional): Inclusive (min, max) allowed for finite values.
+
+    Returns:
+        dict: 'rows', 'nulls', 'min', 'max' and 'violations'.
+    """
+    series = pd.Series(values)
+    if not pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_bool_dtype(series.dtype):
+        return {'rows': len(series), 'nulls': int(series.isna().sum()), 'min': None, 'max': None, 'violations': 0}
+
+    array = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    finite = array[np.isfinite(array)]
+    violations = 0
+    if value_range is not None and len(finite):
+        low, high = value_range
+        violations = int(np.count_nonzero((finite < low) | (finite > high)))
+    return {
+        'rows': len(array),
+        'nulls': int(len(array) - len(finite)),
+        'min': float(finite.min()) if len(finite) else None,
+        'max': float(finite.max()) if len(finite) else None,
+        'violations': violations,
+    }
+
+
+class IngestMetrics:
+    """
+    Mergeable Stage 1 metrics for a chunk of rows.
+
+    Args:
+        columns (dict): {column: metrics dict as produced by `_column_metrics`}.
+        key_column (str, optional): Column whose values must be unique.
+        keys (np.ndarray, optional): Sorted distinct values of `key_column`.
+        duplicate_keys (int): Rows whose key repeats one already counted.
+    """
+
+    def __init__(self, columns=None, key_column=None, keys=None, duplicate_keys=0):
+        self.columns = columns or {}
+        self.key_column = key_column
+        self.keys = keys if keys is not None else np.empty(0, dtype=np.int64)
+        self.duplicate_keys = int(duplicate_keys)
+
+    @classmethod
+    def from_frame(cls, df, ranges=None, key_column=None):
+        """
+        Computes the metrics of one chunk.
+
+        Args:
+            df (pd.DataFrame): The chunk, as it will be loaded (plus any source-only columns
+                worth validating, such as inverse variances).
+            ranges (dict, optional): {column: (min, max)} allowed for finite values.
+            key_column (str, optional): Column whose values must be unique.
+
+        Returns:
+            IngestMetrics: The chunk's metrics.
+        """
+        ranges = ranges or {}
+        columns = {col: _column_metrics(df[col], ranges.get(col)) for col in df.columns}
+        if key_column is None:
+            return cls(columns)
+        keys = np.unique(df[key_column].to_numpy())
+        return cls(columns, key_column, keys, len(df) - len(keys))
+
+    @property
+    def row_count(self):
+        return max((m['rows'] for m in self.columns.values()), default=0)
+
+    def shared_keys(self, other):
+        """Returns how many distinct keys appear in both `self` and `other`."""
+        return len(np.intersect1d(self.keys, other.keys, assume_unique=True))
+
+    def merge(self, other):
+        """
+        Combines two sets of metrics; the operation is associative and commutative.
+
+        Returns:
+            IngestMetrics: A new object covering the rows of both.
+        """
+        columns = {}
+        for col in self.columns.keys() | other.columns.keys():
+            a, b = self.columns.get(col), other.columns.get(col)
+            if a is None or b is None:
+                columns[col] = dict(a or b)
+                continue
+            columns[col] = {
+                'rows': a['rows'] + b['rows'],
+                'nulls': a['nulls'] + b['nulls'],
+                'min': min((v for v in (a['min'], b['min']) if v is not None), default=None),
+                'max': max((v for v in (a['max'], b['max']) if v is not None), default=None),
+                'violations': a['violations'] + b['violations'],
+            }
+        return IngestMetrics(
+            columns,
+            self.key_column or other.key_column,
+            np.union1d(self.keys, other.keys),
+            self.duplicate_keys + other.duplicate_keys + self.shared_keys(other)
+        )
+
+    def summary(self):
+        """Returns a one-line description of the problems found (or 'clean')."""
+        problems = [f"{m['nulls']:,} NULL {col}" for col, m in sorted(self.columns.items()) if m['nulls']]
+        problems += [f"{m['violations']:,} out-of-range {col}"
+                     for col, m in sorted(self.columns.items()) if m['violations']]
+        if self.duplicate_keys:
+            problems.append(f"{self.duplicate_keys:,} duplicate {self.key_column}")
+        return ", ".join(problems) if problems else "clean"
+
+
+def clear_metrics(cursor, table_name):
+    """Creates the metrics table if needed and removes a table's previous metrics."""
+    cursor.execute(METRICS_TABLE_DDL)
+    cursor.execute(f"DELETE FROM {METRICS_TABLE} WHERE table_name = %s", (table_name,))
+
+
+def store_metrics(cursor, table_name, source_file, metrics):
+    """
+    Persists one source file's metrics, replacing any earlier rows for that file.
+
+    The duplicate count is stored on the key column's row (NULL on the others).
+    """
+    cursor.execute(METRICS_TABLE_DDL)
+    cursor.execute(f"DELETE FROM {METRICS_TABLE} WHERE table_name = %s AND source_file = %s",
+                   (table_name, source_file))
+    rows = [
+        (table_name, source_file, col, m['rows'], m['nulls'], m['min'], m['max'], m['violations'],
+         metrics.duplicate_keys if col == metrics.key_column else None)
+        for col, m in sorted(metrics.columns.items())
+    ]
+    execute_values(cursor, (
+        f"INSERT INTO {METRICS_TABLE} (table_name, source_file, column_name, row_count, null_count, "
+        f"min_value, max_value, range_violations, duplicate_keys) VALUES %s"
+    ), rows)
@@ -34,9 +34,12 @@
 # =================================================================================================
 #
 
+import argparse
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set
 
 # --- DEPENDENCY CHECK ---
 # Ensures that required third-party libraries are installed before proceeding.
@@ -67,6 +70,9 @@ DESIVAST_FILES = [
     "DESIVAST_BGS_VOLLIM_VoidFinder_SGC.fits"
 ]
 
+# NumPy types of the FITS image BITPIX codes, for header-only inspection.
+BITPIX_DTYPES = {8: 'uint8', 16: 'int16', 32: 'int32', 64: 'int64', -32: 'float32', -64: 'float64'}
+
 
 # --- HELPER FUNCTIONS ---
 # Small, reusable utility functions to handle common tasks like formatting
@@ -120,18 +126,131 @@ def extract_galactic_cap(filename: str) -> str:
     if "SGC" in filename: return "SGC"
     return "Unknown"
 
+def describe_header(header) -> Dict:
+    """
+    Describes an HDU's data from its header alone, without reading the data.
+
+    Table schemas come from the TTYPEn/TFORMn/TUNITn keywords and the row count from
+    NAXIS2; image shapes come from the NAXISn keywords (in NumPy order) and BITPIX.
+
+    Args:
+        header (fits.Header): The HDU header.
+
+    Returns:
+        Dict: The table or image keys `inspect_fits_file` reports from the data;
+              empty if the HDU has no data.
+    """
+    naxis = header.get('NAXIS', 0)
+    if naxis == 0:
+        return {}
+
+    if 'TFIELDS' in header:
+        columns = []
+        for n in range(1, header['TFIELDS'] + 1):
+            col_info = {
+                "name": header.get(f'TTYPE{n}', f'col{n}'),
+                "format": header[f'TFORM{n}']
+            }
+            try:
+                col_info["dtype"] = str(fits.Column(name=col_info["name"], format=col_info["format"]).dtype)
+            except Exception:
+                col_info["dtype"] = 'unknown'
+            if header.get(f'TUNIT{n}'):
+                col_info["unit"] = str(header[f'TUNIT{n}'])
+            columns.append(col_info)
+        return {"num_columns": len(columns), "num_rows": header.get('NAXIS2', 0), "columns": columns}
+
+    return {
+        "data_shape": tuple(header[f'NAXIS{n}'] for n in range(naxis, 0, -1)),
+        "data_dtype": BITPIX_DTYPES.get(header.get('BITPIX'), 'unknown')
+    }
+
 
 # --- CORE INSPECTION LOGIC ---
 
-def inspect_fits_file(file_path: Path) -> Dict:
+def file_metadata(file_path: Path, num_hdus: int, headers_only: bool = False) -> Dict:
+    """File-level information shared by the serial and the parallel inspection."""
+    return {
+        "filename": file_path.name,
+        "algorithm": extract_algorithm(file_path.name),
+        "galactic_cap": extract_galactic_cap(file_path.name),
+        "file_size": file_path.stat().st_size,
+        "num_hdus": num_hdus,
+        "headers_only": headers_only,
+        "hdus": []
+    }
+
+def inspect_hdu(hdu, index: int, headers_only: bool = False) -> Dict:
+    """
+    Inspects a single Header-Data Unit: its header and its table schema or image shape.
+
+    Args:
+        hdu: The astropy HDU.
+        index (int): Position of the HDU in its file.
+        headers_only (bool): Describe the data from the header, without reading it.
+
+    Returns:
+        Dict: The structured information about the HDU.
+    """
+    hdu_info = {
+        "index": index,
+        "type": type(hdu).__name__, # e.g., 'PrimaryHDU', 'BinTableHDU'
+        "name": hdu.name            # The EXTNAME keyword from the header
+    }
+
+    # Extract header metadata.
+    if hasattr(hdu, 'header'):
+        hdu_info["header_cards"] = len(hdu.header)
+
+    # --- Header-Only Inspection ---
+    # Describe the data from the header keywords without loading it.
+    if headers_only:
+        hdu_info.update(describe_header(hdu.header))
+
+    # --- Data Inspection (if data is present) ---
+    elif hasattr(hdu, 'data') and hdu.data is not None:
+        # Case 1: Binary Table Data (typical for catalogs)
+        if hasattr(hdu.data, 'columns'):
+            hdu_info["num_columns"] = len(hdu.data.columns)
+            hdu_info["num_rows"] = len(hdu.data)
+            hdu_info["columns"] = []
+
+            # Extract schema for each column in the table.
+            for col in hdu.data.columns:
+                col_info = {
+                    "name": col.name,
+                    "format": col.format, # FITS format code (e.g., 'E', 'D', 'J')
+                    "dtype": str(col.dtype) # NumPy data type (e.g., 'float32')
+                }
+                if hasattr(col, 'unit') and col.unit:
+                    col_info["unit"] = str(col.unit)
+                hdu_info["columns"].append(col_info)
+
+        # Case 2: Image or Array Data
+        elif hasattr(hdu.data, 'shape'):
+            hdu_info["data_shape"] = hdu.data.shape
+            hdu_info["data_dtype"] = str(hdu.data.dtype)
+
+    return hdu_info
+
+def inspect_hdu_at(file_path: Path, index: int, headers_only: bool = False) -> Dict:
+    """Worker task: opens a FITS file and inspects only the HDU at `index`."""
+    # `lazy_load_hdus` reads headers up to the requested HDU and seeks past earlier data.
+    with fits.open(file_path, lazy_load_hdus=True) as hdul:
+        return inspect_hdu(hdul[index], index, headers_only)
+
+def inspect_fits_file(file_path: Path, headers_only: bool = False) -> Dict:
     """
     Inspects a single FITS file and extracts its detailed structure and metadata.
 
     This function opens a FITS file and walks through its Header-Data Units (HDUs),
-    gathering information about headers, data dimensions, and column schemas.
+    gathering information about headers, data dimensions, and column schemas. With
+    `headers_only`, the schemas and row counts are read from the headers alone and
+    the data is never loaded.
 
     Args:
         file_path (Path): The full path to the FITS file.
+        headers_only (bool): Parse the headers only, skipping the data.
 
     Returns:
         Dict: A dictionary containing the structured information about the file.
@@ -141,67 +260,73 @@ def inspect_fits_file(file_path: Path) -> Dict:
         return {"error": f"File not found: {file_path}"}
 
     try:
-        # --- File-level Metadata ---
-        file_size = file_path.stat().st_size
-        algorithm = extract_algorithm(file_path.name)
-        galactic_cap = extract_galactic_cap(file_path.name)
-
-        with fits.open(file_path) as hdul:
+        # `lazy_load_hdus` reads each header on demand and seeks past the data.
+        with fits.open(file_path, lazy_load_hdus=headers_only) as hdul:
             # This dictionary will hold all extracted information for this file.
-            info = {
-                "filename": file_path.name,
-                "algorithm": algorithm,
-                "galactic_cap": galactic_cap,
-                "file_size": file_size,
-                "num_hdus": len(hdul),
-                "hdus": []
-            }
+            info = file_metadata(file_path, len(hdul), headers_only)
 
             # --- HDU-level Inspection ---
             # Iterate through each Header-Data Unit in the FITS file.
-            for i, hdu in enumerate(hdul):
-                hdu_info = {
-                    "index": i,
-                    "type": type(hdu).__name__, # e.g., 'PrimaryHDU', 'BinTableHDU'
-                    "name": hdu.name            # The EXTNAME keyword from the header
-                }
-
-                # Extract header metadata.
-                if hasattr(hdu, 'header'):
-                    hdu_info["header_cards"] = len(hdu.header)
-
-                # --- Data Inspection (if data is present) ---
-                if hasattr(hdu, 'data') and hdu.data is not None:
-                    # Case 1: Binary Table Data (typical for catalogs)
-                    if hasattr(hdu.data, 'columns'):
-                        hdu_info["num_columns"] = len(hdu.data.columns)
-                        hdu_info["num_rows"] = len(hdu.data)
-                        hdu_info["columns"] = []
-
-                        # Extract schema for each column in the table.
-                        for col in hdu.data.columns:
-                            col_info = {
-                                "name": col.name,
-                                "format": col.format, # FITS format code (e.g., 'E', 'D', 'J')
-                                "dtype": str(col.dtype) # NumPy data type (e.g., 'float32')
-                            }
-                            if hasattr(col, 'unit') and col.unit:
-                                col_info["unit"] = str(col.unit)
-                            hdu_info["columns"].append(col_info)
-
-                    # Case 2: Image or Array Data
-                    elif hasattr(hdu.data, 'shape'):
-                        hdu_info["data_shape"] = hdu.data.shape
-                        hdu_info["data_dtype"] = str(hdu.data.dtype)
-
-                info["hdus"].append(hdu_info)
-
+            info["hdus"] = [inspect_hdu(hdu, i, headers_only) for i, hdu in enumerate(hdul)]
             return info
 
     except Exception as e:
         # Broad exception catch to handle any issues during file reading (e.g., corruption).
         return {"error": f"Error reading {file_path}: {e}"}
 
+def inspect_files(file_paths: List[Path], headers_only: bool = False, workers: Optional[int] = None) -> List[Dict]:
+    """
+    Inspects many FITS files across a process pool, one task per HDU.
+
+    Each file's HDUs are counted from its headers in this process; every HDU is then
+    inspected by a worker, and the results are slotted back by (file, HDU) position,
+    so the output is identical to inspecting the files one by one.
+
+    Args:
+        file_paths (List[Path]): The FITS files, in reporting order.
+        headers_only (bool): Parse the headers only, skipping the data.
+        workers (int, optional): Worker processes (default: all cores; 1 inspects in-process).
+
+    Returns:
+        List[Dict]: One `inspect_fits_file`-style dictionary per file, in input order.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        return [inspect_fits_file(file_path, headers_only) for file_path in file_paths]
+
+    all_info, tasks = [], []
+    for n, file_path in enumerate(file_paths):
+        if not file_path.exists():
+            all_info.append({"error": f"File not found: {file_path}"})
+            continue
+        try:
+            with fits.open(file_path, lazy_load_hdus=True) as hdul:
+                info = file_metadata(file_path, len(hdul), headers_only)
+        except Exception as e:
+            all_info.append({"error": f"Error reading {file_path}: {e}"})
+            continue
+        info["hdus"] = [None] * info["num_hdus"]
+        all_info.append(info)
+        tasks += [(n, file_path, i) for i in range(info["num_hdus"])]
+
+    # A failed HDU fails its whole file, as in the serial inspection; the first failed
+    # HDU of a file names the error, whatever order the workers finish in.
+    errors: Dict[int, Dict[int, str]] = {}
+    if tasks:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            futures = {executor.submit(inspect_hdu_at, file_path, i, headers_only): (n, i)
+                       for n, file_path, i in tasks}
+            for future in as_completed(futures):
+                n, i = futures[future]
+                try:
+                    all_info[n]["hdus"][i] = future.result()
+                except Exception as e:
+                    errors.setdefault(n, {})[i] = f"Error reading {file_paths[n]}: {e}"
+
+    for n, by_hdu in errors.items():
+        all_info[n] = {"error": by_hdu[min(by_hdu)]}
+    return all_info
+
 
 # --- REPORTING FUNCTIONS ---
 # These functions take the collected data and print it to the console in a
@@ -217,7 +342,7 @@ def print_file_summary(info: Dict):
     print(f"   🔬 Algorithm: {info['algorithm']}")
     print(f"   🌌 Galactic Cap: {info['galactic_cap']}")
     print(f"   💾 Size: {format_size(info['file_size'])}")
-    print(f"   📦 HDUs: {info['num_hdus']}")
+    print(f"   📦 HDUs: {info['num_hdus']}" + (" (headers only)" if info.get('headers_only') else ""))
 
     # Print a one-line summary for each HDU.
     for hdu in info['hdus']:
@@ -333,12 +458,22 @@ def print_row_counts(all_info: List[Dict]):
 def main():
     """Main function to orchestrate the entire inspection and reporting process."""
     
-    # Simple command-line argument parsing for the data directory path.
-    data_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DATA_DIR
+    # Command-line arguments: the data directory path and the inspection mode.
+    parser = argparse.ArgumentParser(description="Inspect the DESIVAST void catalog FITS files.")
+    parser.add_argument('data_dir', nargs='?', type=Path, default=DEFAULT_DATA_DIR,
+                        help=f"Directory holding the DESIVAST files (default: {DEFAULT_DATA_DIR})")
+    parser.add_argument('--headers-only', action='store_true',
+                        help="Report schemas and row counts from the HDU headers only, without reading the data")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes, one HDU per task (default: all cores; 1 with --headers-only)")
+    args = parser.parse_args()
+    data_dir = args.data_dir
     
     print("🔍 DESIVAST FITS Inspector")
     print("=" * 40)
     print(f"📁 Data directory: {data_dir}")
+    if args.headers_only:
+        print("⚡ Headers-only mode: the data is not read")
     
     if not data_dir.exists():
         print(f"❌ Error: Directory '{data_dir}' does not exist.")
@@ -347,7 +482,9 @@ def main():
 
     # --- Step 1: Inspect all files individually ---
     print(f"\n📋 Inspecting {len(DESIVAST_FILES)} DESIVAST files...")
-    all_info = [inspect_fits_file(data_dir / f) for f in DESIVAST_FILES]
+    # Header parsing takes milliseconds, so a process pool only pays off when reading the data.
+    workers = args.workers or (1 if args.headers_only else os.cpu_count())
+    all_info = inspect_files([data_dir / f for f in DESIVAST_FILES], args.headers_only, workers)
     
     # Print the individual summary for each file as it's processed.
     for info in all_info:
@@ -0,0 +1,458 @@
+#
+# =================================================================================================
+#
+# File: aggregate_store.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Versioned store of pre-binned aggregates in the `science_analysis` schema, so plot scripts
+#   and Grafana panels read a few kilobytes of bins instead of rescanning millions of rows.
+#
+#   The aggregates are the Stage 2 summaries: the 1D histograms (stellar mass, SFR, redshift),
+#   the void radius histogram per (algorithm, galactic_cap), and the 2D scaling relations.
+#   Both summary types are mergeable, so the store keeps one partial per aggregate and
+#   `source_file` partition, versioned like the Stage 1 partition cache (row count plus
+#   latest ingestion timestamp, see validation_cache.py). A refresh after ingest rescans only
+#   the partitions whose version changed, restricted through the (source_file,
+#   ingestion_timestamp) index, and merges the partials into a new version of every aggregate
+#   whose content changed. Unchanged aggregates keep their current version.
+#
+#   Each version is published as:
+#     - aggregate_versions:     the merged summary (`.npz` payload), its spec, the partition
+#                               versions it was built from and a content hash;
+#     - aggregate_hist1d:       dense in-range bins per group;
+#     - aggregate_hist2d:       non-empty (x, y) bins;
+#     - aggregate_bin_medians:  per x column count, mean and 5/16/50/84/95th percentiles of y;
+#     - aggregate_group_counts: per group rows, non-finite and out-of-range counts, median,
+#                               mean and tallies (e.g. voids per algorithm and cap).
+#   `aggregate_current` is a view of the latest version of every aggregate; dashboards join
+#   on it. The last `KEEP_VERSIONS` versions are retained.
+#
+#   Usage (after each ingest):  python aggregate_store.py [--method chunked] [--force]
+#
+# =================================================================================================
+#
+
+import argparse
+import hashlib
+import json
+import logging
+import sys
+import time
+from collections import namedtuple
+from functools import reduce
+from io import BytesIO
+
+import numpy as np
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extras import Json, execute_values
+
+from binned_statistics import SUMS, BinnedSpec2D, BinnedStatistic2D, compute_statistics
+from histograms import DEFAULT_CHUNK_SIZE, HISTOGRAM_METHODS, Histogram, HistogramSpec, compute_histograms
+from validate_stage2_physical_plausibility import HISTOGRAMS, RELATIONS, VOID_TABLE
+from validation_cache import partition_versions
+
+# --- SCRIPT CONFIGURATION ---
+# Database connection parameters are shared with Stage 1 and Stage 2.
+DB_HOST = "localhost"
+DB_NAME = "desi_void_analysis"
+DB_USER = "your_username"  # Replace with your database user
+DB_PASSWORD = "your_password" # Replace with your database password
+
+AGGREGATES = HISTOGRAMS + [
+    HistogramSpec('void_radius', VOID_TABLE, "radius_mpc_h", 0.0, 60.0, 120,
+                  group_by=('algorithm', 'galactic_cap'), tallies=(('nonpositive', "radius_mpc_h <= 0"),)),
+] + RELATIONS
+
+KEEP_VERSIONS = 5
+BIN_QUANTILES = (0.05, 0.16, 0.5, 0.84, 0.95)
+ALL_GROUPS = "all"
+
+STORE_DDL = """
+CREATE SCHEMA IF NOT EXISTS science_analysis;
+CREATE TABLE IF NOT EXISTS science_analysis.aggregate_partials (
+    aggregate TEXT NOT NULL,
+    source_file TEXT NOT NULL,
+    partition_version TEXT NOT NULL,
+    spec_hash CHAR(16) NOT NULL,
+    payload BYTEA NOT NULL,
+    PRIMARY KEY (aggregate, source_file)
+);
+CREATE TABLE IF NOT EXISTS science_analysis.aggregate_versions (
+    aggregate TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    kind VARCHAR(10) NOT NULL CHECK (kind IN ('hist1d', 'hist2d')),
+    source_table TEXT NOT NULL,
+    spec JSONB NOT NULL,
+    spec_hash CHAR(16) NOT NULL,
+    content_hash CHAR(16) NOT NULL,
+    partitions JSONB NOT NULL,
+    row_count BIGINT NOT NULL,
+    payload BYTEA NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (aggregate, version)
+);
+CREATE TABLE IF NOT EXISTS science_analysis.aggregate_hist1d (
+    aggregate TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    group_key TEXT NOT NULL,
+    bin INTEGER NOT NULL,
+    bin_low DOUBLE PRECISION NOT NULL,
+    bin_high DOUBLE PRECISION NOT NULL,
+    count BIGINT NOT NULL,
+    PRIMARY KEY (aggregate, version, group_key, bin),
+    FOREIGN KEY (aggregate, version) REFERENCES science_analysis.aggregate_versions ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS science_analysis.aggregate_hist2d (
+    aggregate TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    ix INTEGER NOT NULL,
+    iy INTEGER NOT NULL,
+    x_low DOUBLE PRECISION NOT NULL,
+    x_high DOUBLE PRECISION NOT NULL,
+    y_low DOUBLE PRECISION NOT NULL,
+    y_high DOUBLE PRECISION NOT NULL,
+    count BIGINT NOT NULL,
+    PRIMARY KEY (aggregate, version, ix, iy),
+    FOREIGN KEY (aggregate, version) REFERENCES science_analysis.aggregate_versions ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS science_analysis.aggregate_bin_medians (
+    aggregate TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    ix INTEGER NOT NULL,
+    x_low DOUBLE PRECISION NOT NULL,
+    x_high DOUBLE PRECISION NOT NULL,
+    count BIGINT NOT NULL,
+    mean_y DOUBLE PRECISION,
+    p05 DOUBLE PRECISION,
+    p16 DOUBLE PRECISION,
+    p50 DOUBLE PRECISION,
+    p84 DOUBLE PRECISION,
+    p95 DOUBLE PRECISION,
+    PRIMARY KEY (aggregate, version, ix),
+    FOREIGN KEY (aggregate, version) REFERENCES science_analysis.aggregate_versions ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS science_analysis.aggregate_group_counts (
+    aggregate TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    group_key TEXT NOT NULL,
+    row_count BIGINT NOT NULL,
+    nonfinite BIGINT NOT NULL,
+    below_range BIGINT,
+    above_range BIGINT,
+    median DOUBLE PRECISION,
+    mean DOUBLE PRECISION,
+    tallies JSONB,
+    PRIMARY KEY (aggregate, version, group_key),
+    FOREIGN KEY (aggregate, version) REFERENCES science_analysis.aggregate_versions ON DELETE CASCADE
+);
+CREATE OR REPLACE VIEW science_analysis.aggregate_current AS
+    SELECT DISTINCT ON (aggregate) aggregate, version, kind, source_table, content_hash, row_count, created_at
+    FROM science_analysis.aggregate_versions
+    ORDER BY aggregate, version DESC;
+"""
+
+# One published version of an aggregate, as read back by plot scripts.
+StoredAggregate = namedtuple('StoredAggregate', ['name', 'version', 'content_hash', 'created_at', 'summary'])
+
+# --- LOGGING SETUP ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+
+# --- SERIALISATION ---
+
+def _spec_fields(spec):
+    # The FITS column mapping of a 2D spec is code, not configuration.
+    return {key: value for key, value in spec._asdict().items() if key != 'arrays'}
+
+
+def spec_hash(spec):
+    """Short hash of a spec's expressions and binning; a change invalidates its partials."""
+    return hashlib.sha1(json.dumps(_spec_fields(spec), sort_keys=True).encode()).hexdigest()[:16]
+
+
+def summary_to_bytes(summary):
+    """Serialises a Histogram or BinnedStatistic2D to a compressed `.npz` payload."""
+    buffer = BytesIO()
+    if isinstance(summary, Histogram):
+        groups = summary.groups()
+        tally_names = [name for name, _ in summary.spec.tallies]
+        np.savez_compressed(
+            buffer,
+            groups=np.array([json.dumps(list(group)) for group in groups], dtype=str),
+            counts=np.array([summary.counts[g] for g in groups], dtype=np.int64).reshape(len(groups), summary.spec.bins + 2),
+            nonfinite=np.array([summary.nonfinite[g] for g in groups], dtype=np.int64),
+            tallies=np.array([[summary.tallies[g][name] for name in tally_names] for g in groups],
+                             dtype=np.int64).reshape(len(groups), len(tally_names)))
+    else:
+        np.savez_compressed(buffer, count=summary.count, nonfinite=summary.nonfinite,
+                            **{f"sum_{name}": summary.sums[name] for name in SUMS})
+    return buffer.getvalue()
+
+
+def summary_from_bytes(spec, payload):
+    """Rebuilds the summary of `spec` from a payload written by `summary_to_bytes`."""
+    with np.load(BytesIO(bytes(payload))) as data:
+        if isinstance(spec, BinnedSpec2D):
+            return BinnedStatistic2D(spec, data['count'], {name: data[f"sum_{name}"] for name in SUMS},
+                                     int(data['nonfinite']))
+        tally_names = [name for name, _ in spec.tallies]
+        histogram = Histogram(spec)
+        for i, group in enumerate(data['groups']):
+            group = tuple(json.loads(str(group)))
+            histogram.add(group, -1, int(data['nonfinite'][i]), dict(zip(tally_names, map(int, data['tallies'][i]))))
+            histogram.counts[group] += data['counts'][i]
+        return histogram
+
+
+def _empty_summary(spec):
+    return BinnedStatistic2D(spec) if isinstance(spec, BinnedSpec2D) else Histogram(spec)
+
+
+def _group_key(group):
+    return "/".join(map(str, group)) if group else ALL_GROUPS
+
+
+def _finite_or_none(value):
+    return float(value) if value is not None and np.isfinite(value) else None
+
+# --- PUBLISHED TABLES ---
+
+def _publish_histogram(cursor, name, version, histogram):
+    edges = histogram.edges
+    bins, groups = [], []
+    for group in histogram.groups():
+        key = _group_key(group)
+        counts = histogram.counts[group]
+        bins += [(name, version, key, i, float(edges[i - 1]), float(edges[i]), int(counts[i]))
+                 for i in range(1, len(edges))]
+        groups.append((name, version, key, histogram.row_count(group), int(histogram.nonfinite[group]),
+                       int(counts[0]), int(counts[-1]), histogram.quantile(0.5, group), histogram.mean(group),
+                       Json(histogram.tallies[group])))
+    execute_values(cursor, "INSERT INTO science_analysis.aggregate_hist1d "
+                           "(aggregate, version, group_key, bin, bin_low, bin_high, count) VALUES %s", bins)
+    execute_values(cursor, "INSERT INTO science_analysis.aggregate_group_counts (aggregate, version, group_key, "
+                           "row_count, nonfinite, below_range, above_range, median, mean, tallies) VALUES %s", groups)
+
+
+def _publish_relation(cursor, name, version, relation):
+    x, y = relation.x_edges, relation.y_edges
+    ix, iy = np.nonzero(relation.count[1:-1, 1:-1])
+    execute_values(cursor, "INSERT INTO science_analysis.aggregate_hist2d "
+                           "(aggregate, version, ix, iy, x_low, x_high, y_low, y_high, count) VALUES %s",
+                   [(name, version, int(i) + 1, int(j) + 1, float(x[i]), float(x[i + 1]), float(y[j]), float(y[j + 1]),
+                     int(relation.count[i + 1, j + 1])) for i, j in zip(ix, iy)])
+
+    counts = relation.column_counts()
+    columns = np.column_stack([relation.mean_y()] + [relation.quantile_y(q) for q in BIN_QUANTILES])
+    execute_values(cursor, "INSERT INTO science_analysis.aggregate_bin_medians "
+                           "(aggregate, version, ix, x_low, x_high, count, mean_y, p05, p16, p50, p84, p95) VALUES %s",
+                   [(name, version, int(i) + 1, float(x[i]), float(x[i + 1]), int(counts[i]),
+                     *[_finite_or_none(v) for v in columns[i]]) for i in np.flatnonzero(counts)])
+    execute_values(cursor, "INSERT INTO science_analysis.aggregate_group_counts (aggregate, version, group_key, "
+                           "row_count, nonfinite) VALUES %s",
+                   [(name, version, ALL_GROUPS, relation.row_count(), relation.nonfinite)])
+
+
+def publish_version(cursor, spec, summary, partitions, keep=KEEP_VERSIONS):
+    """
+    Publishes a merged summary as a new version, unless it matches the current version.
+
+    Args:
+        cursor: Cursor inside the refresh transaction.
+        spec: The aggregate's HistogramSpec or BinnedSpec2D.
+        summary: The merged Histogram or BinnedStatistic2D.
+        partitions (dict): {source_file: partition version} the summary was built from.
+        keep (int): Versions retained per aggregate.
+
+    Returns:
+        int or None: The new version, or None if the content is unchanged.
+    """
+    digest = summary.content_hash()
+    cursor.execute("SELECT version, content_hash FROM science_analysis.aggregate_current WHERE aggregate = %s",
+                   (spec.name,))
+    current = cursor.fetchone()
+    if current is not None and current[1] == digest:
+        return None
+
+    version = current[0] + 1 if current is not None else 1
+    kind = 'hist2d' if isinstance(spec, BinnedSpec2D) else 'hist1d'
+    cursor.execute(
+        "INSERT INTO science_analysis.aggregate_versions (aggregate, version, kind, source_table, spec, spec_hash, "
+        "content_hash, partitions, row_count, payload) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+        (spec.name, version, kind, ".".join(spec.table), Json(_spec_fields(spec)), spec_hash(spec), digest,
+         Json(partitions), summary.row_count(), psycopg2.Binary(summary_to_bytes(summary))))
+    if kind == 'hist2d':
+        _publish_relation(cursor, spec.name, version, summary)
+    else:
+        _publish_histogram(cursor, spec.name, version, summary)
+    cursor.execute("DELETE FROM science_analysis.aggregate_versions WHERE aggregate = %s AND version <= %s",
+                   (spec.name, version - keep))
+    return version
+
+# --- REFRESH ---
+
+def _scan_partition(connection, cursor, specs, partition, method, chunk_size):
+    """Computes every aggregate of one table over one source file's rows."""
+    where = sql.SQL("source_file = {}").format(sql.Literal(partition))
+    partials = {}
+    histograms = [spec for spec in specs if isinstance(spec, HistogramSpec)]
+    relations = [spec for spec in specs if isinstance(spec, BinnedSpec2D)]
+    if histograms:
+        partials.update(compute_histograms(connection, histograms, method, chunk_size, cursor, where))
+    if relations:
+        partials.update(compute_statistics(connection, relations, method, chunk_size, cursor, where))
+    return partials
+
+
+def refresh_table(connection, cursor, specs, method='sql', chunk_size=DEFAULT_CHUNK_SIZE, force=False,
+                  keep=KEEP_VERSIONS):
+    """
+    Brings the aggregates of one table up to date, rescanning only changed partitions.
+
+    Returns:
+        dict: 'partitions' (total), 'rescanned', 'removed' and 'published' ({name: version}).
+    """
+    table = specs[0].table
+    names = [spec.name for spec in specs]
+    hashes = {spec.name: spec_hash(spec) for spec in specs}
+    versions = partition_versions(cursor, *table)
+    cursor.execute("SELECT aggregate, source_file, partition_version, spec_hash "
+                   "FROM science_analysis.aggregate_partials WHERE aggregate = ANY(%s)", (names,))
+    stored = {(name, partition): (version, digest) for name, partition, version, digest in cursor.fetchall()}
+
+    stale = [partition for partition, version in sorted(versions.items())
+             if force or any(stored.get((name, partition)) != (version, hashes[name]) for name in names)]
+    for partition in stale:
+        partials = _scan_partition(connection, cursor, specs, partition, method, chunk_size)
+        execute_values(cursor, "INSERT INTO science_analysis.aggregate_partials "
+                               "(aggregate, source_file, partition_version, spec_hash, payload) VALUES %s "
+                               "ON CONFLICT (aggregate, source_file) DO UPDATE SET "
+                               "partition_version = EXCLUDED.partition_version, spec_hash = EXCLUDED.spec_hash, "
+                               "payload = EXCLUDED.payload",
+                       [(name, partition, versions[partition], hashes[name], psycopg2.Binary(summary_to_bytes(s)))
+                        for name, s in partials.items()])
+    cursor.execute("DELETE FROM science_analysis.aggregate_partials WHERE aggregate = ANY(%s) "
+                   "AND NOT source_file = ANY(%s)", (names, list(versions)))
+    removed = cursor.rowcount // len(names)
+
+    published = {}
+    for spec in specs:
+        cursor.execute("SELECT payload FROM science_analysis.aggregate_partials WHERE aggregate = %s "
+                       "ORDER BY source_file", (spec.name,))
+        partials = [summary_from_bytes(spec, payload) for (payload,) in cursor.fetchall()]
+        merged = reduce(lambda a, b: a.merge(b), partials, _empty_summary(spec))
+        version = publish_version(cursor, spec, merged, versions, keep)
+        if version is not None:
+            published[spec.name] = version
+    return {'partitions': len(versions), 'rescanned': len(stale), 'removed': removed, 'published': published}
+
+
+def refresh_aggregates(connection, specs=AGGREGATES, method='sql', chunk_size=DEFAULT_CHUNK_SIZE, force=False,
+                       keep=KEEP_VERSIONS):
+    """
+    Refreshes every aggregate in one transaction, table by table.
+
+    An advisory lock serialises concurrent refreshes (e.g. two ingest jobs finishing together).
+
+    Returns:
+        dict: {table label: `refresh_table` result}.
+    """
+    results = {}
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(STORE_DDL)
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('science_analysis.aggregate_versions'))")
+            for table in dict.fromkeys(spec.table for spec in specs):
+                results[".".join(table)] = refresh_table(
+                    connection, cursor, [spec for spec in specs if spec.table == table], method, chunk_size, force, keep)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    return results
+
+# --- READING ---
+
+def load_aggregates(connection, specs=AGGREGATES, versions=None):
+    """
+    Reads published aggregates: the current version of each, or the given ones.
+
+    Args:
+        connection: psycopg2 connection.
+        specs (list): Specs of the aggregates to read.
+        versions (dict, optional): {name: version} to read instead of the current versions.
+
+    Returns:
+        dict: {name: StoredAggregate}; aggregates never published are absent.
+    """
+    versions = versions or {}
+    aggregates = {}
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('science_analysis.aggregate_versions')")
+        if cursor.fetchone()[0] is None:
+            return aggregates
+        for spec in specs:
+            cursor.execute(
+                "SELECT version, content_hash, created_at, payload, spec_hash FROM science_analysis.aggregate_versions "
+                "WHERE aggregate = %s AND (%s::int IS NULL OR version = %s) ORDER BY version DESC LIMIT 1",
+                (spec.name, versions.get(spec.name), versions.get(spec.name)))
+            row = cursor.fetchone()
+            if row is None:
+                continue
+            version, digest, created_at, payload, stored_spec = row
+            if stored_spec != spec_hash(spec):
+                logging.warning(f"⚠️ Stored '{spec.name}' v{version} was binned with another spec: refresh the store")
+                continue
+            aggregates[spec.name] = StoredAggregate(spec.name, version, digest, created_at,
+                                                    summary_from_bytes(spec, payload))
+    return aggregates
+
+# --- MAIN EXECUTION ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the science_analysis pre-binned aggregate store.")
+    parser.add_argument('--method', choices=HISTOGRAM_METHODS, default='sql',
+                        help="Database engine for rescanned partitions (default: %(default)s).")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Rows per fetch for --method chunked (default: %(default)s).")
+    parser.add_argument('--force', action='store_true',
+                        help="Rescan every partition even if its stored partial is current.")
+    parser.add_argument('--keep', type=int, default=KEEP_VERSIONS,
+                        help="Versions retained per aggregate (default: %(default)s).")
+    args = parser.parse_args()
+
+    logging.info("🗄️  REFRESHING THE SCIENCE_ANALYSIS AGGREGATE STORE")
+    start = time.time()
+    try:
+        connection = psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASSWORD)
+    except psycopg2.Error as e:
+        logging.error(f"❌ Database error: {e}")
+        return 1
+    try:
+        results = refresh_aggregates(connection, AGGREGATES, args.method, args.chunk_size, args.force, args.keep)
+    except psycopg2.Error as e:
+        logging.error(f"❌ Refresh failed, store left unchanged: {e}")
+        return 1
+    finally:
+        connection.close()
+
+    for table, result in results.items():
+        logging.info(f"✅ {table}: {result['rescanned']}/{result['partitions']} partitions rescanned, "
+                     f"{result['removed']} removed")
+        for name, version in result['published'].items():
+            logging.info(f"   📦 {name} -> v{version}")
+        if not result['published']:
+            logging.info("   All aggregates unchanged")
+    logging.info(f"Aggregate store refreshed in {time.time() - start:.2f} seconds.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
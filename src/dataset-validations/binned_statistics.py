@@ -0,0 +1,337 @@
+#
+# =================================================================================================
+#
+# File: binned_statistics.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Out-of-core 2D binned statistics for the Stage 2 scaling relations (star-forming main
+#   sequence, mass-redshift, sSFR-mass), which span the full 6.4M-galaxy catalog.
+#
+#   A `BinnedStatistic2D` holds, per (x, y) bin, the number of galaxies and the sums of x, y,
+#   x², y² and xy. It is filled chunk by chunk and never holds more than one chunk of raw
+#   values. Everything the checks and plots need is derived from these summaries:
+#     - bin means and scatter, and the exact Pearson correlation over all finite pairs;
+#     - approximate quantiles of y in every x column, interpolated from the y bins
+#       (e.g. the main-sequence ridge, or the upper mass envelope per redshift slice).
+#   Summaries add element-wise, so partial results from chunks, source files or worker
+#   processes merge in any order into the same totals, and they are saved as `.npz` files.
+#
+#   Three sources feed the same summaries:
+#     - 'sql':     one `GROUP BY GROUPING SETS` query over `width_bucket` pairs computes
+#                  every relation of a table inside PostgreSQL;
+#     - 'chunked': a named server-side cursor streams the evaluated x and y values;
+#     - FITS:      the FastSpecFit files are read as memory maps in row slices, one file per
+#                  worker process, independently of the database.
+#   Bins follow `width_bucket` on both axes, as in histograms.py.
+#
+# =================================================================================================
+#
+
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import psycopg2.extensions
+from astropy.io import fits
+from psycopg2 import sql
+
+from histograms import DEFAULT_CHUNK_SIZE, binned_quantile, bucket_indices, where_clause
+
+SUMS = ('x', 'y', 'xx', 'yy', 'xy')
+
+# Rows read per slice of a FITS memory map.
+DEFAULT_FITS_CHUNK_ROWS = 500_000
+
+# `x` and `y` are trusted SQL expressions over `table`; `arrays`, if set, is a module-level
+# (picklable) function mapping {column: np.ndarray} to the (x, y) arrays for FITS sources.
+BinnedSpec2D = namedtuple('BinnedSpec2D', ['name', 'table', 'x', 'y', 'x_range', 'y_range', 'bins', 'arrays'],
+                          defaults=(None,))
+
+
+class BinnedStatistic2D:
+    """
+    Mergeable per-bin counts and sums of one (x, y) relation.
+
+    Args:
+        spec (BinnedSpec2D): Expressions and binning; `bins` is (nx, ny).
+        count (np.ndarray, optional): (nx + 2, ny + 2) counts, under/overflow at both ends.
+        sums (dict, optional): {'x', 'y', 'xx', 'yy', 'xy': array shaped like `count`}.
+        nonfinite (int): Rows where x or y is NULL, NaN or infinite.
+    """
+
+    def __init__(self, spec, count=None, sums=None, nonfinite=0):
+        self.spec = spec
+        shape = (spec.bins[0] + 2, spec.bins[1] + 2)
+        self.x_edges = np.linspace(*spec.x_range, spec.bins[0] + 1)
+        self.y_edges = np.linspace(*spec.y_range, spec.bins[1] + 1)
+        self.count = count if count is not None else np.zeros(shape, dtype=np.int64)
+        self.sums = sums if sums is not None else {name: np.zeros(shape) for name in SUMS}
+        self.nonfinite = int(nonfinite)
+
+    def accumulate(self, x, y):
+        """Adds one chunk of raw values; NaN stands for NULL."""
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        finite = np.isfinite(x) & np.isfinite(y)
+        self.nonfinite += int(len(x) - np.count_nonzero(finite))
+        x, y = x[finite], y[finite]
+        ix = bucket_indices(x, *self.spec.x_range, self.spec.bins[0])
+        iy = bucket_indices(y, *self.spec.y_range, self.spec.bins[1])
+        flat = ix * self.count.shape[1] + iy
+        size = self.count.size
+        self.count += np.bincount(flat, minlength=size).reshape(self.count.shape)
+        for name, weights in zip(SUMS, (x, y, x * x, y * y, x * y)):
+            self.sums[name] += np.bincount(flat, weights=weights, minlength=size).reshape(self.count.shape)
+
+    def add_bin(self, ix, iy, count, sums):
+        """Adds one aggregated bin as returned by SQL (ix = -1 for non-finite rows)."""
+        if ix < 0:
+            self.nonfinite += count
+            return
+        self.count[ix, iy] += count
+        for name, value in zip(SUMS, sums):
+            self.sums[name][ix, iy] += value or 0.0
+
+    def merge(self, other):
+        """Adds another summary of the same relation (another chunk, file or worker)."""
+        return BinnedStatistic2D(self.spec, self.count + other.count,
+                                 {name: self.sums[name] + other.sums[name] for name in SUMS},
+                                 self.nonfinite + other.nonfinite)
+
+    def row_count(self):
+        return int(self.count.sum()) + self.nonfinite
+
+    def column_counts(self):
+        """Finite pairs per in-range x column."""
+        return self.count[1:-1].sum(axis=1)
+
+    def mean_y(self):
+        """Exact mean of y per in-range x column (NaN for empty columns)."""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sums['y'][1:-1].sum(axis=1) / self.column_counts()
+
+    def quantile_y(self, q, y_min=None):
+        """
+        Approximate quantile of y in every in-range x column.
+
+        Args:
+            q (float): Quantile in [0, 1].
+            y_min (float, optional): Ignore y bins lying entirely below this value (e.g. to
+                select star-forming galaxies by sSFR).
+
+        Returns:
+            np.ndarray: One value per x column, NaN for empty columns.
+        """
+        counts = self.count[1:-1].copy()
+        if y_min is not None:
+            below = np.concatenate([[True], self.y_edges[1:] <= y_min, [False]])
+            counts[:, below] = 0
+        values = [binned_quantile(column, self.y_edges, q) for column in counts]
+        return np.array([np.nan if v is None else v for v in values])
+
+    def fraction_y_below(self, threshold):
+        """Fraction of each in-range x column with y below `threshold` (a y bin edge)."""
+        below = np.concatenate([[True], self.y_edges[1:] <= threshold, [False]])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.count[1:-1][:, below].sum(axis=1) / self.column_counts()
+
+    def pearson(self):
+        """Exact Pearson correlation of x and y over every finite pair."""
+        n = self.count.sum()
+        if n < 2:
+            return None
+        s = {name: self.sums[name].sum() for name in SUMS}
+        cov = s['xy'] / n - s['x'] * s['y'] / n ** 2
+        var_x = s['xx'] / n - (s['x'] / n) ** 2
+        var_y = s['yy'] / n - (s['y'] / n) ** 2
+        if var_x <= 0 or var_y <= 0:
+            return None
+        return float(cov / np.sqrt(var_x * var_y))
+
+    def x_centres(self):
+        return (self.x_edges[:-1] + self.x_edges[1:]) / 2
+
+    def content_hash(self):
+        """
+        Short hash of the binning, counts and sums.
+
+        Floating-point sums from parallel aggregates differ in their last bits between scans of
+        the same rows, so they are hashed at float32 precision.
+        """
+        digest = hashlib.sha1(repr((self.spec.x_range, self.spec.y_range, self.spec.bins, self.nonfinite)).encode())
+        digest.update(self.count.tobytes())
+        for name in SUMS:
+            digest.update(self.sums[name].astype(np.float32).tobytes())
+        return digest.hexdigest()[:16]
+
+    def to_dict(self):
+        """JSON-friendly form: edges, in-range counts and the overall correlation."""
+        return {'x': self.spec.x, 'y': self.spec.y, 'x_edges': self.x_edges.tolist(),
+                'y_edges': self.y_edges.tolist(), 'count': self.count.tolist(),
+                'nonfinite': self.nonfinite, 'pearson': self.pearson()}
+
+    def save(self, path):
+        """Writes the summary to an `.npz` file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, count=self.count, nonfinite=self.nonfinite,
+                            x_range=self.spec.x_range, y_range=self.spec.y_range, bins=self.spec.bins,
+                            **{f"sum_{name}": self.sums[name] for name in SUMS})
+        return path
+
+    @classmethod
+    def load(cls, path, spec):
+        """Reads a saved summary; the binning must match `spec`."""
+        with np.load(path) as data:
+            if (tuple(data['x_range']) != tuple(spec.x_range) or tuple(data['y_range']) != tuple(spec.y_range)
+                    or tuple(data['bins']) != tuple(spec.bins)):
+                raise ValueError(f"{path} was binned differently from '{spec.name}'")
+            return cls(spec, data['count'], {name: data[f"sum_{name}"] for name in SUMS}, int(data['nonfinite']))
+
+
+def _bucket_pair_sql(spec, index):
+    x, y = sql.Identifier(f"x{index}"), sql.Identifier(f"y{index}")
+    finite = sql.SQL("{x} > '-Infinity' AND {x} < 'Infinity' AND {y} > '-Infinity' AND {y} < 'Infinity'").format(x=x, y=y)
+    buckets = []
+    for value, (low, high), bins in ((x, spec.x_range, spec.bins[0]), (y, spec.y_range, spec.bins[1])):
+        buckets.append(sql.SQL("CASE WHEN {finite} THEN width_bucket({v}, {low}::float8, {high}::float8, {bins}) "
+                               "ELSE -1 END").format(finite=finite, v=value, low=sql.Literal(float(low)),
+                                                     high=sql.Literal(float(high)), bins=sql.Literal(int(bins))))
+    return buckets
+
+
+def statistics_sql(cursor, specs, where=None):
+    """
+    Computes several relations of one table with a single `GROUPING SETS` query.
+
+    Returns:
+        dict: {spec name: BinnedStatistic2D}.
+    """
+    tables = {spec.table for spec in specs}
+    if len(tables) != 1:
+        raise ValueError(f"Relations computed in one scan must share a table, got {sorted(tables)}")
+    values = []
+    for i, spec in enumerate(specs):
+        values += [sql.SQL("({})::float8 AS {}").format(sql.SQL(spec.x), sql.Identifier(f"x{i}")),
+                   sql.SQL("({})::float8 AS {}").format(sql.SQL(spec.y), sql.Identifier(f"y{i}"))]
+    buckets, aggregates, sets = [], [], []
+    for i, spec in enumerate(specs):
+        ix, iy = _bucket_pair_sql(spec, i)
+        buckets += [sql.SQL("{} AS {}").format(ix, sql.Identifier(f"ix{i}")),
+                    sql.SQL("{} AS {}").format(iy, sql.Identifier(f"iy{i}"))]
+        x, y = sql.Identifier(f"x{i}"), sql.Identifier(f"y{i}")
+        finite = sql.SQL("{} >= 0").format(sql.Identifier(f"ix{i}"))
+        for expression in (x, y, sql.SQL("{0} * {0}").format(x), sql.SQL("{0} * {0}").format(y),
+                           sql.SQL("{} * {}").format(x, y)):
+            aggregates.append(sql.SQL("SUM({}) FILTER (WHERE {})").format(expression, finite))
+        sets.append(sql.SQL("({}, {})").format(sql.Identifier(f"ix{i}"), sql.Identifier(f"iy{i}")))
+
+    query = sql.SQL(
+        "SELECT {keys}, COUNT(*), {aggregates} FROM ("
+        "SELECT *, {buckets} FROM (SELECT {values} FROM {table}{where}) v) b "
+        "GROUP BY GROUPING SETS ({sets})"
+    ).format(keys=sql.SQL(", ").join(sql.Identifier(f"{axis}{i}") for i in range(len(specs)) for axis in ('ix', 'iy')),
+             aggregates=sql.SQL(", ").join(aggregates), buckets=sql.SQL(", ").join(buckets),
+             values=sql.SQL(", ").join(values), table=sql.Identifier(*tables.pop()), where=where_clause(where),
+             sets=sql.SQL(", ").join(sets))
+    cursor.execute(query)
+
+    statistics = {spec.name: BinnedStatistic2D(spec) for spec in specs}
+    n_keys = 2 * len(specs)
+    for row in cursor.fetchall():
+        count = row[n_keys]
+        for i, spec in enumerate(specs):
+            ix, iy = row[2 * i], row[2 * i + 1]
+            if ix is None:
+                continue
+            sums = row[n_keys + 1 + len(SUMS) * i:n_keys + 1 + len(SUMS) * (i + 1)]
+            statistics[spec.name].add_bin(ix, iy, count, sums)
+    return statistics
+
+
+def statistics_chunked(connection, specs, chunk_size=DEFAULT_CHUNK_SIZE, where=None):
+    """
+    Computes several relations of one table by streaming x and y through a server-side cursor.
+
+    Returns:
+        dict: {spec name: BinnedStatistic2D}.
+    """
+    tables = {spec.table for spec in specs}
+    if len(tables) != 1:
+        raise ValueError(f"Relations computed in one scan must share a table, got {sorted(tables)}")
+    columns = [sql.SQL("({})::float8").format(sql.SQL(expression)) for spec in specs for expression in (spec.x, spec.y)]
+    query = sql.SQL("SELECT {} FROM {}{}").format(sql.SQL(", ").join(columns), sql.Identifier(*tables.pop()),
+                                                  where_clause(where))
+
+    statistics = {spec.name: BinnedStatistic2D(spec) for spec in specs}
+    with connection.cursor(name="stage2_relations", cursor_factory=psycopg2.extensions.cursor) as cursor:
+        cursor.itersize = chunk_size
+        cursor.execute(query)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = np.array(rows, dtype=np.float64)
+            for i, spec in enumerate(specs):
+                statistics[spec.name].accumulate(chunk[:, 2 * i], chunk[:, 2 * i + 1])
+    return statistics
+
+
+def compute_statistics(connection, specs, method='sql', chunk_size=DEFAULT_CHUNK_SIZE, cursor=None, where=None):
+    """Runs the chosen database engine ('sql' or 'chunked') over relations of one table, restricted by `where`."""
+    if method == 'chunked':
+        return statistics_chunked(connection, specs, chunk_size, where)
+    if cursor is not None:
+        return statistics_sql(cursor, specs, where)
+    with connection.cursor() as own_cursor:
+        return statistics_sql(own_cursor, specs, where)
+
+
+def statistics_from_fits(path, specs, columns, chunk_rows=DEFAULT_FITS_CHUNK_ROWS):
+    """
+    Accumulates relations from one FITS file, reading memory-mapped row slices.
+
+    Args:
+        path (str): FITS file.
+        specs (list): BinnedSpec2Ds with an `arrays` function.
+        columns (dict): {column: (HDU name, FITS column)} passed to the `arrays` functions.
+        chunk_rows (int): Rows per slice.
+
+    Returns:
+        dict: {spec name: BinnedStatistic2D}.
+    """
+    statistics = {spec.name: BinnedStatistic2D(spec) for spec in specs}
+    with fits.open(path, memmap=True) as hdul:
+        n_rows = min(hdul[hdu].header['NAXIS2'] for hdu, _ in columns.values())
+        for start in range(0, n_rows, chunk_rows):
+            stop = min(start + chunk_rows, n_rows)
+            chunk = {name: np.asarray(hdul[hdu].data[column][start:stop], dtype=np.float64)
+                     for name, (hdu, column) in columns.items()}
+            for spec in specs:
+                statistics[spec.name].accumulate(*spec.arrays(chunk))
+    return statistics
+
+
+def statistics_from_fits_files(paths, specs, columns, workers=None, chunk_rows=DEFAULT_FITS_CHUNK_ROWS):
+    """
+    Accumulates relations over many FITS files, one file per worker process.
+
+    Per-file summaries are merged in sorted path order, so the result does not depend on
+    which worker finished first.
+
+    Returns:
+        dict: {spec name: BinnedStatistic2D}.
+    """
+    paths = sorted(paths)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        partials = list(executor.map(statistics_from_fits, paths, [specs] * len(paths), [columns] * len(paths),
+                                     [chunk_rows] * len(paths)))
+    merged = {spec.name: BinnedStatistic2D(spec) for spec in specs}
+    for partial in partials:
+        merged = {name: merged[name].merge(partial[name]) for name in merged}
+    return merged
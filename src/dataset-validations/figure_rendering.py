@@ -0,0 +1,245 @@
+#
+# =================================================================================================
+#
+# File: figure_rendering.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Figure rendering for Stage 2: every diagnostic figure is drawn from pre-binned summaries
+#   (histograms, 2D binned statistics, presorted void arrays, per-region statistics), never
+#   from raw points, and the figures are rendered in parallel across a process pool.
+#
+#   A `FigureSpec` names the output file, a module-level renderer, the summaries it reads and
+#   its drawing options. A figure's key hashes the renderer, its options and the content hash
+#   of each input summary; keys are kept in a manifest next to the figures, so a figure whose
+#   inputs have not changed since the last render is skipped. Only the few kilobytes of bins
+#   each figure needs are sent to its worker, and each PNG is written atomically.
+#
+# =================================================================================================
+#
+
+import hashlib
+import json
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.colors import LogNorm
+
+from binned_statistics import BinnedStatistic2D
+
+# Bump whenever the drawing code changes, so every figure is rendered again.
+RENDERER_VERSION = 1
+MANIFEST_NAME = ".figure_manifest.json"
+DPI = 150
+
+# `renderer(inputs, **options)` returns a matplotlib Figure; `inputs` names the summaries.
+FigureSpec = namedtuple('FigureSpec', ['filename', 'renderer', 'inputs', 'options'], defaults=({},))
+
+# --- RENDERERS ---
+# Module-level functions, so worker processes can unpickle them by name.
+
+def render_histogram(inputs, name, xlabel, ylabel, title):
+    """Stairs plot of a 1D histogram's in-range bins, on a log scale."""
+    histogram = inputs[name]
+    fig, ax = plt.subplots(figsize=(8, 5))
+    ax.stairs(histogram.total()[1:-1], histogram.edges, fill=True, alpha=0.7)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.set_yscale('log')
+    ax.set_title(title)
+    fig.tight_layout()
+    return fig
+
+
+def render_void_sizes(inputs, name, quantity):
+    """Void size distributions of every finder, both caps together."""
+    by_algorithm = inputs[name].collapse(('algorithm',))
+    fig, ax = plt.subplots(figsize=(8, 5))
+    for group in by_algorithm.groups():
+        counts, edges = by_algorithm.histogram(quantity, group)
+        ax.stairs(counts, edges, label=f"{group[0]} ({by_algorithm.row_count(group):,})")
+    ax.set_xlabel("Void radius (Mpc/h)")
+    ax.set_ylabel("Voids per bin")
+    ax.set_title("Void Size Distributions by Algorithm")
+    ax.legend()
+    fig.tight_layout()
+    return fig
+
+
+def render_void_caps(inputs, name, caps):
+    """Void counts of every finder per galactic cap."""
+    voids = inputs[name]
+    algorithms = sorted({group[0] for group in voids.groups()})
+    fig, ax = plt.subplots(figsize=(8, 5))
+    width = 0.8 / len(caps)
+    for i, cap in enumerate(caps):
+        ax.bar([j + i * width for j in range(len(algorithms))],
+               [voids.row_count((a, cap)) for a in algorithms], width, label=cap)
+    ax.set_xticks([j + width * (len(caps) - 1) / 2 for j in range(len(algorithms))], algorithms)
+    ax.set_ylabel("Voids")
+    ax.set_title("Void Galactic Cap Distribution")
+    ax.legend()
+    fig.tight_layout()
+    return fig
+
+
+def render_relation(inputs, name, xlabel, ylabel, title, min_column_count, threshold=None, threshold_label=None):
+    """Binned 2D counts of a scaling relation with its median and 5/95th percentile lines."""
+    relation = inputs[name]
+    fig, ax = plt.subplots(figsize=(8, 6))
+    counts = np.ma.masked_equal(relation.count[1:-1, 1:-1].T, 0)
+    mesh = ax.pcolormesh(relation.x_edges, relation.y_edges, counts, norm=LogNorm(), cmap='viridis')
+    fig.colorbar(mesh, ax=ax, label="Galaxies per bin")
+    populated = relation.column_counts() >= min_column_count
+    for q, style in ((0.5, '-'), (0.05, ':'), (0.95, ':')):
+        ax.plot(relation.x_centres()[populated], relation.quantile_y(q)[populated], style, color='white')
+    if threshold is not None:
+        ax.axhline(threshold, color='red', linestyle='--', label=threshold_label)
+        ax.legend(loc='lower left')
+    r = relation.pearson()
+    ax.set_title(f"{title} (r = {'n/a' if r is None else f'{r:.3f}'})")
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    fig.tight_layout()
+    return fig
+
+
+def render_regional_flags(inputs, name, shift_sigma):
+    """Heatmap of every region's median shift per quantity, flagged regions marked."""
+    regions = inputs[name]
+    table = regions.regions
+    quantities = list(regions.spec.quantities)
+    fig, axes = plt.subplots(1, len(quantities), figsize=(4 * len(quantities), 5), sharey=True)
+    mesh = None
+    for ax, quantity in zip(np.atleast_1d(axes), quantities):
+        frame = table[table['quantity'] == quantity] if not table.empty else table
+        if frame.empty:
+            continue
+        grid = frame.pivot(index='healpix_id', columns='z_slice', values='median_z')
+        mesh = ax.imshow(grid.to_numpy(), cmap='RdBu_r', vmin=-2 * shift_sigma, vmax=2 * shift_sigma,
+                         aspect='auto', origin='lower')
+        flagged = frame[frame['flags'] != ""]
+        ax.scatter([grid.columns.get_loc(s) for s in flagged['z_slice']],
+                   [grid.index.get_loc(h) for h in flagged['healpix_id']], marker='x', color='black')
+        ax.set_xticks(range(len(grid.columns)),
+                      [f"{regions.spec.z_edges[s]:g}-{regions.spec.z_edges[s + 1]:g}" for s in grid.columns],
+                      rotation=45)
+        ax.set_yticks(range(len(grid.index)), [f"hp{h:02d}" for h in grid.index])
+        ax.set_title(quantity)
+        ax.set_xlabel("Redshift slice")
+    if mesh is not None:
+        fig.colorbar(mesh, ax=axes, label="Median shift (σ)")
+    fig.suptitle("Regional Median Shifts (× = flagged)")
+    return fig
+
+# --- RENDERING ---
+
+def figure_key(figure, summaries):
+    """Hash of a figure's renderer, options and input contents."""
+    payload = [RENDERER_VERSION, figure.renderer.__name__, repr(sorted(figure.options.items())),
+               [summaries[name].content_hash() for name in figure.inputs]]
+    return hashlib.sha1(json.dumps(payload).encode()).hexdigest()[:16]
+
+
+def _portable(summary):
+    # 2D specs may carry the FITS column function of the calling script; workers do not need it.
+    if isinstance(summary, BinnedStatistic2D) and summary.spec.arrays is not None:
+        return BinnedStatistic2D(summary.spec._replace(arrays=None), summary.count, summary.sums, summary.nonfinite)
+    return summary
+
+
+def _render(renderer, inputs, path, options):
+    fig = renderer(inputs, **options)
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp{path.suffix}")
+    fig.savefig(tmp_path, dpi=DPI)
+    plt.close(fig)
+    tmp_path.replace(path)
+    return path
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(path, manifest):
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as handle:
+        json.dump(manifest, handle, indent=2, sort_keys=True)
+    tmp_path.replace(path)
+
+
+def render_figures(figures, summaries, plot_dir, workers=None, force=False):
+    """
+    Renders every figure whose inputs are available and changed since its last render.
+
+    Args:
+        figures (list): FigureSpecs to render.
+        summaries (dict): {name: summary with a `content_hash()`}.
+        plot_dir (Path): Output directory, holding the manifest of rendered keys.
+        workers (int, optional): Worker processes (default: all cores; 1 renders in-process).
+        force (bool): Render every figure regardless of the manifest.
+
+    Returns:
+        tuple: (rendered paths, skipped paths, {filename: error} of failed renders).
+    """
+    plot_dir = Path(plot_dir)
+    plot_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = plot_dir / MANIFEST_NAME
+    manifest = _load_manifest(manifest_path)
+
+    pending, skipped = [], []
+    for figure in figures:
+        if any(name not in summaries for name in figure.inputs):
+            continue
+        key = figure_key(figure, summaries)
+        path = plot_dir / figure.filename
+        if not force and manifest.get(figure.filename) == key and path.exists():
+            skipped.append(path)
+        else:
+            pending.append((figure, key, path))
+
+    rendered, failed = [], {}
+    tasks = [(figure.renderer, {name: _portable(summaries[name]) for name in figure.inputs}, path, figure.options)
+             for figure, _, path in pending]
+    workers = min(workers or os.cpu_count() or 1, len(pending))
+    if workers <= 1:
+        outcomes = []
+        for task in tasks:
+            try:
+                outcomes.append(_render(*task))
+            except Exception as e:
+                outcomes.append(e)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_render, *task): i for i, task in enumerate(tasks)}
+            outcomes = [None] * len(tasks)
+            for future in as_completed(futures):
+                try:
+                    outcomes[futures[future]] = future.result()
+                except Exception as e:
+                    outcomes[futures[future]] = e
+
+    for (figure, key, path), outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            logging.error(f"❌ Rendering {figure.filename} failed: {outcome}")
+            manifest.pop(figure.filename, None)
+            failed[figure.filename] = str(outcome)
+        else:
+            manifest[figure.filename] = key
+            rendered.append(path)
+    _save_manifest(manifest_path, manifest)
+    return rendered, skipped, failed
@@ -0,0 +1,371 @@
+#
+# =================================================================================================
+#
+# File: histograms.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Server-side 1D histograms for the Stage 2 distributions, so that only binned arrays
+#   leave the database instead of millions of rows.
+#
+#   A `HistogramSpec` names a SQL expression over one table, its binning and optional
+#   grouping columns (e.g. void algorithm and galactic cap). Every histogram of a table is
+#   computed in a single scan with one of two interchangeable engines:
+#     - 'sql':     each value is mapped to its bin with `width_bucket`, and one query with
+#                  `GROUP BY GROUPING SETS` returns the counts of all histograms at once.
+#     - 'chunked': the values are streamed through a named (server-side) cursor in fixed-size
+#                  chunks and binned with NumPy, using the same bin formula as `width_bucket`,
+#                  so client memory is bounded by the chunk size. Useful when the aggregate
+#                  query is too expensive to plan or run on a busy server.
+#   Bins follow `width_bucket`: index 0 counts values below the range and index bins + 1
+#   values at or above it. NULL, NaN and +/-Infinity are counted separately as non-finite.
+#   A spec may also carry "tallies", named predicates counted in the same scan (e.g. the
+#   number of negative SFRs), which feed red-flag checks without another query. Both engines
+#   accept a `where` predicate restricting the scan (e.g. to one source file's partition).
+#
+# =================================================================================================
+#
+
+import hashlib
+import json
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import psycopg2.extensions
+from psycopg2 import sql
+
+HISTOGRAM_METHODS = ('sql', 'chunked')
+
+# Rows fetched per round trip by the chunked engine.
+DEFAULT_CHUNK_SIZE = 100_000
+
+# `expression` and tally predicates are trusted SQL fragments defined by the validation
+# scripts; `table` is a (schema, table) pair.
+HistogramSpec = namedtuple('HistogramSpec', ['name', 'table', 'expression', 'low', 'high', 'bins',
+                                             'group_by', 'tallies'], defaults=((), ()))
+
+
+def bucket_indices(values, low, high, bins):
+    """
+    Maps finite values to `width_bucket(value, low, high, bins)` indices.
+
+    Returns:
+        np.ndarray: Integer bins in [0, bins + 1].
+    """
+    buckets = np.floor((values - low) * bins / (high - low)) + 1
+    return np.clip(buckets, 0, bins + 1).astype(np.int64)
+
+
+def binned_quantile(counts, edges, q):
+    """
+    Approximate quantile from `width_bucket` counts, interpolated linearly within a bin.
+
+    Values outside the range count towards the rank but are placed at the range edges,
+    so quantiles that fall outside the range are clamped to the first or last edge.
+
+    Args:
+        counts (np.ndarray): bins + 2 counts, underflow first and overflow last.
+        edges (np.ndarray): bins + 1 bin edges.
+        q (float): Quantile in [0, 1].
+
+    Returns:
+        float or None: The quantile, or None if there are no values.
+    """
+    n = counts.sum()
+    if n == 0:
+        return None
+    cumulative = np.cumsum(counts)
+    rank = q * n
+    if rank <= cumulative[0]:
+        return float(edges[0])
+    if rank > cumulative[-2]:
+        return float(edges[-1])
+    i = int(np.searchsorted(cumulative, rank))
+    fraction = (rank - cumulative[i - 1]) / counts[i]
+    return float(edges[i - 1] + fraction * (edges[i] - edges[i - 1]))
+
+
+class Histogram:
+    """
+    Mergeable binned counts of one spec, per group.
+
+    Args:
+        spec (HistogramSpec): Expression and binning.
+        counts (dict, optional): {group tuple: int64 array of length bins + 2}.
+        nonfinite (dict, optional): {group tuple: NULL/NaN/Infinity count}.
+        tallies (dict, optional): {group tuple: {tally name: count}}.
+    """
+
+    def __init__(self, spec, counts=None, nonfinite=None, tallies=None):
+        self.spec = spec
+        self.edges = np.linspace(spec.low, spec.high, spec.bins + 1)
+        self.counts = counts if counts is not None else {}
+        self.nonfinite = nonfinite if nonfinite is not None else {}
+        self.tallies = tallies if tallies is not None else {}
+
+    def _slot(self, group):
+        if group not in self.counts:
+            self.counts[group] = np.zeros(self.spec.bins + 2, dtype=np.int64)
+            self.nonfinite[group] = 0
+            self.tallies[group] = {name: 0 for name, _ in self.spec.tallies}
+        return self.counts[group]
+
+    def add(self, group, bucket, count, tallies=None):
+        """Adds `count` rows to one bucket (-1 for non-finite values), as returned by SQL."""
+        counts = self._slot(group)
+        if bucket < 0:
+            self.nonfinite[group] += count
+        else:
+            counts[bucket] += count
+        for name, value in (tallies or {}).items():
+            self.tallies[group][name] += value
+
+    def fill(self, group, values, tallies=None):
+        """
+        Bins an array of raw values.
+
+        Args:
+            group (tuple): Group the values belong to.
+            values (np.ndarray): Float values; NaN stands for NULL.
+            tallies (dict, optional): {tally name: boolean mask or count}.
+        """
+        counts = self._slot(group)
+        finite = np.isfinite(values)
+        self.nonfinite[group] += int(len(values) - np.count_nonzero(finite))
+        buckets = bucket_indices(values[finite], self.spec.low, self.spec.high, self.spec.bins)
+        counts += np.bincount(buckets, minlength=self.spec.bins + 2)
+        for name, mask in (tallies or {}).items():
+            self.tallies[group][name] += int(np.count_nonzero(mask))
+
+    def merge(self, other):
+        """Adds another histogram of the same spec (e.g. from another chunk or worker)."""
+        merged = Histogram(self.spec)
+        for source in (self, other):
+            for group, counts in source.counts.items():
+                merged._slot(group)
+                merged.counts[group] += counts
+                merged.nonfinite[group] += source.nonfinite[group]
+                for name, value in source.tallies[group].items():
+                    merged.tallies[group][name] += value
+        return merged
+
+    def collapse(self, keep=()):
+        """
+        Sums the groups over every grouping column not in `keep`.
+
+        Returns:
+            Histogram: A histogram grouped by `keep` only (a single () group if empty).
+        """
+        index = [self.spec.group_by.index(col) for col in keep]
+        collapsed = Histogram(self.spec._replace(group_by=tuple(keep)))
+        for group in sorted(self.counts, key=group_sort_key):
+            key = tuple(group[i] for i in index)
+            collapsed.add(key, -1, self.nonfinite[group], self.tallies[group])
+            collapsed.counts[key] += self.counts[group]
+        return collapsed
+
+    def groups(self):
+        return sorted(self.counts, key=group_sort_key)
+
+    def total(self, group=None):
+        """Bin counts of one group, or summed over all groups."""
+        if group is not None:
+            return self.counts.get(group, np.zeros(self.spec.bins + 2, dtype=np.int64))
+        return sum(self.counts.values(), np.zeros(self.spec.bins + 2, dtype=np.int64))
+
+    def row_count(self, group=None):
+        groups = [group] if group is not None else self.counts
+        return int(sum(self.total(g).sum() + self.nonfinite.get(g, 0) for g in groups))
+
+    def tally(self, name, group=None):
+        groups = [group] if group is not None else self.tallies
+        return int(sum(self.tallies.get(g, {}).get(name, 0) for g in groups))
+
+    def quantile(self, q, group=None):
+        """Approximate quantile of the finite values (see `binned_quantile`)."""
+        return binned_quantile(self.total(group), self.edges, q)
+
+    def mean(self, group=None):
+        """Mean of the in-range values, from bin centres."""
+        counts = self.total(group)[1:-1]
+        if counts.sum() == 0:
+            return None
+        centres = (self.edges[:-1] + self.edges[1:]) / 2
+        return float(np.average(centres, weights=counts))
+
+    def content_hash(self):
+        """Short hash of the binning and every group's counts, non-finite counts and tallies."""
+        digest = hashlib.sha1(json.dumps([self.spec.low, self.spec.high, self.spec.bins]).encode())
+        for group in self.groups():
+            digest.update(json.dumps([list(group), self.nonfinite[group], self.tallies[group]],
+                                     sort_keys=True, default=int).encode())
+            digest.update(self.counts[group].tobytes())
+        return digest.hexdigest()[:16]
+
+    def to_dict(self):
+        """JSON-friendly form: edges plus per-group counts, non-finite counts and tallies."""
+        return {
+            'expression': self.spec.expression,
+            'edges': self.edges.tolist(),
+            'groups': [{'group': list(group), 'counts': self.counts[group].tolist(),
+                        'nonfinite': self.nonfinite[group], 'tallies': self.tallies[group]}
+                       for group in self.groups()],
+        }
+
+
+def group_sort_key(group):
+    """Sort key for group tuples that may hold None (NULL) values, which sort last."""
+    return tuple((value is None, value if value is not None else 0) for value in group)
+
+
+def where_clause(where):
+    """Renders an optional `sql.Composable` predicate as a WHERE clause."""
+    return sql.SQL(" WHERE {}").format(where) if where is not None else sql.SQL("")
+
+
+def _check_specs(specs):
+    tables = {spec.table for spec in specs}
+    if len(tables) != 1:
+        raise ValueError(f"Histograms computed in one scan must share a table, got {sorted(tables)}")
+    return tables.pop()
+
+
+def _group_columns(specs):
+    return list(dict.fromkeys(col for spec in specs for col in spec.group_by))
+
+
+def _bucket_sql(spec):
+    value = sql.SQL("({})").format(sql.SQL(spec.expression))
+    return sql.SQL(
+        "CASE WHEN {v} > '-Infinity' AND {v} < 'Infinity' "
+        "THEN width_bucket({v}, {low}::float8, {high}::float8, {bins}) ELSE -1 END"
+    ).format(v=value, low=sql.Literal(float(spec.low)), high=sql.Literal(float(spec.high)),
+             bins=sql.Literal(int(spec.bins)))
+
+
+def histograms_sql(cursor, specs, where=None):
+    """
+    Computes several histograms of one table with a single `GROUPING SETS` query.
+
+    Each spec contributes one grouping set, (its grouping columns, its bucket); a result row
+    belongs to the spec whose bucket column is not NULL (buckets themselves never are).
+
+    Returns:
+        dict: {spec name: Histogram}.
+    """
+    table = _check_specs(specs)
+    group_columns = _group_columns(specs)
+    tallies = [(i, name, predicate) for i, spec in enumerate(specs) for name, predicate in spec.tallies]
+
+    inner = [sql.Identifier(col) for col in group_columns]
+    inner += [sql.SQL("{} AS {}").format(_bucket_sql(spec), sql.Identifier(f"b{i}")) for i, spec in enumerate(specs)]
+    inner += [sql.SQL("({}) AS {}").format(sql.SQL(predicate), sql.Identifier(f"t{i}_{name}"))
+              for i, name, predicate in tallies]
+    outer = [sql.Identifier(col) for col in group_columns]
+    outer += [sql.Identifier(f"b{i}") for i in range(len(specs))]
+    outer += [sql.SQL("COUNT(*)")]
+    outer += [sql.SQL("COUNT(*) FILTER (WHERE {})").format(sql.Identifier(f"t{i}_{name}")) for i, name, _ in tallies]
+    sets = [sql.SQL("({})").format(sql.SQL(", ").join(
+        [sql.Identifier(col) for col in spec.group_by] + [sql.Identifier(f"b{i}")]))
+        for i, spec in enumerate(specs)]
+
+    query = sql.SQL(
+        "SELECT {outer} FROM (SELECT {inner} FROM {table}{where}) s GROUP BY GROUPING SETS ({sets})"
+    ).format(outer=sql.SQL(", ").join(outer), inner=sql.SQL(", ").join(inner),
+             table=sql.Identifier(*table), where=where_clause(where), sets=sql.SQL(", ").join(sets))
+    cursor.execute(query)
+
+    histograms = {spec.name: Histogram(spec) for spec in specs}
+    n_group, n_spec = len(group_columns), len(specs)
+    for row in cursor.fetchall():
+        values = dict(zip(group_columns, row[:n_group]))
+        buckets = row[n_group:n_group + n_spec]
+        count = row[n_group + n_spec]
+        tally_counts = row[n_group + n_spec + 1:]
+        for i, spec in enumerate(specs):
+            if buckets[i] is None:
+                continue
+            own = {name: value for (j, name, _), value in zip(tallies, tally_counts) if j == i}
+            histograms[spec.name].add(tuple(values[col] for col in spec.group_by), buckets[i], count, own)
+    return histograms
+
+
+def _group_codes(rows, index):
+    """
+    Group code of every fetched row, with the groups in first-seen order.
+
+    Keys are read from the row tuples as fetched rather than through a pandas group-by, so
+    NULLs stay a (None, ...) group and integer columns stay integers, as in the SQL engine.
+    """
+    groups = {}
+    codes = np.fromiter((groups.setdefault(tuple(row[j] for j in index), len(groups)) for row in rows),
+                        dtype=np.int64, count=len(rows))
+    return codes, list(groups)
+
+
+def histograms_chunked(connection, specs, chunk_size=DEFAULT_CHUNK_SIZE, where=None):
+    """
+    Computes several histograms of one table by streaming it through a server-side cursor.
+
+    Only the grouping columns, the evaluated expressions and the tally predicates are
+    fetched, `chunk_size` rows at a time, and each chunk is binned and discarded.
+
+    Returns:
+        dict: {spec name: Histogram}.
+    """
+    table = _check_specs(specs)
+    group_columns = _group_columns(specs)
+    columns = [sql.Identifier(col) for col in group_columns]
+    columns += [sql.SQL("({})::float8").format(sql.SQL(spec.expression)) for spec in specs]
+    columns += [sql.SQL("COALESCE({}, false)").format(sql.SQL(predicate))
+                for spec in specs for _, predicate in spec.tallies]
+    names = group_columns + [f"v{i}" for i in range(len(specs))]
+    names += [f"t{i}_{name}" for i, spec in enumerate(specs) for name, _ in spec.tallies]
+    query = sql.SQL("SELECT {} FROM {}{}").format(sql.SQL(", ").join(columns), sql.Identifier(*table),
+                                                  where_clause(where))
+
+    histograms = {spec.name: Histogram(spec) for spec in specs}
+    # Named cursors keep the result set on the server; instrumentation would re-execute them.
+    with connection.cursor(name="stage2_histograms", cursor_factory=psycopg2.extensions.cursor) as cursor:
+        cursor.itersize = chunk_size
+        cursor.execute(query)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = pd.DataFrame(rows, columns=names)
+            for i, spec in enumerate(specs):
+                codes, groups = _group_codes(rows, [group_columns.index(col) for col in spec.group_by])
+                values = chunk[f"v{i}"].to_numpy(dtype=np.float64, na_value=np.nan)
+                tallies = {name: chunk[f"t{i}_{name}"].to_numpy(dtype=bool) for name, _ in spec.tallies}
+                for code, group in enumerate(groups):
+                    rows_in_group = codes == code
+                    histograms[spec.name].fill(group, values[rows_in_group],
+                                               {name: mask[rows_in_group] for name, mask in tallies.items()})
+    return histograms
+
+
+def compute_histograms(connection, specs, method='sql', chunk_size=DEFAULT_CHUNK_SIZE, cursor=None, where=None):
+    """
+    Runs the chosen engine ('sql' or 'chunked') over specs that share one table.
+
+    Args:
+        connection: psycopg2 connection.
+        specs (list): HistogramSpecs of one table.
+        method (str): Engine name.
+        chunk_size (int): Rows per fetch for the chunked engine.
+        cursor (optional): Cursor for the SQL engine (e.g. an instrumented one).
+        where (sql.Composable, optional): Predicate restricting the rows scanned.
+
+    Returns:
+        dict: {spec name: Histogram}.
+    """
+    if method == 'chunked':
+        return histograms_chunked(connection, specs, chunk_size, where)
+    if cursor is not None:
+        return histograms_sql(cursor, specs, where)
+    with connection.cursor() as own_cursor:
+        return histograms_sql(own_cursor, specs, where)
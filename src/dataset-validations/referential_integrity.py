@@ -0,0 +1,189 @@
+#
+# =================================================================================================
+#
+# File: referential_integrity.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Cross-catalog referential integrity: every key in a mapping table (void membership,
+#   environment classification) must exist in the catalog it points to.
+#
+#   Each relation is checked in one pass, grouped by algorithm and galactic cap, reporting
+#   how many keys were checked, how many are orphans, and a few sample orphan keys. Two
+#   interchangeable engines are provided:
+#     - 'sql':   a LEFT JOIN aggregated with `COUNT(*) FILTER (...)`, which PostgreSQL runs as
+#                a hash join over the parent keys, so nothing leaves the server but the
+#                per-group summary.
+#     - 'numpy': parent keys are fetched once with `COPY`, sorted, and every child key is
+#                located with one vectorized `searchsorted`; groups are summarised with pandas.
+#   Scoped relations (e.g. a void_id must also belong to the member's algorithm) combine the
+#   scope and key into one sortable 64-bit key, as the void catalog does for (cap, index).
+#
+#   The galaxy and void catalogs live in separate databases, so the child and parent tables
+#   are read through separate cursors. The SQL engine joins both sides in one query and runs
+#   only when the two cursors share a database; otherwise the NumPy engine is used.
+#
+# =================================================================================================
+#
+
+from collections import namedtuple
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+from psycopg2 import sql
+
+RI_METHODS = ('sql', 'numpy')
+
+# Orphan keys reported per group.
+ORPHAN_SAMPLE_SIZE = 5
+
+# A child column that must reference a parent column. `scope`, if set, is a column present in
+# both tables that must match as well (the parent key is then only unique within a scope).
+ForeignKey = namedtuple('ForeignKey', ['child', 'column', 'parent', 'parent_column', 'group_by', 'scope'],
+                        defaults=(None,))
+
+MEMBERSHIP_TABLE = ('science_analysis', 'zone_void_membership')
+CLASSIFICATION_TABLE = ('science_analysis', 'environmental_classification')
+GALAXY_TABLE = ('raw_catalogs', 'fastspecfit_galaxies')
+VOID_TABLE = ('raw_catalogs', 'desivast_voids')
+
+RELATIONS = [
+    ForeignKey(MEMBERSHIP_TABLE, 'targetid', GALAXY_TABLE, 'targetid', ('algorithm', 'galactic_cap')),
+    ForeignKey(MEMBERSHIP_TABLE, 'void_id', VOID_TABLE, 'void_id', ('algorithm', 'galactic_cap'), 'algorithm'),
+    ForeignKey(CLASSIFICATION_TABLE, 'targetid', GALAXY_TABLE, 'targetid', ('algorithm',)),
+    ForeignKey(CLASSIFICATION_TABLE, 'void_id', VOID_TABLE, 'void_id', ('algorithm',), 'algorithm'),
+    ForeignKey(CLASSIFICATION_TABLE, 'nearest_void_id', VOID_TABLE, 'void_id', ('algorithm',), 'algorithm'),
+]
+
+# Scoped keys are packed as (scope code << 40) | key; keys must fit in 40 bits.
+_SCOPE_SHIFT = 40
+
+
+def describe(relation):
+    """Short 'child.column -> parent.column' label for a relation."""
+    return f"{relation.child[1]}.{relation.column} → {relation.parent[1]}.{relation.parent_column}"
+
+
+def orphans_sql(cursor, relation, sample_size=ORPHAN_SAMPLE_SIZE):
+    """
+    Counts orphan keys per group with a single server-side join.
+
+    Parent keys are assumed unique (they are primary keys), so the LEFT JOIN never
+    duplicates child rows.
+
+    Returns:
+        list: One dict per group with 'group', 'checked', 'orphans' and 'sample'.
+    """
+    group = [sql.SQL("c.{}").format(sql.Identifier(col)) for col in relation.group_by]
+    condition = sql.SQL("p.{} = c.{}").format(sql.Identifier(relation.parent_column), sql.Identifier(relation.column))
+    if relation.scope:
+        condition = condition + sql.SQL(" AND p.{0} = c.{0}").format(sql.Identifier(relation.scope))
+    query = sql.SQL(
+        "SELECT {group}, COUNT(*), COUNT(*) FILTER (WHERE p.{pkey} IS NULL), "
+        "(ARRAY_AGG(c.{key} ORDER BY c.{key}) FILTER (WHERE p.{pkey} IS NULL))[1:{n}] "
+        "FROM {child} c LEFT JOIN {parent} p ON {condition} "
+        "WHERE c.{key} IS NOT NULL GROUP BY {group} ORDER BY {group}"
+    ).format(
+        group=sql.SQL(", ").join(group),
+        pkey=sql.Identifier(relation.parent_column),
+        key=sql.Identifier(relation.column),
+        n=sql.Literal(sample_size),
+        child=sql.Identifier(*relation.child),
+        parent=sql.Identifier(*relation.parent),
+        condition=condition,
+    )
+    cursor.execute(query)
+    n_group = len(relation.group_by)
+    return [{'group': tuple(row[:n_group]), 'checked': row[n_group], 'orphans': row[n_group + 1],
+             'sample': list(row[n_group + 2] or [])}
+            for row in cursor.fetchall()]
+
+
+def _fetch_frame(cursor, query):
+    """Streams a query result into a DataFrame with `COPY ... TO STDOUT`."""
+    buffer = StringIO()
+    cursor.copy_expert(sql.SQL("COPY ({}) TO STDOUT WITH (FORMAT CSV, HEADER)").format(query), buffer)
+    buffer.seek(0)
+    return pd.read_csv(buffer)
+
+
+def _packed_keys(keys, scopes, scope_codes):
+    keys = keys.astype(np.int64)
+    if scopes is None:
+        return keys
+    return scopes.map(scope_codes).to_numpy(dtype=np.int64) << _SCOPE_SHIFT | keys
+
+
+def orphans_numpy(child_cursor, parent_cursor, relation, sample_size=ORPHAN_SAMPLE_SIZE):
+    """
+    Counts orphan keys per group with sorted-array membership tests in NumPy.
+
+    Each side is fetched through its own cursor, so the tables may be in different databases.
+
+    Returns:
+        list: One dict per group with 'group', 'checked', 'orphans' and 'sample'.
+    """
+    scope = [relation.scope] if relation.scope else []
+    parent = _fetch_frame(parent_cursor, sql.SQL("SELECT {} FROM {}").format(
+        sql.SQL(", ").join(sql.Identifier(col) for col in [relation.parent_column] + scope),
+        sql.Identifier(*relation.parent)))
+    child_columns = list(dict.fromkeys(list(relation.group_by) + scope + [relation.column]))
+    child = _fetch_frame(child_cursor, sql.SQL("SELECT {} FROM {} WHERE {} IS NOT NULL").format(
+        sql.SQL(", ").join(sql.Identifier(col) for col in child_columns),
+        sql.Identifier(*relation.child), sql.Identifier(relation.column)))
+
+    scope_codes = None
+    if relation.scope:
+        values = pd.unique(pd.concat([parent[relation.scope], child[relation.scope]]))
+        scope_codes = {value: code for code, value in enumerate(values)}
+    parent_keys = np.unique(_packed_keys(parent[relation.parent_column].to_numpy(),
+                                         parent[relation.scope] if relation.scope else None, scope_codes))
+    child_keys = _packed_keys(child[relation.column].to_numpy(),
+                              child[relation.scope] if relation.scope else None, scope_codes)
+
+    if len(parent_keys):
+        pos = np.minimum(np.searchsorted(parent_keys, child_keys), len(parent_keys) - 1)
+        found = parent_keys[pos] == child_keys
+    else:
+        found = np.zeros(len(child_keys), dtype=bool)
+    child['orphan'] = ~found
+
+    summary = child.groupby(list(relation.group_by), sort=True)['orphan'].agg(['size', 'sum'])
+    samples = (child[child['orphan']].sort_values(relation.column)
+               .groupby(list(relation.group_by))[relation.column]
+               .apply(lambda keys: keys.head(sample_size).tolist()))
+    results = []
+    for group, row in summary.iterrows():
+        group = group if isinstance(group, tuple) else (group,)
+        sample = samples.get(group if len(group) > 1 else group[0], [])
+        results.append({'group': group, 'checked': int(row['size']), 'orphans': int(row['sum']),
+                        'sample': [int(key) for key in sample]})
+    return results
+
+
+def same_database(child_cursor, parent_cursor):
+    """Whether two cursors are connected to the same database, so one query can join both tables."""
+    child, parent = (cursor.connection.get_dsn_parameters() for cursor in (child_cursor, parent_cursor))
+    return all(child.get(key) == parent.get(key) for key in ('host', 'port', 'dbname'))
+
+
+def find_orphans(child_cursor, parent_cursor, relation, method='sql', sample_size=ORPHAN_SAMPLE_SIZE):
+    """
+    Runs one relation's orphan census with the chosen engine ('sql' or 'numpy').
+
+    Args:
+        child_cursor: A cursor on the database holding `relation.child`.
+        parent_cursor: A cursor on the database holding `relation.parent`.
+        relation (ForeignKey): The relation to check.
+        method (str): 'sql' falls back to 'numpy' when the tables are in different databases.
+        sample_size (int): Orphan keys reported per group.
+
+    Returns:
+        list: One dict per group with 'group', 'checked', 'orphans' and 'sample'.
+    """
+    if method == 'sql' and same_database(child_cursor, parent_cursor):
+        return orphans_sql(child_cursor, relation, sample_size)
+    return orphans_numpy(child_cursor, parent_cursor, relation, sample_size)
@@ -0,0 +1,244 @@
+#
+# =================================================================================================
+#
+# File: regional_outliers.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Robust per-region red-flag detection for Stage 2. Global distributions can look healthy
+#   while one HEALPix file carries a processing problem (a shifted mass scale, a broken
+#   D4000 fit), so galaxy properties are summarised per (healpix_id, redshift slice) region
+#   and every region is compared with the other regions of the same redshift slice.
+#
+#   The columns are streamed once through a server-side cursor. Each quantity is then
+#   summarised for all regions at once with a sort-based group-by: one `lexsort` by
+#   (region, value) puts every region's values in order, so medians are read at fixed offsets
+#   from the group boundaries; a second sort of the absolute deviations gives the MADs. Tail
+#   fractions (values beyond 5 robust sigma of the slice) are summed with `np.add.reduceat`.
+#
+#   A region is flagged when
+#     - its median deviates from the slice by more than `MEDIAN_SHIFT_SIGMA`, in units that
+#       combine the median's standard error and the region-to-region scatter (red flag);
+#     - its MAD differs from the slice's typical MAD by more than a factor `MAD_RATIO_LIMIT`;
+#     - its tail fraction exceeds `TAIL_RATIO_LIMIT` times the slice's typical tail fraction
+#       (and `TAIL_FRACTION_FLOOR`).
+#
+# =================================================================================================
+#
+
+import hashlib
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import psycopg2.extensions
+from psycopg2 import sql
+
+from histograms import DEFAULT_CHUNK_SIZE
+
+# MAD -> standard deviation for a normal distribution.
+MAD_TO_SIGMA = 1.4826
+# Standard error of the median, in units of sigma / sqrt(n), for a normal distribution.
+MEDIAN_STANDARD_ERROR = 1.2533
+
+MIN_REGION_COUNT = 100
+MEDIAN_SHIFT_SIGMA = 5.0
+MAD_RATIO_LIMIT = 2.0
+TAIL_SIGMA = 5.0
+TAIL_RATIO_LIMIT = 3.0
+TAIL_FRACTION_FLOOR = 0.01
+
+# `quantities` maps names to trusted SQL expressions; `region` and `z` are column names.
+RegionSpec = namedtuple('RegionSpec', ['name', 'table', 'region', 'z', 'z_edges', 'quantities'])
+
+
+def grouped_robust_statistics(keys, values):
+    """
+    Median, MAD and size of every group, with one sort per statistic.
+
+    Args:
+        keys (np.ndarray): Integer group key per value.
+        values (np.ndarray): Finite values.
+
+    Returns:
+        tuple: (group keys, counts, medians, MADs, sort order, group starts). The order and
+        starts let callers reduce further per-value quantities group by group.
+    """
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+    counts = np.diff(np.r_[starts, len(keys)])
+    lower, upper = starts + (counts - 1) // 2, starts + counts // 2
+    medians = (values[lower] + values[upper]) / 2
+
+    deviations = np.abs(values - np.repeat(medians, counts))
+    deviations = deviations[np.lexsort((deviations, keys))]
+    mads = (deviations[lower] + deviations[upper]) / 2
+    return keys[starts], counts, medians, mads, order, starts
+
+
+def _slice_statistics(frame, column):
+    # Median of a per-region statistic across the regions of each redshift slice.
+    return frame.groupby('z_slice')[column].transform('median')
+
+
+class RegionalStatistics:
+    """
+    Per-region robust statistics and flags of one spec.
+
+    Args:
+        spec (RegionSpec): Regions and quantities.
+        regions (pd.DataFrame): One row per (quantity, healpix_id, z_slice).
+        rows (int): Rows scanned.
+    """
+
+    def __init__(self, spec, regions, rows):
+        self.spec = spec
+        self.regions = regions
+        self.rows = rows
+
+    def row_count(self):
+        return self.rows
+
+    def flagged(self):
+        """Regions with at least one flag, most significant median shift first."""
+        if self.regions.empty:
+            return self.regions
+        flagged = self.regions[self.regions['flags'] != ""]
+        return flagged.reindex(flagged['median_z'].abs().sort_values(ascending=False).index)
+
+    def content_hash(self):
+        """Short hash of the per-region statistics and flags."""
+        digest = hashlib.sha1(repr((self.spec.z_edges, self.rows)).encode())
+        if not self.regions.empty:
+            digest.update(pd.util.hash_pandas_object(self.regions, index=False).to_numpy().tobytes())
+        return digest.hexdigest()[:16]
+
+    def to_dict(self):
+        return {'z_edges': list(self.spec.z_edges), 'quantities': list(self.spec.quantities),
+                'flagged': self.flagged().to_dict('records')}
+
+
+def summarise_regions(spec, region, z, columns):
+    """
+    Computes and flags the per-region statistics of every quantity.
+
+    Args:
+        spec (RegionSpec): Regions and quantities.
+        region (np.ndarray): HEALPix id per galaxy (NaN for NULL).
+        z (np.ndarray): Redshift per galaxy.
+        columns (dict): {quantity name: values per galaxy}.
+
+    Returns:
+        RegionalStatistics: The statistics, one row per (quantity, region).
+    """
+    edges = np.asarray(spec.z_edges, dtype=np.float64)
+    n_slices = len(edges) - 1
+    z_slice = np.searchsorted(edges, z, side='right') - 1
+    # Galaxies without a region or a redshift slice are left out, like non-finite values.
+    known_region = np.isfinite(region)
+    in_slices = known_region & np.isfinite(z) & (z_slice >= 0) & (z_slice < n_slices)
+    keys = np.where(known_region, region, 0).astype(np.int64) * n_slices + z_slice
+
+    frames = []
+    for name, values in columns.items():
+        use = in_slices & np.isfinite(values)
+        group_keys, counts, medians, mads, order, starts = grouped_robust_statistics(keys[use], values[use])
+
+        # Pooled median and MAD of each redshift slice define the tails.
+        slice_keys, _, slice_medians, slice_mads, _, _ = grouped_robust_statistics(z_slice[use], values[use])
+        pooled_median = np.zeros(n_slices)
+        pooled_sigma = np.zeros(n_slices)
+        pooled_median[slice_keys] = slice_medians
+        pooled_sigma[slice_keys] = MAD_TO_SIGMA * slice_mads
+        sorted_values = values[use][order]
+        sorted_slices = z_slice[use][order]
+        tail = np.abs(sorted_values - pooled_median[sorted_slices]) > TAIL_SIGMA * pooled_sigma[sorted_slices]
+        tails = np.add.reduceat(tail.astype(np.int64), starts) if len(starts) else np.empty(0, dtype=np.int64)
+
+        frames.append(pd.DataFrame({
+            'quantity': name,
+            'healpix_id': group_keys // n_slices,
+            'z_slice': group_keys % n_slices,
+            'count': counts,
+            'median': medians,
+            'mad': mads,
+            'tail_fraction': tails / np.maximum(counts, 1),
+            'slice_median': pooled_median[group_keys % n_slices],
+            'slice_sigma': pooled_sigma[group_keys % n_slices],
+        }))
+
+    regions = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if len(regions):
+        regions = regions[regions['count'] >= MIN_REGION_COUNT].reset_index(drop=True)
+    regions = pd.concat([_flag(frame) for _, frame in regions.groupby('quantity', sort=False)],
+                        ignore_index=True) if len(regions) else regions
+    if len(regions):
+        regions['z_low'] = edges[regions['z_slice']]
+        regions['z_high'] = edges[regions['z_slice'] + 1]
+    return RegionalStatistics(spec, regions, int(len(z)))
+
+
+def _flag(frame):
+    """Compares every region with the other regions of its redshift slice."""
+    frame = frame.copy()
+    typical_median = _slice_statistics(frame, 'median')
+    scatter = MAD_TO_SIGMA * (frame['median'] - typical_median).abs().groupby(frame['z_slice']).transform('median')
+    standard_error = MEDIAN_STANDARD_ERROR * frame['slice_sigma'] / np.sqrt(frame['count'])
+    scale = np.sqrt(standard_error ** 2 + scatter ** 2)
+    frame['median_z'] = ((frame['median'] - typical_median) / scale.where(scale > 0)).fillna(0.0)
+
+    typical_mad = _slice_statistics(frame, 'mad')
+    mad_ratio = (frame['mad'] / typical_mad.where(typical_mad > 0)).fillna(1.0)
+    typical_tail = _slice_statistics(frame, 'tail_fraction')
+    tail_limit = np.maximum(TAIL_RATIO_LIMIT * typical_tail, TAIL_FRACTION_FLOOR)
+
+    flags = []
+    for shift, ratio, tail, limit in zip(frame['median_z'], mad_ratio, frame['tail_fraction'], tail_limit):
+        reasons = []
+        if abs(shift) > MEDIAN_SHIFT_SIGMA:
+            reasons.append("median")
+        if ratio > MAD_RATIO_LIMIT or ratio < 1 / MAD_RATIO_LIMIT:
+            reasons.append("scatter")
+        if tail > limit:
+            reasons.append("tails")
+        flags.append(",".join(reasons))
+    frame['typical_median'] = typical_median
+    frame['mad_ratio'] = mad_ratio
+    frame['flags'] = flags
+    return frame
+
+
+def regional_statistics(connection, specs, method='chunked', chunk_size=DEFAULT_CHUNK_SIZE, cursor=None):
+    """
+    Streams the region, redshift and quantity columns once and summarises every region.
+
+    The columns always travel through a named server-side cursor (the group-by needs the
+    values themselves), fetched `chunk_size` rows at a time into compact float arrays;
+    `method` and `cursor` are accepted for interface compatibility with the other engines.
+
+    Returns:
+        dict: {spec name: RegionalStatistics}.
+    """
+    results = {}
+    for spec in specs:
+        columns = [sql.Identifier(spec.region), sql.SQL("({})::float8").format(sql.Identifier(spec.z))]
+        columns += [sql.SQL("({})::float8").format(sql.SQL(expression)) for expression in spec.quantities.values()]
+        query = sql.SQL("SELECT {} FROM {}").format(sql.SQL(", ").join(columns), sql.Identifier(*spec.table))
+        chunks = []
+        with connection.cursor(name=f"stage2_{spec.name}", cursor_factory=psycopg2.extensions.cursor) as named:
+            named.itersize = chunk_size
+            named.execute(query)
+            while True:
+                rows = named.fetchmany(chunk_size)
+                if not rows:
+                    break
+                chunks.append(np.array(rows, dtype=np.float64).astype(np.float32))
+        data = np.concatenate(chunks) if chunks else np.empty((0, 2 + len(spec.quantities)), dtype=np.float32)
+        region = data[:, 0].astype(np.float64)
+        z = data[:, 1].astype(np.float64)
+        quantities = {name: data[:, 2 + i].astype(np.float64) for i, name in enumerate(spec.quantities)}
+        results[spec.name] = summarise_regions(spec, region, z, quantities)
+    return results
@@ -29,284 +29,720 @@
 #       finder algorithms (e.g., VoidFinder, REVOLVER, VIDE) to quantify the "dominant
 #       systematic uncertainty" in void science.
 #
+#   The distributions are never pulled client-side. Every histogram of a table is computed
+#   in one scan inside PostgreSQL with `width_bucket` and `GROUPING SETS` (or, with
+#   `--method chunked`, streamed through a server-side cursor and binned chunk by chunk),
+#   so only the binned arrays cross the wire (see histograms.py). The statistics behind the
+#   checks (medians, out-of-range fractions, per-algorithm counts) and the plots are derived
+#   from those arrays, which takes seconds and little memory for the full 6.4M-galaxy catalog.
+#
+#   The scaling relations are kept as 2D binned summaries (counts and sums of x, y, x², y², xy
+#   per bin; see binned_statistics.py), computed in the database or, with `--fits-dir`, from
+#   memory-mapped FastSpecFit files across worker processes. The summaries are saved, and
+#   `--from-summaries` re-runs the checks and plots from them without touching the catalog.
+#
+#   Regional problems are caught by robust statistics (median, MAD, tail fraction of stellar
+#   mass, SFR, age and D4000) per HEALPix file and redshift slice, computed with a sort-based
+#   group-by in one pass (see regional_outliers.py). Flagged regions are listed in the report
+#   and written to regional_red_flags.csv/.png next to the plots.
+#
+#   The void catalog is read once; every (algorithm, galactic_cap) group is sorted once and its
+#   quantiles, binned distributions and pairwise KS statistics are taken from the presorted
+#   arrays (see void_systematics.py). The systematics table and the KS table are written to
+#   void_systematics.csv and void_systematics_ks.csv next to the plots.
+#
+#   The nine figures are rendered from those binned summaries across a process pool, and a
+#   figure whose inputs are unchanged since the last run is not rendered again (see
+#   figure_rendering.py; `--force-plots` renders everything).
+#
 #   The output provides a "go/no-go" assessment, flagging any scientifically
 #   questionable results ("RED FLAGS") that must be addressed before proceeding.
 #
 # =================================================================================================
 #
 
-import os
+import argparse
+import logging
 import sys
 import time
-import glob
-import configparser
-import argparse
-from io import StringIO
-import numpy as np
-import pandas as pd
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
 import psycopg2
-from astropy.io import fits
-from astropy.table import Table
+from psycopg2 import pool as pg_pool
 
-# --- HELPER FUNCTIONS ---
-# These functions encapsulate specific, reusable tasks like database configuration,
-# error calculation, and the core data loading mechanism.
+import numpy as np
 
-def get_db_config():
+from binned_statistics import BinnedSpec2D, BinnedStatistic2D, compute_statistics, statistics_from_fits_files
+from figure_rendering import (FigureSpec, render_figures, render_histogram, render_regional_flags, render_relation,
+                              render_void_caps, render_void_sizes)
+from histograms import DEFAULT_CHUNK_SIZE, HISTOGRAM_METHODS, HistogramSpec, compute_histograms
+from regional_outliers import MEDIAN_SHIFT_SIGMA, RegionSpec, regional_statistics
+from validation_report import InstrumentedCursor, write_report
+from void_systematics import SystematicsSpec, void_systematics
+
+# --- SCRIPT CONFIGURATION ---
+# Database connection parameters are shared with Stage 1.
+DB_HOST = "localhost"
+DB_NAME = "desi_void_analysis"
+DB_USER = "your_username"  # Replace with your database user
+DB_PASSWORD = "your_password" # Replace with your database password
+
+GALAXY_TABLE = ("raw_catalogs", "fastspecfit_galaxies")
+VOID_TABLE = ("raw_catalogs", "desivast_voids")
+
+PLOT_DIR = Path(__file__).resolve().parents[2] / "assets" / "plots" / "stage-2-validation-plots"
+SUMMARY_DIR = Path.home() / ".cache" / "desi-cosmic-void-galaxies" / "stage2"
+
+# Binned distributions, one scan per table. SFR is stored in M☉/yr and binned in log10;
+# non-positive values are not finite in log space and are tallied separately.
+HISTOGRAMS = [
+    HistogramSpec('stellar_mass', GALAXY_TABLE, "logmstar", 6.0, 13.0, 140),
+    HistogramSpec('sfr', GALAXY_TABLE, "log(CASE WHEN sfr > 0 THEN sfr END)", -6.0, 4.0, 200,
+                  tallies=(('negative', "sfr < 0"), ('zero', "sfr = 0"))),
+    HistogramSpec('redshift', GALAXY_TABLE, "z", 0.0, 1.0, 200),
+]
+
+# Void properties per (algorithm, galactic_cap), read once and presorted for quantiles,
+# binned distributions and pairwise KS statistics (see void_systematics.py).
+VOID_SYSTEMATICS = [
+    SystematicsSpec('voids', VOID_TABLE, ('algorithm', 'galactic_cap'),
+                    {'radius_mpc_h': ("radius_mpc_h", (0.0, 60.0, 120)), 'redshift': ("redshift", (0.0, 0.3, 60))}),
+]
+VOIDS_SCAN = ".".join(VOID_TABLE)
+
+# FastSpecFit columns behind the scaling relations when they are read from the FITS files.
+FITS_COLUMNS = {'z': ('METADATA', 'Z'), 'logmstar': ('SPECPHOT', 'LOGMSTAR'), 'sfr': ('SPECPHOT', 'SFR')}
+
+
+def _log_sfr(columns):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(columns['sfr'] > 0, np.log10(columns['sfr']), np.nan)
+
+
+def _mass_sfr(columns):
+    return columns['logmstar'], _log_sfr(columns)
+
+
+def _redshift_mass(columns):
+    return columns['z'], columns['logmstar']
+
+
+def _mass_ssfr(columns):
+    return columns['logmstar'], _log_sfr(columns) - columns['logmstar']
+
+
+# Binned (x, y) scaling relations, streamed out of core (see binned_statistics.py).
+RELATIONS = [
+    BinnedSpec2D('sfr_mass', GALAXY_TABLE, "logmstar", "log(CASE WHEN sfr > 0 THEN sfr END)",
+                 (7.0, 12.5), (-4.0, 3.0), (110, 140), _mass_sfr),
+    BinnedSpec2D('mass_redshift', GALAXY_TABLE, "z", "logmstar", (0.0, 0.6), (7.0, 12.5), (120, 110), _redshift_mass),
+    BinnedSpec2D('ssfr_mass', GALAXY_TABLE, "logmstar", "log(CASE WHEN sfr > 0 THEN sfr END) - logmstar",
+                 (7.0, 12.5), (-14.0, -8.0), (110, 120), _mass_ssfr),
+]
+RELATIONS_SCAN = "raw_catalogs.fastspecfit_galaxies (relations)"
+
+# Robust per-(HEALPix file, redshift slice) statistics for regional red flags (see
+# regional_outliers.py). This scan streams the columns themselves, not bins.
+REGIONS = [
+    RegionSpec('regions', GALAXY_TABLE, 'healpix_id', 'z', (0.0, 0.1, 0.2, 0.3, 0.4, 0.6),
+               {'logmstar': "logmstar", 'log_sfr': "log(CASE WHEN sfr > 0 THEN sfr END)",
+                'age_gyr': "age_gyr", 'd4000': "d4000"}),
+]
+REGIONS_SCAN = "raw_catalogs.fastspecfit_galaxies (regions)"
+# Flagged regions listed in the check details (all of them go to the CSV next to the plots).
+REGION_FLAGS_SHOWN = 5
+
+# --- RED FLAG THRESHOLDS ---
+# A median stellar mass outside this range points at a mass-scale bias such as the one
+# documented for FastSpecFit v2.0.
+STELLAR_MASS_MEDIAN_RANGE = (9.0, 11.5)
+# Fraction of galaxies allowed outside a histogram's range before warning.
+OUT_OF_RANGE_WARN_FRACTION = 0.01
+# Expected peak of the DESI Bright Galaxy Survey.
+REDSHIFT_MEDIAN_RANGE = (0.05, 0.5)
+# Plausible median void radius for every finder, in Mpc/h.
+VOID_MEDIAN_RADIUS_RANGE = (5.0, 40.0)
+VOID_ALGORITHMS = ('REVOLVER', 'VIDE', 'VoidFinder', 'ZOBOV')
+# The same finder should see statistically indistinguishable voids in both caps; a KS distance
+# above this with a p-value below `CAP_KS_P_VALUE` points at a cap-dependent systematic.
+CAP_KS_DISTANCE = 0.1
+CAP_KS_P_VALUE = 1e-3
+# Scaling relations use only x columns holding at least this many galaxies.
+MIN_COLUMN_COUNT = 100
+# Massive galaxies are visible at every redshift, so the upper mass envelope (95th percentile
+# per redshift slice) must stay roughly flat. A drifting envelope is the signature of the
+# FastSpecFit v1.0 redshift-dependent mass bug; a rising lower envelope is Malmquist bias.
+MASS_ENVELOPE_SHIFT_DEX = 1.0
+MALMQUIST_CORRELATION = 0.3
+MAIN_SEQUENCE_SLOPE_RANGE = (0.4, 1.2)
+QUENCHED_LOG_SSFR = -11.0
+LOW_MASS, HIGH_MASS = 9.5, 10.5
+GALACTIC_CAPS = ('NGC', 'SGC')
+
+PASS, WARN, FAIL = "PASS", "WARN", "FAIL"
+STATUS_ICONS = {PASS: "✅", WARN: "⚠️", FAIL: "❌"}
+
+# --- LOGGING SETUP ---
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+
+# Every check is evaluated from the summaries of one scan (`profile`); the scan's timed
+# statements are recorded once with it.
+CheckResult = namedtuple('CheckResult', ['section', 'name', 'status', 'details', 'observed', 'elapsed',
+                                         'queries', 'profile'], defaults=((), None))
+
+# --- SCANS ---
+# A scan computes the binned summaries of one table with one engine: the 1D histograms of
+# each table, and the 2D scaling relations of the galaxy table.
+
+def scan_jobs(relations=True, regions=True):
+    """Returns {scan label: (engine, specs)} for every database scan."""
+    jobs = {}
+    for spec in HISTOGRAMS:
+        jobs.setdefault(".".join(spec.table), (compute_histograms, []))[1].append(spec)
+    jobs[VOIDS_SCAN] = (void_systematics, VOID_SYSTEMATICS)
+    if relations:
+        jobs[RELATIONS_SCAN] = (compute_statistics, RELATIONS)
+    if regions:
+        jobs[REGIONS_SCAN] = (regional_statistics, REGIONS)
+    return jobs
+
+
+def scan_table(connections, engine, specs, method, chunk_size, explain):
     """
-    Reads database connection details from an external configuration file.
-    This practice avoids hardcoding credentials directly in the script,
-    improving security and maintainability.
+    Computes a set of summaries of one table in a single scan on a pooled connection.
 
     Returns:
-        A dictionary-like object containing the database connection parameters
-        (user, password, host, port).
+        dict: 'summaries', 'method', 'elapsed', 'row_count' and 'queries'.
     """
-    config = configparser.ConfigParser()
-    # config.ini should be in the same directory as the script or a specified path.
-    config.read('config.ini')
-    return config['database']
-
-def ivar_to_err(ivar):
-    """
-    Safely converts an inverse variance (IVAR) array to a statistical error array.
-    The error is calculated as 1 / sqrt(IVAR).
+    connection = connections.getconn()
+    try:
+        start = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.explain = explain
+            summaries = engine(connection, specs, method, chunk_size, cursor)
+            queries = cursor.queries
+        connection.rollback()
+        return {
+            'summaries': summaries,
+            'method': method,
+            'elapsed': time.perf_counter() - start,
+            'row_count': max(s.row_count() for s in summaries.values()),
+            'queries': queries,
+        }
+    finally:
+        connections.putconn(connection)
 
-    This function includes robust error handling to prevent division-by-zero
-    errors and to correctly handle non-positive IVAR values, which would otherwise
-    result in non-finite numbers (inf, -inf).
 
-    Args:
-        ivar (np.ndarray): A NumPy array of inverse variance values.
+def scan_tables(connections, jobs, method='sql', chunk_size=DEFAULT_CHUNK_SIZE, explain=False):
+    """
+    Runs every scan concurrently. Any exception (a database error, a ValueError in an
+    engine, a MemoryError) is kept as that scan's result, so its checks fail while the
+    other scans are still reported.
 
     Returns:
-        np.ndarray: A NumPy array of corresponding errors. Values are set to NaN
-                    where the inverse variance was not positive.
+        dict: {scan label: scan dict, or the Exception that aborted it}.
     """
-    # Suppress runtime warnings for division by zero or invalid values (e.g., sqrt(-1)).
-    with np.errstate(divide='ignore', invalid='ignore'):
-        err = 1.0 / np.sqrt(ivar)
-    # Replace any resulting infinity or non-numeric values with NumPy's Not a Number (NaN).
-    # This ensures compatibility with database NULL values.
-    err[~np.isfinite(err)] = np.nan
-    return err
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        futures = {label: executor.submit(scan_table, connections, engine, specs, method, chunk_size, explain)
+                   for label, (engine, specs) in jobs.items()}
+    scans = {}
+    for label, future in futures.items():
+        try:
+            scans[label] = future.result()
+        except Exception as e:
+            scans[label] = e
+    return scans
 
-def copy_from_stringio(df, db_name, table_name, dry_run=False):
-    """
-    Performs a high-performance bulk load of a pandas DataFrame into a PostgreSQL table
-    using the `COPY FROM STDIN` command with an in-memory buffer.
 
-    This is the core of the high-speed ingestion. Instead of sending thousands of
-    individual INSERT statements, this method streams the entire DataFrame's content
-    directly to the database backend in a highly optimized format.
+def scan_fits(fits_dir, workers=None):
+    """
+    Computes the scaling relations from the FastSpecFit FITS files instead of the database,
+    one memory-mapped file per worker process.
 
-    Args:
-        df (pd.DataFrame): The pandas DataFrame containing the data to load.
-        db_name (str): The name of the target database.
-        table_name (str): The fully-qualified name of the target table (e.g., 'schema.table').
-        dry_run (bool): If True, simulates the operation without writing to the database.
+    Returns:
+        dict: A scan dict like `scan_table`'s, or the Exception that aborted it.
     """
-    if dry_run:
-        # In a dry run, simply report the action that would have been taken.
-        print(f"  [DRY RUN] Would COPY {len(df)} rows into '{table_name}'")
-        return
-
-    # Create an in-memory text buffer (acting as a virtual file).
-    buffer = StringIO()
-    # Write the DataFrame's data to the buffer in CSV format.
-    # - `index=False`, `header=False`: We only want the raw data.
-    # - `na_rep='\\N'`: This is the crucial step to map pandas' NaN to PostgreSQL's NULL.
-    #   PostgreSQL's COPY command recognizes `\N` as the default representation for NULL.
-    df.to_csv(buffer, index=False, header=False, na_rep='\\N')
-    # Reset the buffer's cursor to the beginning so `psycopg2` can read its full content.
-    buffer.seek(0)
-
-    db_config = get_db_config()
-    conn = None
+    paths = sorted(Path(fits_dir).glob("fastspec-iron-*.fits"))
+    if not paths:
+        return FileNotFoundError(f"No FastSpecFit files in {fits_dir}")
+    start = time.perf_counter()
     try:
-        # Establish a direct connection to the PostgreSQL database.
-        conn = psycopg2.connect(
-            dbname=db_name,
-            user=db_config['user'],
-            password=db_config['password'],
-            host=db_config['host'],
-            port=db_config['port']
-        )
-        with conn.cursor() as cursor:
-            # Construct the powerful COPY command.
-            # - It specifies the target table and columns.
-            # - `FROM STDIN`: Instructs PostgreSQL to read data from the stream provided by the client.
-            # - `WITH (FORMAT CSV, NULL '\\N')`: Defines the data format and the NULL representation.
-            columns = ','.join(df.columns)
-            sql_command = f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT CSV, NULL '\\N')"
-            # `copy_expert` executes the command, streaming the content of the `buffer` directly.
-            cursor.copy_expert(sql_command, buffer)
-        # If the COPY command succeeds, commit the transaction to make the changes permanent.
-        conn.commit()
-    except (Exception, psycopg2.DatabaseError) as error:
-        # If any database error occurs during the process...
-        print(f"Error during COPY for table {table_name}: {error}", file=sys.stderr)
-        if conn:
-            # ...roll back the transaction to leave the database in a clean state.
-            conn.rollback()
-    finally:
-        # Ensure the database connection is always closed, even if errors occurred.
-        if conn:
-            conn.close()
+        summaries = statistics_from_fits_files(paths, RELATIONS, FITS_COLUMNS, workers)
+    except Exception as e:
+        return e
+    return {'summaries': summaries, 'method': 'fits', 'elapsed': time.perf_counter() - start,
+            'row_count': max(s.row_count() for s in summaries.values()), 'queries': [],
+            'files': [path.name for path in paths]}
 
-# --- MAIN PROCESSOR FUNCTION ---
 
-def process_fastspecfit_files(base_path, db_name, dry_run=False):
-    """
-    Main ETL logic: finds all FastSpecFit files, reads required data from
-    multiple FITS extensions, transforms it, and loads it into the database.
+def save_summaries(scan, summary_dir=SUMMARY_DIR):
+    """Saves the 2D summaries of a scan, one `.npz` file per relation."""
+    return [summary.save(Path(summary_dir) / f"{name}.npz") for name, summary in scan['summaries'].items()]
 
-    Args:
-        base_path (str): The directory path containing the FastSpecFit FITS files.
-        db_name (str): The name of the target database.
-        dry_run (bool): If True, simulates the entire process.
+
+def load_summaries(summary_dir=SUMMARY_DIR):
     """
-    print("\n--- Starting FastSpecFit Ingestion ---")
-    target_table = 'raw_catalogs.fastspecfit_galaxies'
-
-    # Before ingesting new data, clear the target table to prevent duplicates.
-    # This makes the script idempotent—running it multiple times yields the same result.
-    if not dry_run:
-        print(f"Clearing existing data from {target_table}...")
-        db_config = get_db_config()
-        conn = None
-        try:
-            conn = psycopg2.connect(
-                dbname=db_name,
-                user=db_config['user'],
-                password=db_config['password'],
-                host=db_config['host'],
-                port=db_config['port']
-            )
-            with conn.cursor() as cursor:
-                # `TRUNCATE TABLE` is faster than `DELETE FROM`. `RESTART IDENTITY` resets any auto-incrementing keys.
-                cursor.execute(f"TRUNCATE TABLE {target_table} RESTART IDENTITY")
-            conn.commit()
-            print("Table cleared successfully.")
-        except (Exception, psycopg2.DatabaseError) as error:
-            print(f"Error truncating table {target_table}: {error}", file=sys.stderr)
-            if conn:
-                conn.rollback()
-            return # Exit if we can't clear the table.
-        finally:
-            if conn:
-                conn.close()
-
-    # Use glob to find all files matching the FastSpecFit naming pattern.
-    files = sorted(glob.glob(os.path.join(base_path, 'fastspec-iron-*.fits')))
-    if not files:
-        print(f"Error: No FastSpecFit files found in '{base_path}'.", file=sys.stderr)
-        return
-
-    # Define the specific columns of scientific interest to extract.
-    # This avoids loading unnecessary data, saving memory and disk space.
-    meta_cols = ['TARGETID', 'RA', 'DEC', 'Z']
-    specphot_cols = ['LOGMSTAR', 'LOGMSTAR_IVAR', 'SFR', 'SFR_IVAR', 'AGE', 'ZZSUN', 'DN4000']
-
-    # Process each file individually.
-    for i, f_path in enumerate(files):
-        start_time = time.time()
-        file_name = os.path.basename(f_path)
-        print(f"Processing file {i+1}/{len(files)}: {file_name} ...")
+    Loads previously saved 2D summaries, so checks and plots run without any scan.
 
-        try:
-            # Open the FITS file using astropy. `memmap=True` is memory-efficient for large files.
-            with fits.open(f_path, memmap=True) as hdul:
-                # Basic validation: ensure the required Header-Data Units (HDUs) are present.
-                if 'METADATA' not in hdul or 'SPECPHOT' not in hdul:
-                    print(f"Warning: Skipping {file_name}, missing METADATA or SPECPHOT HDU.", file=sys.stderr)
-                    continue
-
-                # Read data from the specified HDUs into astropy Tables.
-                meta_table = Table(hdul['METADATA'].data, masked=True)
-                spec_table = Table(hdul['SPECPHOT'].data, masked=True)
-
-                # --- Data Transformation ---
-                # Create a new pandas DataFrame to hold the cleaned and structured data.
-                df = pd.DataFrame()
-                
-                # Populate DataFrame from the METADATA HDU, converting column names to lowercase for SQL standard.
-                for col in meta_cols:
-                    df[col.lower()] = meta_table[col]
-                
-                # The source FITS file does not contain redshift error (z_err).
-                # We create a column of NaNs, which will be loaded as NULL into the database,
-                # explicitly showing that this data is absent from the source.
-                df['z_err'] = np.nan
-
-                # Populate DataFrame from the SPECPHOT HDU, transforming columns as needed.
-                df['logmstar'] = spec_table['LOGMSTAR']
-                df['logmstar_err'] = ivar_to_err(spec_table['LOGMSTAR_IVAR']) # Calculate error from IVAR
-                df['sfr'] = spec_table['SFR']
-                df['sfr_err'] = ivar_to_err(spec_table['SFR_IVAR']) # Calculate error from IVAR
-                df['age_gyr'] = spec_table['AGE']
-                df['metallicity'] = spec_table['ZZSUN']
-                df['d4000'] = spec_table['DN4000']
-
-                # Add provenance columns to track the origin of each row.
-                # This is critical for data traceability and debugging.
-                df['healpix_id'] = int(file_name.split('hp')[-1].split('.')[0])
-                df['source_file'] = file_name
-                # --- End Transformation ---
-
-                # Load the processed DataFrame into the database.
-                copy_from_stringio(df, db_name, target_table, dry_run=dry_run)
-                if not dry_run:
-                    print(f"  > Loaded {len(df)} rows into {target_table}.")
-
-        except KeyError as e:
-            # Handle cases where a FITS file is missing an expected column.
-            print(f"Error processing file {file_name}: Missing expected column - {e}.", file=sys.stderr)
-            continue
-        except Exception as e:
-            # Catch any other unexpected errors during file processing.
-            print(f"Error processing file {file_name}: {e}", file=sys.stderr)
+    Returns:
+        dict: A scan dict like `scan_table`'s, or the Exception that aborted it.
+    """
+    try:
+        summaries = {spec.name: BinnedStatistic2D.load(Path(summary_dir) / f"{spec.name}.npz", spec)
+                     for spec in RELATIONS}
+    except (OSError, ValueError) as e:
+        return e
+    return {'summaries': summaries, 'method': 'saved', 'elapsed': 0.0,
+            'row_count': max(s.row_count() for s in summaries.values()), 'queries': []}
+
+# --- RED FLAG CHECKS ---
+# Each check takes the summaries of its scan and returns a (status, details, observed) tuple.
+
+def _fraction(count, total):
+    return count / total if total else 0.0
+
+
+def _format(value, spec="{:.2f}"):
+    return spec.format(value) if value is not None else "n/a"
+
+
+def _outside(histogram, group=None):
+    counts = histogram.total(group)
+    return int(counts[0]), int(counts[-1])
+
+
+def check_stellar_mass(histograms):
+    """The stellar mass distribution must peak at survey-typical masses and stay in range."""
+    mass = histograms['stellar_mass']
+    median = mass.quantile(0.5)
+    below, above = _outside(mass)
+    total = mass.row_count()
+    observed = {'median': median, 'p05': mass.quantile(0.05), 'p95': mass.quantile(0.95),
+                'below_range': below, 'above_range': above, 'nonfinite': mass.nonfinite.get((), 0)}
+    details = (f"median log(M*/M☉) = {_format(median)}, {below + above:,} outside "
+               f"[{mass.spec.low:g}, {mass.spec.high:g}], {observed['nonfinite']:,} non-finite")
+    if median is None or not STELLAR_MASS_MEDIAN_RANGE[0] <= median <= STELLAR_MASS_MEDIAN_RANGE[1]:
+        return FAIL, "RED FLAG: " + details, observed
+    if _fraction(below + above, total) > OUT_OF_RANGE_WARN_FRACTION:
+        return WARN, details, observed
+    return PASS, details, observed
+
+
+def check_sfr(histograms):
+    """Star formation rates must never be negative."""
+    sfr = histograms['sfr']
+    negative, zero = sfr.tally('negative'), sfr.tally('zero')
+    observed = {'median_log_sfr': sfr.quantile(0.5), 'negative': negative, 'zero': zero,
+                'nonfinite': sfr.nonfinite.get((), 0) - negative - zero}
+    median = observed['median_log_sfr']
+    details = f"median log(SFR) = {_format(median)}, {negative:,} negative, {zero:,} zero"
+    if negative or median is None:
+        return FAIL, "RED FLAG: " + details, observed
+    return PASS, details, observed
+
+
+def check_redshift(histograms):
+    """Redshifts must be positive and peak where a magnitude-limited survey peaks."""
+    z = histograms['redshift']
+    negative, beyond = _outside(z)
+    median = z.quantile(0.5)
+    observed = {'median': median, 'p95': z.quantile(0.95), 'negative': negative, 'above_range': beyond,
+                'nonfinite': z.nonfinite.get((), 0)}
+    details = f"median z = {_format(median, '{:.3f}')}, {negative:,} negative, {beyond:,} at z >= {z.spec.high:g}"
+    if negative or median is None:
+        return FAIL, "RED FLAG: " + details, observed
+    if not REDSHIFT_MEDIAN_RANGE[0] <= median <= REDSHIFT_MEDIAN_RANGE[1]:
+        return WARN, details, observed
+    return PASS, details, observed
+
+
+def check_void_radii(systematics):
+    """Every finder must be present in both caps with positive, plausible void radii."""
+    voids = systematics['voids']
+    by_algorithm = voids.collapse(('algorithm',))
+    observed = {algorithm: {'count': by_algorithm.row_count((algorithm,)),
+                            'median': by_algorithm.quantile('radius_mpc_h', 0.5, (algorithm,))}
+                for (algorithm,) in by_algorithm.groups()}
+    missing = [a for a in VOID_ALGORITHMS if a not in observed]
+    nonpositive = voids.count_at_most('radius_mpc_h', 0.0)
+    caps_missing = [f"{a}/{c}" for a in VOID_ALGORITHMS if a in observed for c in GALACTIC_CAPS
+                    if (a, c) not in voids.groups()]
+    implausible = [a for a, o in observed.items() if o['median'] is None
+                   or not VOID_MEDIAN_RADIUS_RANGE[0] <= o['median'] <= VOID_MEDIAN_RADIUS_RANGE[1]]
+    details = ", ".join(f"{a}: {o['count']:,} voids, median {_format(o['median'], '{:.1f}')} Mpc/h"
+                        for a, o in observed.items())
+    if missing or nonpositive:
+        problems = [f"missing {', '.join(missing)}"] if missing else []
+        problems += [f"{nonpositive:,} non-positive radii"] if nonpositive else []
+        return FAIL, f"RED FLAG: {'; '.join(problems)}. {details}", observed
+    if caps_missing or implausible:
+        problems = [f"no voids in {', '.join(caps_missing)}"] if caps_missing else []
+        problems += [f"implausible median radius for {', '.join(implausible)}"] if implausible else []
+        return WARN, f"{'; '.join(problems)}. {details}", observed
+    return PASS, details, observed
+
+
+def check_void_distributions(systematics):
+    """Finders may disagree with each other, but each must agree with itself across the caps."""
+    voids = systematics['voids']
+    ks = voids.ks_table()
+    if ks.empty:
+        return WARN, "Fewer than two (algorithm, cap) groups to compare", None
+    ks = ks.dropna(subset=['ks_d'])
+    between = voids.collapse(('algorithm',)).ks_table().dropna(subset=['ks_d'])
+    radius = between[between['quantity'] == 'radius_mpc_h']
+    caps = ks[ks['same_algorithm'] & ~ks['same_galactic_cap']]
+    shifted = caps[(caps['ks_d'] > CAP_KS_DISTANCE) & (caps['p_value'] < CAP_KS_P_VALUE)]
+    observed = {'between_algorithms': between.to_dict('records'), 'between_caps': caps.to_dict('records')}
+    details = ("radius KS D between algorithms: "
+               + (", ".join(f"{r.group_a}/{r.group_b} {r.ks_d:.2f}" for r in radius.itertuples()) or "n/a")
+               + f"; {len(caps)} NGC/SGC comparisons within algorithms")
+    if not shifted.empty:
+        listed = ", ".join(f"{r.group_a} vs {r.group_b} {r.quantity} D = {r.ks_d:.2f} (p = {r.p_value:.1e})"
+                           for r in shifted.itertuples())
+        return WARN, f"Cap-dependent void properties: {listed}. {details}", observed
+    return PASS, details, observed
+
+
+def _populated(statistic):
+    return statistic.column_counts() >= MIN_COLUMN_COUNT
+
+
+def check_mass_redshift(relations):
+    """The upper mass envelope must not drift with redshift (FastSpecFit v1.0 bug check)."""
+    relation = relations['mass_redshift']
+    populated = _populated(relation)
+    envelope = relation.quantile_y(0.95)[populated]
+    floor = relation.quantile_y(0.05)[populated]
+    r = relation.pearson()
+    if len(envelope) < 2:
+        return WARN, f"Fewer than 2 redshift slices hold {MIN_COLUMN_COUNT} galaxies", {'pearson': r}
+    shift = float(envelope.max() - envelope.min())
+    observed = {'pearson': r, 'envelope_shift_dex': shift, 'floor_shift_dex': float(floor.max() - floor.min()),
+                'slices': int(populated.sum())}
+    details = (f"r = {_format(r, '{:.3f}')}, upper envelope (p95) varies by {shift:.2f} dex, "
+               f"lower envelope (p05) by {observed['floor_shift_dex']:.2f} dex over {observed['slices']} slices")
+    if shift > MASS_ENVELOPE_SHIFT_DEX:
+        return FAIL, "RED FLAG: redshift-dependent mass scale. " + details, observed
+    if r is not None and abs(r) > MALMQUIST_CORRELATION:
+        return WARN, "Correlation consistent with Malmquist bias (survey selection). " + details, observed
+    return PASS, details, observed
+
+
+def check_main_sequence(relations):
+    """The star-forming main sequence slope (SFR ∝ M*^slope) must match the literature."""
+    relation = relations['ssfr_mass']
+    star_forming = relation.column_counts() * (1 - np.nan_to_num(relation.fraction_y_below(QUENCHED_LOG_SSFR)))
+    use = star_forming >= MIN_COLUMN_COUNT
+    if use.sum() < 3:
+        return WARN, f"Fewer than 3 mass bins hold {MIN_COLUMN_COUNT} star-forming galaxies", None
+    ridge = relation.quantile_y(0.5, y_min=QUENCHED_LOG_SSFR)[use]
+    slope = 1.0 + float(np.polyfit(relation.x_centres()[use], ridge, 1, w=np.sqrt(star_forming[use]))[0])
+    observed = {'slope': slope, 'mass_bins': int(use.sum()), 'pearson_sfr_mass': relations['sfr_mass'].pearson()}
+    details = (f"main sequence slope = {slope:.2f} (expected {MAIN_SEQUENCE_SLOPE_RANGE[0]}-"
+               f"{MAIN_SEQUENCE_SLOPE_RANGE[1]}) from {observed['mass_bins']} mass bins")
+    if not MAIN_SEQUENCE_SLOPE_RANGE[0] <= slope <= MAIN_SEQUENCE_SLOPE_RANGE[1]:
+        return FAIL, "RED FLAG: " + details, observed
+    return PASS, details, observed
+
+
+def check_quenching(relations):
+    """The quenched fraction (log sSFR < -11) must rise with stellar mass."""
+    relation = relations['ssfr_mass']
+    counts = relation.column_counts()
+    quenched = np.nan_to_num(relation.fraction_y_below(QUENCHED_LOG_SSFR)) * counts
+    x = relation.x_centres()
+    low, high = x < LOW_MASS, x >= HIGH_MASS
+    observed = {
+        'quenched_fraction': float(_fraction(quenched.sum(), counts.sum())),
+        'low_mass': float(_fraction(quenched[low].sum(), counts[low].sum())),
+        'high_mass': float(_fraction(quenched[high].sum(), counts[high].sum())),
+    }
+    details = (f"{100 * observed['quenched_fraction']:.1f}% quenched overall, "
+               f"{100 * observed['low_mass']:.1f}% below log M* = {LOW_MASS}, "
+               f"{100 * observed['high_mass']:.1f}% above {HIGH_MASS} (galaxies with SFR > 0)")
+    if counts[low].sum() and counts[high].sum() and observed['high_mass'] <= observed['low_mass']:
+        return WARN, "Quenched fraction does not rise with mass. " + details, observed
+    return PASS, details, observed
+
+
+def check_regional_outliers(regions):
+    """No (HEALPix file, redshift slice) region may deviate from the rest of its slice."""
+    statistics = regions['regions']
+    flagged = statistics.flagged()
+    shifted = flagged[flagged['flags'].str.contains("median")]
+    observed = {'regions': int(statistics.regions[['healpix_id', 'z_slice']].drop_duplicates().shape[0])
+                if not statistics.regions.empty else 0,
+                'flagged': flagged.to_dict('records')}
+    if flagged.empty:
+        return PASS, f"{observed['regions']} regions consistent with their redshift slices", observed
+    listed = "; ".join(
+        f"{row.quantity} hp{row.healpix_id:02d} z {row.z_low:g}-{row.z_high:g}: median {row.median:.2f} "
+        f"vs {row.typical_median:.2f} ({row.median_z:+.1f}σ), MAD ×{row.mad_ratio:.1f}, "
+        f"{100 * row.tail_fraction:.1f}% tails [{row.flags}]"
+        for row in flagged.head(REGION_FLAGS_SHOWN).itertuples())
+    details = f"{len(flagged)} of {len(statistics.regions)} region statistics flagged: {listed}"
+    if not shifted.empty:
+        return FAIL, f"RED FLAG: {len(shifted)} regional medians shifted by > {MEDIAN_SHIFT_SIGMA:g}σ. {details}", observed
+    return WARN, details, observed
+
+
+CHECKS = [
+    ("UNIVARIATE DISTRIBUTIONS", "Stellar mass distribution", ".".join(GALAXY_TABLE), check_stellar_mass),
+    ("UNIVARIATE DISTRIBUTIONS", "Star formation rate distribution", ".".join(GALAXY_TABLE), check_sfr),
+    ("UNIVARIATE DISTRIBUTIONS", "Redshift distribution", ".".join(GALAXY_TABLE), check_redshift),
+    ("BIVARIATE SCALING RELATIONS", "Mass vs redshift (critical)", RELATIONS_SCAN, check_mass_redshift),
+    ("BIVARIATE SCALING RELATIONS", "Star-forming main sequence", RELATIONS_SCAN, check_main_sequence),
+    ("BIVARIATE SCALING RELATIONS", "sSFR vs mass quenching", RELATIONS_SCAN, check_quenching),
+    ("REGIONAL CONSISTENCY", "Per-region robust statistics", REGIONS_SCAN, check_regional_outliers),
+    ("VOID CATALOG SYSTEMATICS", "Void radii by algorithm", VOIDS_SCAN, check_void_radii),
+    ("VOID CATALOG SYSTEMATICS", "Void distributions across finders and caps", VOIDS_SCAN,
+     check_void_distributions),
+]
+
+
+def run_checks(scans):
+    """Evaluates every check against the summaries of its scan; checks of skipped scans are omitted."""
+    results = []
+    for section, name, label, func in CHECKS:
+        if label not in scans:
             continue
+        scan = scans[label]
+        start = time.perf_counter()
+        if isinstance(scan, Exception):
+            status, details, observed = FAIL, f"Scan of {label} failed: {scan}", None
+        else:
+            status, details, observed = func(scan['summaries'])
+        results.append(CheckResult(section, name, status, details, observed,
+                                   time.perf_counter() - start, (), label))
+    return results
+
+# --- PLOTS ---
+# Every figure is drawn from the binned summaries of the scans (see figure_rendering.py).
+
+FIGURES = [
+    FigureSpec("stellar_mass_distribution.png", render_histogram, ('stellar_mass',),
+               {'name': 'stellar_mass', 'xlabel': "log(M*/M☉)", 'ylabel': "Galaxies per bin",
+                'title': "Stellar Mass Distribution"}),
+    FigureSpec("sfr_distribution.png", render_histogram, ('sfr',),
+               {'name': 'sfr', 'xlabel': "log(SFR / M☉ yr⁻¹)", 'ylabel': "Galaxies per bin",
+                'title': "Star Formation Rate Distribution"}),
+    FigureSpec("redshift_distribution.png", render_histogram, ('redshift',),
+               {'name': 'redshift', 'xlabel': "Redshift z", 'ylabel': "Galaxies per bin",
+                'title': "Redshift Distribution"}),
+    FigureSpec("void_size_distributions.png", render_void_sizes, ('voids',),
+               {'name': 'voids', 'quantity': 'radius_mpc_h'}),
+    FigureSpec("void_galactic_cap_distribution.png", render_void_caps, ('voids',),
+               {'name': 'voids', 'caps': GALACTIC_CAPS}),
+    FigureSpec("sfr_mass_main_sequence.png", render_relation, ('sfr_mass',),
+               {'name': 'sfr_mass', 'xlabel': "log(M*/M☉)", 'ylabel': "log(SFR / M☉ yr⁻¹)",
+                'title': "Star Formation Main Sequence", 'min_column_count': MIN_COLUMN_COUNT}),
+    FigureSpec("mass_vs_redshift_critical.png", render_relation, ('mass_redshift',),
+               {'name': 'mass_redshift', 'xlabel': "Redshift z", 'ylabel': "log(M*/M☉)",
+                'title': "Mass vs Redshift", 'min_column_count': MIN_COLUMN_COUNT}),
+    FigureSpec("ssfr_vs_mass_quenching.png", render_relation, ('ssfr_mass',),
+               {'name': 'ssfr_mass', 'xlabel': "log(M*/M☉)", 'ylabel': "log(sSFR / yr⁻¹)",
+                'title': "Specific SFR vs Mass", 'min_column_count': MIN_COLUMN_COUNT,
+                'threshold': QUENCHED_LOG_SSFR, 'threshold_label': f"Quenched: log sSFR < {QUENCHED_LOG_SSFR:g}"}),
+    FigureSpec("regional_red_flags.png", render_regional_flags, ('regions',),
+               {'name': 'regions', 'shift_sigma': MEDIAN_SHIFT_SIGMA}),
+]
+
+
+def _summaries(scans):
+    summaries = {}
+    for scan in scans.values():
+        if not isinstance(scan, Exception):
+            summaries.update(scan['summaries'])
+    return summaries
+
+
+def write_tables(summaries, plot_dir=PLOT_DIR):
+    """
+    Writes the void systematics and regional statistics tables next to the plots.
 
-        end_time = time.time()
-        duration_msg = f"Done in {end_time - start_time:.2f} seconds."
-        rows_msg = f"{len(df)} rows found." if dry_run else f"{len(df)} rows loaded."
-        print(f"  > {duration_msg} {rows_msg}")
-
-    print("--- FastSpecFit Ingestion Complete ---")
+    Returns:
+        list: Paths of the written CSV files.
+    """
+    plot_dir = Path(plot_dir)
+    plot_dir.mkdir(parents=True, exist_ok=True)
+    tables = []
+    if 'voids' in summaries:
+        tables += [(summaries['voids'].table(), "void_systematics.csv"),
+                   (summaries['voids'].ks_table(), "void_systematics_ks.csv")]
+    if 'regions' in summaries and not summaries['regions'].regions.empty:
+        tables.append((summaries['regions'].regions, "regional_red_flags.csv"))
+    for frame, filename in tables:
+        frame.to_csv(plot_dir / filename, index=False, float_format="%.5g")
+    return [plot_dir / filename for _, filename in tables]
+
+
+def plot_distributions(scans, plot_dir=PLOT_DIR, workers=None, force=False):
+    """
+    Writes the tables and renders the figures whose binned inputs changed since the last run.
 
+    Returns:
+        tuple: (written paths, unchanged figure paths, {filename: error} of failed renders).
+    """
+    summaries = _summaries(scans)
+    written = write_tables(summaries, plot_dir)
+    rendered, skipped, failed = render_figures(FIGURES, summaries, plot_dir, workers, force)
+    return written + rendered, skipped, failed
+
+# --- MAIN EXECUTION ---
+
+def report(results):
+    """Logs every result under its section and the go/no-go verdict; returns the red flag count."""
+    section = None
+    for result in results:
+        if result.section != section:
+            section = result.section
+            logging.info(f"\n=== {section} ===")
+        log = {PASS: logging.info, WARN: logging.warning, FAIL: logging.error}[result.status]
+        log(f"{STATUS_ICONS[result.status]} {result.name}: {result.status}")
+        if result.details:
+            log(f"   Details: {result.details}")
+
+    counts = {status: sum(r.status == status for r in results) for status in (PASS, WARN, FAIL)}
+    logging.info("\n============================================================")
+    logging.info("📊 STAGE 2 VALIDATION SUMMARY")
+    logging.info("============================================================")
+    logging.info(f"Total Checks: {len(results)}")
+    logging.info(f"✅ Passed: {counts[PASS]}")
+    logging.info(f"⚠️  Warnings: {counts[WARN]}")
+    logging.info(f"🚨 Red Flags: {counts[FAIL]}")
+    if counts[FAIL] == 0:
+        logging.info("🎉 GO: the catalogs describe a physically plausible universe.")
+    else:
+        logging.error("❌ NO-GO: resolve the red flags before proceeding to the science analysis.")
+    return counts[FAIL]
+
+
+def run_validation(method='sql', chunk_size=DEFAULT_CHUNK_SIZE, plot_dir=PLOT_DIR, plots=True,
+                   explain=False, report_path=None, fits_dir=None, workers=None, summary_dir=SUMMARY_DIR,
+                   from_summaries=False, regions=True, plot_workers=None, force_plots=False):
+    """
+    Main function to execute the Stage 2 validation.
 
-# --- SCRIPT ENTRYPOINT ---
-if __name__ == "__main__":
-    # This block is executed only when the script is run directly from the command line.
-    # It sets up argument parsing for command-line options like `--dry-run`.
-    parser = argparse.ArgumentParser(
-        description="FastSpecFit FITS to PostgreSQL ETL Pipeline.",
-        formatter_class=argparse.RawTextHelpFormatter # Preserves newlines in help text.
-    )
-    parser.add_argument(
-        '--dry-run',
-        action='store_true',
-        help="Run the script to see what files and rows would be processed\nwithout writing anything to the database."
-    )
-    args = parser.parse_args()
+    Args:
+        method (str): Database engine: 'sql' (width_bucket aggregates) or 'chunked'
+            (server-side cursor binned in NumPy).
+        chunk_size (int): Rows per fetch for the chunked engine.
+        plot_dir (Path): Directory for the diagnostic plots.
+        plots (bool): Render the plots.
+        explain (bool): Capture `EXPLAIN (ANALYZE, BUFFERS)` plans for the aggregate queries.
+        report_path (str, optional): Write results, summaries and timings to this JSON file.
+        fits_dir (str, optional): Compute the scaling relations from the FastSpecFit FITS files
+            in this directory instead of the database.
+        workers (int, optional): Worker processes for the FITS files (default: all cores).
+        summary_dir (Path): Where the 2D relation summaries are saved.
+        from_summaries (bool): Reuse the saved 2D summaries instead of recomputing them.
+        regions (bool): Run the per-region robust statistics (streams four columns).
+        plot_workers (int, optional): Worker processes rendering the figures (default: all cores).
+        force_plots (bool): Render every figure even if its inputs are unchanged.
 
-    # If --dry-run is specified, print a prominent banner to the console.
-    if args.dry_run:
-        print("\n" + "="*50)
-        print("🚀   PERFORMING DRY RUN - NO DATA WILL BE WRITTEN   🚀")
-        print("="*50)
+    Returns:
+        int: 0 for a go verdict, 1 if any red flag was raised.
+    """
+    logging.info("🔭 STARTING STAGE 2 PHYSICAL PLAUSIBILITY VALIDATION")
+    logging.info("============================================================")
+    start = time.time()
+    jobs = scan_jobs(relations=not (fits_dir or from_summaries), regions=regions)
+    try:
+        connections = pg_pool.ThreadedConnectionPool(
+            1, len(jobs),
+            host=DB_HOST,
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASSWORD,
+            cursor_factory=InstrumentedCursor
+        )
+    except psycopg2.Error as e:
+        logging.error(f"Database error: {e}")
+        return 1
 
-    total_start_time = time.time()
+    try:
+        scans = scan_tables(connections, jobs, method, chunk_size, explain)
+    finally:
+        connections.closeall()
+    if from_summaries:
+        scans[RELATIONS_SCAN] = load_summaries(summary_dir)
+    elif fits_dir:
+        scans[RELATIONS_SCAN] = scan_fits(fits_dir, workers)
+    for label, scan in scans.items():
+        if not isinstance(scan, Exception):
+            logging.info(f"⏱️  {label}: {scan['row_count']:,} rows binned in {scan['elapsed']:.2f} s ({scan['method']})")
+    relations = scans[RELATIONS_SCAN]
+    if not from_summaries and not isinstance(relations, Exception):
+        save_summaries(relations, summary_dir)
+        logging.info(f"💾 Scaling-relation summaries saved to {summary_dir}")
+
+    results = run_checks(scans)
+    red_flags = report(results)
+
+    if plots:
+        written, skipped, failed = plot_distributions(scans, plot_dir, plot_workers, force_plots)
+        for path in written:
+            logging.info(f"🖼️  {path}")
+        logging.info(f"🖼️  {len(written)} files written, {len(skipped)} figures unchanged since the last render"
+                     + (f", {len(failed)} failed" if failed else ""))
+
+    if report_path:
+        options = {'method': method, 'chunk_size': chunk_size, 'explain': explain, 'fits_dir': fits_dir,
+                   'from_summaries': from_summaries, 'regions': regions}
+        profiles = {label: scan if isinstance(scan, Exception) else
+                    {**scan, 'histograms': {n: h.to_dict() for n, h in scan['summaries'].items()}}
+                    for label, scan in scans.items()}
+        path = write_report(report_path, "stage2", results, profiles, options, time.time() - start)
+        logging.info(f"📝 Report written to {path}")
+    return 1 if red_flags else 0
 
-    # Load configuration from the external file.
-    config = configparser.ConfigParser()
-    config.read('config.ini')
-    paths = config['paths']
-    db_conf = config['database']
 
-    # Launch the main processing function with the loaded configuration.
-    process_fastspecfit_files(paths['fastspecfit_dir'], db_conf['dbname_fastspecfit'], dry_run=args.dry_run)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stage 2 physical plausibility validation.")
+    parser.add_argument('--method', choices=HISTOGRAM_METHODS, default='sql',
+                        help="Database engine: width_bucket aggregates in PostgreSQL, or a server-side\n"
+                             "cursor binned chunk by chunk in NumPy (default: %(default)s).")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Rows per fetch for --method chunked (default: %(default)s).")
+    relations = parser.add_mutually_exclusive_group()
+    relations.add_argument('--fits-dir', metavar='DIR',
+                           help="Compute the scaling relations from the FastSpecFit FITS files (memory-mapped,\n"
+                                "one file per process) instead of the database.")
+    relations.add_argument('--from-summaries', action='store_true',
+                           help="Reuse the scaling-relation summaries saved by a previous run.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes for --fits-dir (default: all cores).")
+    parser.add_argument('--no-regions', action='store_true',
+                        help="Skip the per-HEALPix-region robust statistics (the only scan that streams\n"
+                             "column values rather than bins).")
+    parser.add_argument('--summary-dir', type=Path, default=SUMMARY_DIR,
+                        help="Directory of the saved scaling-relation summaries (default: %(default)s).")
+    parser.add_argument('--plot-dir', type=Path, default=PLOT_DIR,
+                        help="Directory for the diagnostic plots (default: %(default)s).")
+    parser.add_argument('--no-plots', action='store_true', help="Skip rendering the plots.")
+    parser.add_argument('--plot-workers', type=int, default=None,
+                        help="Worker processes rendering the figures (default: all cores; 1 renders in-process).")
+    parser.add_argument('--force-plots', action='store_true',
+                        help="Render every figure, even those whose binned inputs are unchanged.")
+    parser.add_argument('--explain', action='store_true',
+                        help="Capture EXPLAIN (ANALYZE, BUFFERS) for the aggregate queries (runs each twice).")
+    parser.add_argument('--report', metavar='PATH',
+                        help="Write check results, binned summaries and query timings to a JSON report.")
+    args = parser.parse_args()
 
-    total_end_time = time.time()
-    print(f"\nTotal ETL process finished in {(total_end_time - total_start_time)/60:.2f} minutes.")
\ No newline at end of file
+    start_time = time.time()
+    exit_code = run_validation(method=args.method, chunk_size=args.chunk_size, plot_dir=args.plot_dir,
+                               plots=not args.no_plots, explain=args.explain, report_path=args.report,
+                               fits_dir=args.fits_dir, workers=args.workers, summary_dir=args.summary_dir,
+                               from_summaries=args.from_summaries, regions=not args.no_regions,
+                               plot_workers=args.plot_workers, force_plots=args.force_plots)
+    end_time = time.time()
+    logging.info(f"\nScript finished in {end_time - start_time:.2f} seconds.")
+    sys.exit(exit_code)
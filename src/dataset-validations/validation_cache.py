@@ -0,0 +1,128 @@
+#
+# =================================================================================================
+#
+# File: validation_cache.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Per-partition cache of Stage 1 table profiles, for incremental re-validation.
+#
+#   Every catalog row carries the `source_file` it was loaded from (one FastSpecFit HEALPix
+#   file, one DESIVAST catalog), and each file's rows share an `ingestion_timestamp`. A
+#   partition's version is its row count plus its latest ingestion timestamp, both read from
+#   the (source_file, ingestion_timestamp) index. The partial aggregates behind every
+#   profile check (row count, NULL/non-finite count per column, MIN/MAX per column) are
+#   cached per (table, source_file, column, version) in one JSON file per table, and merged
+#   into the table-wide profile. Reloading one file therefore rescans only that file.
+#
+# =================================================================================================
+#
+
+import json
+import os
+from pathlib import Path
+
+from psycopg2 import sql
+
+CACHE_DIR = Path.home() / ".cache" / "desi-cosmic-void-galaxies" / "validation"
+
+
+def _pg_order(value):
+    # PostgreSQL sorts NaN above every other number; MIN/MAX merges must do the same.
+    return (value != value, value if value == value else 0.0)
+
+
+def _extreme(values, pick):
+    values = [v for v in values if v is not None]
+    return pick(values, key=_pg_order) if values else None
+
+
+def partition_versions(cursor, schema_name, table_name):
+    """
+    Returns {source_file: version} for a table, from its (source_file, ingestion_timestamp) index.
+
+    A version is the partition's row count and latest ingestion timestamp, so reloading or
+    deleting a file's rows changes it.
+    """
+    cursor.execute(sql.SQL(
+        "SELECT source_file, COUNT(*), MAX(ingestion_timestamp) FROM {} GROUP BY source_file"
+    ).format(sql.Identifier(schema_name, table_name)))
+    return {partition: f"{count}:{latest.isoformat() if latest else ''}"
+            for partition, count, latest in cursor.fetchall()}
+
+
+def merge_profiles(partials, null_columns, range_columns):
+    """
+    Merges per-partition profiles into one table-wide profile.
+
+    Args:
+        partials (list): Partition profiles with 'row_count', 'nonfinite', 'min' and 'max'.
+        null_columns (list): Columns whose NULL/non-finite counts are summed.
+        range_columns (list): Columns whose extremes are combined.
+
+    Returns:
+        dict: 'row_count', 'nonfinite', 'min' and 'max' over all partitions.
+    """
+    return {
+        'row_count': sum(p['row_count'] for p in partials),
+        'nonfinite': {col: sum(p['nonfinite'][col] for p in partials) for col in null_columns},
+        'min': {col: _extreme([p['min'][col] for p in partials], min) for col in range_columns},
+        'max': {col: _extreme([p['max'][col] for p in partials], max) for col in range_columns},
+    }
+
+
+class PartitionCache:
+    """
+    Cached partition profiles of one table.
+
+    Args:
+        path (Path): JSON file holding {source_file: {'version': str, 'profile': dict}}.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path) as handle:
+                self.entries = json.load(handle)
+
+    @classmethod
+    def for_table(cls, database, schema_name, table_name, cache_dir=CACHE_DIR):
+        """Opens the cache of one table in one database."""
+        return cls(Path(cache_dir) / f"{database}.{schema_name}.{table_name}.json")
+
+    def get(self, partition, version, null_columns, range_columns):
+        """
+        Returns a partition's cached profile if it is current and covers every column.
+
+        Returns:
+            dict or None: The cached partition profile, or None if it must be recomputed.
+        """
+        entry = self.entries.get(partition)
+        if entry is None or entry['version'] != version:
+            return None
+        profile = entry['profile']
+        if not (set(null_columns) <= profile['nonfinite'].keys() and set(range_columns) <= profile['min'].keys()):
+            return None
+        return profile
+
+    def put(self, partition, version, profile):
+        """Stores a partition's freshly computed profile."""
+        self.entries[partition] = {
+            'version': version,
+            'profile': {key: profile[key] for key in ('row_count', 'nonfinite', 'min', 'max')},
+        }
+
+    def retain(self, partitions):
+        """Drops partitions that no longer exist in the table."""
+        self.entries = {p: e for p, e in self.entries.items() if p in partitions}
+
+    def save(self):
+        """Writes the cache atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f"{self.path.stem}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as handle:
+            json.dump(self.entries, handle, sort_keys=True, default=float)
+        tmp_path.replace(self.path)
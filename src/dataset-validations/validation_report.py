@@ -0,0 +1,128 @@
+#
+# =================================================================================================
+#
+# File: validation_report.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Query instrumentation and machine-readable reports for the validation scripts.
+#
+#   `InstrumentedCursor` is a psycopg2 cursor that times every statement it executes and,
+#   when `explain` is set, first captures its `EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)` plan.
+#   EXPLAIN ANALYZE runs the query itself, so enabling it roughly doubles the cost of each
+#   check; it is meant for diagnosing slow checks, not for routine runs.
+#
+#   `write_report` dumps checks, timings and plans to JSON with sorted keys and a stable
+#   check order, so two runs can be diffed directly. Each plan is also reduced to a short
+#   list of its scan nodes (e.g. "Seq Scan on fastspecfit_galaxies"), which makes a lost
+#   index show up as a one-line change.
+#
+# =================================================================================================
+#
+
+import datetime
+import decimal
+import json
+import time
+from pathlib import Path
+
+import psycopg2.extensions
+
+# Statements that EXPLAIN can wrap without side effects.
+_EXPLAINABLE = ('SELECT', 'WITH')
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """
+    A cursor that records {'sql', 'elapsed', 'rows', 'plan', 'scans'} for every statement.
+
+    Pass it as `cursor_factory` when connecting; set `explain = True` on a cursor to capture
+    query plans as well.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.explain = False
+        self.queries = []
+
+    def execute(self, query, vars=None):
+        text = self.mogrify(query, vars).decode()
+        plan = None
+        if self.explain and text.lstrip().upper().startswith(_EXPLAINABLE):
+            super().execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + text)
+            plan = self.fetchone()[0][0]
+
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self.queries.append({
+                'sql': " ".join(text.split()),
+                'elapsed': time.perf_counter() - start,
+                'rows': self.rowcount,
+                'plan': plan,
+                'scans': scan_nodes(plan['Plan']) if plan else None,
+            })
+
+
+def scan_nodes(node):
+    """Lists the scan nodes of a JSON query plan, e.g. 'Index Only Scan on t using idx'."""
+    scans = []
+    if 'Relation Name' in node:
+        scan = f"{node['Node Type']} on {node['Relation Name']}"
+        if 'Index Name' in node:
+            scan += f" using {node['Index Name']}"
+        scans.append(scan)
+    for child in node.get('Plans', []):
+        scans.extend(scan_nodes(child))
+    return scans
+
+
+def _json_default(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+def write_report(path, stage, results, profiles=None, options=None, elapsed=None):
+    """
+    Writes a validation run as JSON.
+
+    Args:
+        path (str): Output file.
+        stage (str): Validation stage, e.g. "stage1".
+        results (list): CheckResult tuples, in report order.
+        profiles (dict, optional): {table: profile dict} shared by profile checks; the
+            per-column values are omitted (they are already in the check results), binned
+            'histograms' are kept.
+        options (dict, optional): Command-line options of the run.
+        elapsed (float, optional): Wall-clock time of the run in seconds.
+
+    Returns:
+        Path: The written file.
+    """
+    checks = [result._asdict() for result in results]
+    report = {
+        'stage': stage,
+        'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'options': options or {},
+        'summary': {status: sum(c['status'] == status for c in checks) for status in sorted({c['status'] for c in checks})},
+        'elapsed': elapsed,
+        'checks': checks,
+        'profiles': {
+            table: ({'error': str(profile)} if isinstance(profile, Exception) else
+                    {key: profile[key] for key in ('method', 'elapsed', 'row_count', 'queries', 'histograms') if key in profile})
+            for table, profile in (profiles or {}).items()
+        },
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as handle:
+        json.dump(report, handle, indent=2, sort_keys=True, default=_json_default)
+    return path
@@ -0,0 +1,197 @@
+#
+# =================================================================================================
+#
+# File: void_systematics.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Grouped void-catalog systematics for Stage 2: how void properties differ between the
+#   finder algorithms (VoidFinder, REVOLVER, VIDE, ZOBOV) and between the galactic caps.
+#
+#   The void table is read in a single query. For every quantity, one `lexsort` by
+#   (group, value) lays out each (algorithm, galactic_cap) group as a contiguous sorted
+#   array, and every statistic is then read from those presorted arrays without sorting again:
+#     - counts, means and quantiles (by index interpolation);
+#     - binned distributions (`searchsorted` against the bin edges);
+#     - two-sample Kolmogorov-Smirnov statistics for every pair of groups, by evaluating both
+#       empirical CDFs on the merged sample with `searchsorted`.
+#   Algorithm-level results (both caps together) merge the sorted cap arrays.
+#
+# =================================================================================================
+#
+
+import hashlib
+from collections import namedtuple
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from psycopg2 import sql
+from scipy.stats import kstwo
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# `quantities` maps names to (trusted SQL expression, (low, high, bins)) for the binned
+# distributions; `group_by` lists the grouping columns.
+SystematicsSpec = namedtuple('SystematicsSpec', ['name', 'table', 'group_by', 'quantities'])
+
+
+def sorted_quantile(values, q):
+    """Quantile of an already sorted array (linear interpolation, as `np.quantile`)."""
+    if len(values) == 0:
+        return None
+    position = q * (len(values) - 1)
+    low = int(np.floor(position))
+    high = min(low + 1, len(values) - 1)
+    return float(values[low] + (position - low) * (values[high] - values[low]))
+
+
+def ks_2samp_sorted(a, b):
+    """
+    Two-sample Kolmogorov-Smirnov test of two sorted arrays.
+
+    Returns:
+        tuple: (D statistic, p-value as `scipy.stats.ks_2samp(method='asymp')`), or (None, None) if a sample is empty.
+    """
+    if len(a) == 0 or len(b) == 0:
+        return None, None
+    merged = np.concatenate([a, b])
+    cdf_a = np.searchsorted(a, merged, side='right') / len(a)
+    cdf_b = np.searchsorted(b, merged, side='right') / len(b)
+    d = float(np.max(np.abs(cdf_a - cdf_b)))
+    effective = len(a) * len(b) / (len(a) + len(b))
+    return d, float(kstwo.sf(d, np.round(effective)))
+
+
+class VoidSystematics:
+    """
+    Presorted per-group values of every quantity of one spec.
+
+    Args:
+        spec (SystematicsSpec): Grouping and quantities.
+        values (dict): {quantity: {group tuple: sorted finite values}}.
+        nonfinite (dict): {quantity: {group tuple: NULL/NaN/Infinity count}}.
+    """
+
+    def __init__(self, spec, values, nonfinite):
+        self.spec = spec
+        self.values = values
+        self.nonfinite = nonfinite
+
+    def groups(self):
+        return sorted({group for per_group in self.values.values() for group in per_group})
+
+    def row_count(self, group=None):
+        quantity = next(iter(self.spec.quantities))
+        groups = [group] if group is not None else self.groups()
+        return int(sum(len(self.values[quantity].get(g, ())) + self.nonfinite[quantity].get(g, 0) for g in groups))
+
+    def collapse(self, keep):
+        """Merges the sorted arrays over every grouping column not in `keep`."""
+        index = [self.spec.group_by.index(col) for col in keep]
+        values, nonfinite = {}, {}
+        for quantity, per_group in self.values.items():
+            parts = {}
+            for group, array in per_group.items():
+                parts.setdefault(tuple(group[i] for i in index), []).append(array)
+            values[quantity] = {key: np.sort(np.concatenate(arrays), kind='mergesort') for key, arrays in parts.items()}
+            nonfinite[quantity] = {}
+            for group, count in self.nonfinite[quantity].items():
+                key = tuple(group[i] for i in index)
+                nonfinite[quantity][key] = nonfinite[quantity].get(key, 0) + count
+        return VoidSystematics(self.spec._replace(group_by=tuple(keep)), values, nonfinite)
+
+    def count_at_most(self, quantity, threshold, group=None):
+        """Values <= threshold, in one group or all of them."""
+        groups = [group] if group is not None else self.groups()
+        return int(sum(np.searchsorted(self.values[quantity].get(g, np.empty(0)), threshold, side='right')
+                       for g in groups))
+
+    def quantile(self, quantity, q, group):
+        return sorted_quantile(self.values[quantity].get(group, np.empty(0)), q)
+
+    def histogram(self, quantity, group):
+        """(counts, edges) of one group over the quantity's configured bins."""
+        low, high, bins = self.spec.quantities[quantity][1]
+        edges = np.linspace(low, high, bins + 1)
+        return np.diff(np.searchsorted(self.values[quantity].get(group, np.empty(0)), edges, side='left')), edges
+
+    def table(self):
+        """One row per (quantity, group): count, non-finite, mean, std and quantiles."""
+        rows = []
+        for quantity, per_group in self.values.items():
+            for group in self.groups():
+                array = per_group.get(group, np.empty(0))
+                row = dict(zip(self.spec.group_by, group))
+                row.update({'quantity': quantity, 'count': len(array),
+                            'nonfinite': self.nonfinite[quantity].get(group, 0),
+                            'mean': float(array.mean()) if len(array) else None,
+                            'std': float(array.std()) if len(array) else None})
+                row.update({f"q{int(100 * q):02d}": sorted_quantile(array, q) for q in QUANTILES})
+                rows.append(row)
+        return pd.DataFrame(rows)
+
+    def ks_table(self):
+        """Pairwise KS statistics between every two groups, per quantity."""
+        rows = []
+        for quantity, per_group in self.values.items():
+            for a, b in combinations(self.groups(), 2):
+                d, p = ks_2samp_sorted(per_group.get(a, np.empty(0)), per_group.get(b, np.empty(0)))
+                rows.append({'quantity': quantity, 'group_a': "/".join(map(str, a)), 'group_b': "/".join(map(str, b)),
+                             **{f"same_{col}": a[i] == b[i] for i, col in enumerate(self.spec.group_by)},
+                             'n_a': len(per_group.get(a, ())), 'n_b': len(per_group.get(b, ())),
+                             'ks_d': d, 'p_value': p})
+        return pd.DataFrame(rows)
+
+    def content_hash(self):
+        """Short hash of every group's sorted values and non-finite count."""
+        digest = hashlib.sha1(repr(self.spec.quantities).encode())
+        for quantity, per_group in self.values.items():
+            for group in sorted(per_group):
+                digest.update(repr((quantity, group, self.nonfinite[quantity].get(group, 0))).encode())
+                digest.update(per_group[group].tobytes())
+        return digest.hexdigest()[:16]
+
+    def to_dict(self):
+        return {'table': self.table().to_dict('records'), 'ks': self.ks_table().to_dict('records')}
+
+
+def void_systematics(connection, specs, method='sql', chunk_size=None, cursor=None):
+    """
+    Reads each spec's table once and builds the presorted per-group arrays.
+
+    `method` and `chunk_size` are accepted for interface compatibility with the other
+    engines; the void catalogs are small enough to fetch in one query.
+
+    Returns:
+        dict: {spec name: VoidSystematics}.
+    """
+    own_cursor = cursor is None
+    cursor = cursor if cursor is not None else connection.cursor()
+    results = {}
+    try:
+        for spec in specs:
+            columns = [sql.Identifier(col) for col in spec.group_by]
+            columns += [sql.SQL("({})::float8").format(sql.SQL(expression)) for expression, _ in spec.quantities.values()]
+            cursor.execute(sql.SQL("SELECT {} FROM {}").format(sql.SQL(", ").join(columns), sql.Identifier(*spec.table)))
+            frame = pd.DataFrame(cursor.fetchall(), columns=list(spec.group_by) + list(spec.quantities))
+
+            codes, groups = pd.MultiIndex.from_frame(frame[list(spec.group_by)]).factorize(sort=True)
+            values, nonfinite = {}, {}
+            for quantity in spec.quantities:
+                data = frame[quantity].to_numpy(dtype=np.float64, na_value=np.nan)
+                finite = np.isfinite(data)
+                nonfinite[quantity] = {tuple(groups[c]): int(n) for c, n in
+                                       enumerate(np.bincount(codes[~finite], minlength=len(groups))) if n}
+                keys, data = codes[finite], data[finite]
+                order = np.lexsort((data, keys))
+                keys, data = keys[order], data[order]
+                bounds = np.searchsorted(keys, np.arange(len(groups) + 1))
+                values[quantity] = {tuple(groups[c]): data[bounds[c]:bounds[c + 1]] for c in range(len(groups))}
+            results[spec.name] = VoidSystematics(spec, values, nonfinite)
+    finally:
+        if own_cursor:
+            cursor.close()
+    return results
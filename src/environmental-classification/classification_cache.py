@@ -0,0 +1,83 @@
+#
+# =================================================================================================
+#
+# File: classification_cache.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Content-addressed disk cache for per-algorithm environment classifications.
+#
+#   A classification depends only on three things: the algorithm's void catalog (centres,
+#   radii and, for VoidFinder, the HOLES index), the galaxy snapshot being classified, and
+#   the classifier parameters. Each is reduced to a short hash and combined into one key per
+#   algorithm, so editing or reloading one algorithm's catalog invalidates that algorithm
+#   alone. Results are stored as one `.npz` per key next to the cosmology distance tables
+#   and are written atomically, so concurrent runs never read a partial file.
+#
+# =================================================================================================
+#
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from cosmology_distances import DEFAULT_CACHE_DIR
+
+CACHE_DIR = DEFAULT_CACHE_DIR / "classification"
+
+# Bump whenever the classification logic changes, so old cached labels are never reused.
+CLASSIFIER_VERSION = 1
+
+RESULT_FIELDS = ('in_void', 'void_id', 'distance_in_void_radii', 'nearest_void_id', 'nearest_void_distance')
+
+
+def classification_key(algorithm, void_hash, galaxy_snapshot, params):
+    """
+    Derives the cache key for one algorithm's classification.
+
+    Args:
+        algorithm (str): Void-finding algorithm.
+        void_hash (str): Content hash of the algorithm's void catalog.
+        galaxy_snapshot (str): Identifier of the galaxy snapshot being classified.
+        params (dict): JSON-serialisable classifier parameters.
+
+    Returns:
+        str: A 16-character hexadecimal key.
+    """
+    payload = {
+        "version": CLASSIFIER_VERSION,
+        "algorithm": algorithm,
+        "voids": void_hash,
+        "galaxies": galaxy_snapshot,
+        "params": params,
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def load_cached_result(key, cache_dir=CACHE_DIR):
+    """
+    Loads a cached classification.
+
+    Returns:
+        Tuple[np.ndarray, dict] or None: The classified TARGETIDs and the
+            `classify_environment`-style result arrays, or None on a cache miss.
+    """
+    path = Path(cache_dir) / f"{key}.npz"
+    if not path.exists():
+        return None
+    with np.load(path) as cached:
+        return cached['targetid'], {field: cached[field] for field in RESULT_FIELDS}
+
+
+def store_cached_result(key, targetids, result, cache_dir=CACHE_DIR):
+    """Stores a classification under `key`, replacing any previous entry atomically."""
+    path = Path(cache_dir) / f"{key}.npz"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+    np.savez(tmp_path, targetid=targetids, **{field: result[field] for field in RESULT_FIELDS})
+    tmp_path.replace(path)
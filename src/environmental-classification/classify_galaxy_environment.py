@@ -0,0 +1,561 @@
+#!/usr/bin/env python3
+#
+# =================================================================================================
+#
+# File: classify_galaxy_environment.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Phase 4 environmental classification engine. Every galaxy in the FastSpecFit catalog is
+#   labelled 'void' or 'wall' against each DESIVAST void-finding algorithm, and the nearest
+#   void is recorded for every galaxy regardless of its label.
+#
+#   The naive approach sketched in ROADMAP.md loops over every galaxy and measures its
+#   distance to every void centre: ~6.4M x ~10k distance evaluations per algorithm. This
+#   script inverts the problem and lets spatial trees do the pruning:
+#     - Galaxies and void centres are placed in the same comoving Cartesian frame (Mpc/h)
+#       used by the DESIVAST catalogs, using the positions persisted by the ETL.
+#     - A single `cKDTree` is built over the galaxies and reused for every algorithm.
+#     - Each algorithm's voids are answered with one batched `query_ball_point` call using
+#       per-void effective radii, so only galaxies that actually lie inside a void sphere
+#       are ever touched.
+#     - A small `cKDTree` over void centres gives the nearest void for every galaxy.
+#   Overlapping voids are resolved by keeping the void in which the galaxy sits deepest
+#   (smallest distance in units of the void radius). VoidFinder voids are unions of HOLES
+#   spheres rather than single spheres; when the DESIVAST FITS directory is available their
+#   membership comes from the exact union-of-holes index in `voidfinder_holes.py`.
+#
+#   Galaxies are sharded by HEALPix pixel and the shards run across a process pool, with the
+#   void catalog published once in shared memory. Each shard's results are streamed into
+#   `science_analysis.environmental_classification` with `COPY FROM STDIN` as it finishes,
+#   and the previous rows for the classified algorithms are replaced in one transaction.
+#
+#   Results are cached per algorithm under a hash of its void catalog, the galaxy snapshot
+#   and the classifier parameters (`classification_cache.py`). An algorithm whose stored key
+#   is unchanged is skipped entirely, and one whose key is cached on disk is reloaded rather
+#   than recomputed, so a change to one algorithm's catalog only recomputes that algorithm.
+#   The cache entry is assembled from the streamed shards: only its compact result arrays are
+#   held for the whole catalog, never the output rows.
+#
+# =================================================================================================
+#
+
+import argparse
+import configparser
+import logging
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from classification_cache import classification_key, load_cached_result, store_cached_result
+from cosmology_distances import DESIVAST_OMEGA_M, redshift_to_cartesian
+from void_catalog import VoidCatalog
+from environment_db import ALGORITHMS, GALAXY_TABLE, VOID_TABLE, copy_dataframe, fetch_dataframe, nullable_int, open_connection
+
+# --- SCRIPT CONFIGURATION ---
+OUTPUT_TABLE = "science_analysis.environmental_classification"
+RUNS_TABLE = "science_analysis.environmental_classification_runs"
+
+# The DESIVAST catalogs are built from the volume-limited BGS sample (z < 0.24). Outside this
+# range there are no voids to find, so galaxies there are not classified at all rather than
+# being mislabelled as 'wall'.
+VOLLIM_Z_MIN = 0.0
+VOLLIM_Z_MAX = 0.24
+
+OUTPUT_TABLE_DDL = f"""
+CREATE SCHEMA IF NOT EXISTS science_analysis;
+CREATE TABLE IF NOT EXISTS {OUTPUT_TABLE} (
+    targetid BIGINT NOT NULL,
+    algorithm VARCHAR(20) NOT NULL,
+    environment VARCHAR(10) NOT NULL CHECK (environment IN ('void', 'wall')),
+    void_id INTEGER,
+    distance_in_void_radii REAL,
+    nearest_void_id INTEGER NOT NULL,
+    nearest_void_distance_mpc_h REAL NOT NULL,
+    PRIMARY KEY (targetid, algorithm)
+);
+CREATE TABLE IF NOT EXISTS {RUNS_TABLE} (
+    algorithm VARCHAR(20) PRIMARY KEY,
+    cache_key CHAR(16) NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+"""
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+
+
+# --- COORDINATE HELPERS ---
+
+def galaxy_cartesian(galaxies):
+    """
+    Returns galaxy positions in the DESIVAST comoving frame.
+
+    The ETL persists `x_mpc_h, y_mpc_h, z_mpc_h` for every galaxy; rows loaded before
+    those columns existed are filled in from the cached distance interpolator.
+
+    Args:
+        galaxies (pd.DataFrame): Must contain 'ra', 'dec', 'z' and the Cartesian columns.
+
+    Returns:
+        np.ndarray: An (N, 3) array of comoving Cartesian coordinates in Mpc/h.
+    """
+    xyz = galaxies[['x_mpc_h', 'y_mpc_h', 'z_mpc_h']].to_numpy(dtype=np.float64, copy=True)
+    missing = ~np.isfinite(xyz).all(axis=1)
+    if missing.any():
+        logging.info(f"Computing Cartesian coordinates for {missing.sum():,} galaxies without persisted positions")
+        subset = galaxies[missing]
+        xyz[missing] = redshift_to_cartesian(subset['ra'].to_numpy(), subset['dec'].to_numpy(), subset['z'].to_numpy())
+    return xyz
+
+
+# --- CORE CLASSIFICATION ---
+
+def sphere_membership(galaxy_tree, void_xyz, void_radius, workers=-1):
+    """
+    Finds, for every galaxy, the void sphere it sits deepest in.
+
+    Args:
+        galaxy_tree (cKDTree): Tree built over galaxy Cartesian coordinates.
+        void_xyz (np.ndarray): (M, 3) void centres in the same frame.
+        void_radius (np.ndarray): (M,) void effective radii in Mpc/h.
+        workers (int): Number of threads used by the tree queries (-1 uses all cores).
+
+    Returns:
+        np.ndarray: (N,) row index into the void arrays, -1 for galaxies outside every void.
+    """
+    galaxy_xyz = galaxy_tree.data
+
+    # One batched ball query answers every void at once. The result is, per void, the
+    # indices of the galaxies that fall inside its sphere.
+    members = galaxy_tree.query_ball_point(void_xyz, r=void_radius, workers=workers)
+    counts = np.fromiter((len(m) for m in members), dtype=np.int64, count=len(members))
+    if counts.sum() > 0:
+        galaxy_idx = np.concatenate([np.asarray(m, dtype=np.int64) for m in members if m])
+    else:
+        galaxy_idx = np.empty(0, dtype=np.int64)
+    void_idx = np.repeat(np.arange(len(void_xyz)), counts)
+
+    # Depth of each (galaxy, void) pair in units of the void radius.
+    separation = np.linalg.norm(galaxy_xyz[galaxy_idx] - void_xyz[void_idx], axis=1)
+    depth = separation / void_radius[void_idx]
+
+    # Where voids overlap, keep the one the galaxy sits deepest in: sort by galaxy then
+    # depth, and take the first pair of each galaxy run.
+    order = np.lexsort((depth, galaxy_idx))
+    sorted_galaxies = galaxy_idx[order]
+    first_of_run = np.ones(len(order), dtype=bool)
+    first_of_run[1:] = sorted_galaxies[1:] != sorted_galaxies[:-1]
+    best = order[first_of_run]
+
+    void_row = np.full(galaxy_tree.n, -1, dtype=np.int64)
+    void_row[galaxy_idx[best]] = void_idx[best]
+    return void_row
+
+
+def classify_environment(galaxy_tree, void_xyz, void_radius, void_ids, hole_index=None, void_tree=None,
+                         candidate_rows=None, workers=-1):
+    """
+    Classifies every galaxy in `galaxy_tree` as a void or wall galaxy.
+
+    Voids are treated as spheres of their effective radius unless `hole_index` is given,
+    in which case membership is the exact union-of-holes test used for VoidFinder.
+
+    Args:
+        galaxy_tree (cKDTree): Tree built over galaxy Cartesian coordinates.
+        void_xyz (np.ndarray): (M, 3) void centres in the same frame.
+        void_radius (np.ndarray): (M,) void effective radii in Mpc/h.
+        void_ids (np.ndarray): (M,) database identifiers of the voids.
+        hole_index (HoleSphereIndex, optional): Hole index whose void ids are row indices
+            into the void arrays.
+        void_tree (cKDTree, optional): Prebuilt tree over `void_xyz`.
+        candidate_rows (np.ndarray, optional): Rows of the only voids that can contain any
+            of these galaxies (see `padded_void_rows`); all voids are tested if omitted.
+        workers (int): Number of threads used by the tree queries (-1 uses all cores).
+
+    Returns:
+        Dict[str, np.ndarray]: Per-galaxy arrays aligned with the tree's input order:
+            'in_void', 'void_id' (-1 for wall galaxies), 'distance_in_void_radii'
+            (NaN for wall galaxies), 'nearest_void_id' and 'nearest_void_distance'.
+    """
+    n_galaxies = galaxy_tree.n
+    galaxy_xyz = galaxy_tree.data
+
+    if hole_index is None and candidate_rows is None:
+        void_row = sphere_membership(galaxy_tree, void_xyz, void_radius, workers=workers)
+    elif hole_index is None and len(candidate_rows) == 0:
+        # No void centre near this shard: every galaxy is a wall galaxy.
+        void_row = np.full(n_galaxies, -1, dtype=np.int64)
+    elif hole_index is None:
+        local_row = sphere_membership(galaxy_tree, void_xyz[candidate_rows], void_radius[candidate_rows],
+                                      workers=workers)
+        void_row = np.full_like(local_row, -1)
+        inside = local_row >= 0
+        void_row[inside] = candidate_rows[local_row[inside]]
+    else:
+        void_row = hole_index.query(galaxy_xyz)
+    in_void = void_row >= 0
+    members = np.flatnonzero(in_void)
+
+    void_id = np.full(n_galaxies, -1, dtype=np.int64)
+    void_id[members] = void_ids[void_row[members]]
+    # Distance to the owning void's centre in units of its effective radius. For VoidFinder
+    # this can exceed 1 for galaxies in the void's outer holes.
+    distance_in_void_radii = np.full(n_galaxies, np.nan)
+    separation = np.linalg.norm(galaxy_xyz[members] - void_xyz[void_row[members]], axis=1)
+    distance_in_void_radii[members] = separation / void_radius[void_row[members]]
+
+    # The nearest void centre is recorded for every galaxy, including wall galaxies.
+    if void_tree is None:
+        void_tree = cKDTree(void_xyz)
+    nearest_distance, nearest_idx = void_tree.query(galaxy_xyz, k=1, workers=workers)
+
+    return {
+        'in_void': in_void,
+        'void_id': void_id,
+        'distance_in_void_radii': distance_in_void_radii,
+        'nearest_void_id': void_ids[nearest_idx],
+        'nearest_void_distance': nearest_distance,
+    }
+
+
+def _sentinel(dtype):
+    # Value left in rows no shard covered: not in a void, no void id, NaN distance.
+    return {'b': False, 'f': np.nan}.get(dtype.kind, -1)
+
+
+def merge_shard_results(n_galaxies, shard_results, merged):
+    """
+    Passes per-shard results through while reassembling full-catalog arrays for the cache.
+
+    Each shard's results are yielded as soon as they arrive, so they can be streamed into
+    the output table; only the compact result arrays are kept, in `merged`, pre-filled with
+    sentinels (-1 ids, NaN distances, not in a void) for any row no shard covers.
+
+    Args:
+        n_galaxies (int): Total number of classified galaxies.
+        shard_results: Iterable of (galaxy row indices, per-algorithm results) pairs.
+        merged (dict): Filled in place with {algorithm: {name: array}} in galaxy-table order.
+
+    Yields:
+        Tuple[np.ndarray, str, dict]: (galaxy row indices, algorithm, shard results).
+    """
+    for rows, results in shard_results:
+        for algorithm, result in results.items():
+            if algorithm not in merged:
+                merged[algorithm] = {name: np.full(n_galaxies, _sentinel(values.dtype), dtype=values.dtype)
+                                     for name, values in result.items()}
+            for name, values in result.items():
+                merged[algorithm][name][rows] = values
+            yield rows, algorithm, result
+
+
+def build_output_frame(targetids, algorithm, result):
+    """Assembles the classification arrays into rows for the output table."""
+    return pd.DataFrame({
+        'targetid': targetids,
+        'algorithm': algorithm,
+        'environment': np.where(result['in_void'], 'void', 'wall'),
+        # Wall galaxies have no containing void, so their void_id is written as NULL.
+        'void_id': nullable_int(result['void_id'], result['in_void']),
+        'distance_in_void_radii': result['distance_in_void_radii'],
+        'nearest_void_id': result['nearest_void_id'],
+        'nearest_void_distance_mpc_h': result['nearest_void_distance'],
+    })
+
+
+# --- SHARDED PARALLEL EXECUTION ---
+# Galaxies are sharded by the HEALPix pixel of their FastSpecFit file (`healpix_id`), and each
+# shard is classified independently against the shared void catalog. Voids are selected per
+# shard by padding the shard's bounding box with the largest void radius, so a void straddling
+# a shard boundary is seen by every shard it reaches and results are identical to a single run.
+
+_WORKER_CATALOG = None
+
+
+def _init_worker(handle):
+    """Pool initializer: attach each worker to the published void catalog exactly once."""
+    global _WORKER_CATALOG
+    _WORKER_CATALOG = VoidCatalog.attach(handle)
+
+
+def padded_void_rows(galaxy_xyz, void_xyz, void_radius):
+    """
+    Selects the voids that can contain any galaxy of a shard.
+
+    A void can only contain a galaxy if its centre lies within one radius of it, so every
+    candidate's centre falls inside the shard's bounding box padded by the largest radius.
+
+    Returns:
+        np.ndarray: Row indices into the void arrays.
+    """
+    pad = void_radius.max()
+    lo = galaxy_xyz.min(axis=0) - pad
+    hi = galaxy_xyz.max(axis=0) + pad
+    return np.flatnonzero(np.all((void_xyz >= lo) & (void_xyz <= hi), axis=1))
+
+
+def classify_shard(galaxy_xyz, catalog, algorithms, workers=1):
+    """
+    Classifies one shard of galaxies against every requested algorithm.
+
+    Args:
+        galaxy_xyz (np.ndarray): (N, 3) Cartesian positions of the shard's galaxies.
+        catalog (VoidCatalog): The void catalog (local or attached).
+        algorithms (List[str]): Algorithms to classify against.
+        workers (int): Threads per tree query; 1 inside pool workers.
+
+    Returns:
+        Dict[str, Dict[str, np.ndarray]]: `classify_environment` output per algorithm.
+    """
+    galaxy_tree = cKDTree(galaxy_xyz)
+    results = {}
+    for algorithm in algorithms:
+        voids = catalog.voids(algorithm)
+        if len(voids) == 0:
+            continue
+        void_xyz = catalog.void_xyz(algorithm)
+        results[algorithm] = classify_environment(
+            galaxy_tree,
+            void_xyz,
+            voids['radius'],
+            voids['void_id'],
+            hole_index=catalog.hole_index() if algorithm == 'VoidFinder' else None,
+            void_tree=catalog.void_tree(algorithm),
+            candidate_rows=padded_void_rows(galaxy_xyz, void_xyz, voids['radius']),
+            workers=workers
+        )
+    return results
+
+
+def _classify_shard_task(task):
+    shard_id, galaxy_xyz, algorithms = task
+    return shard_id, classify_shard(galaxy_xyz, _WORKER_CATALOG, algorithms)
+
+
+def iter_shard_results(shard_ids, galaxy_xyz, catalog, algorithms, n_workers):
+    """
+    Classifies all shards, yielding results as each shard finishes.
+
+    With more than one worker the catalog is published to shared memory and shards run
+    in a process pool; otherwise they run one after another in this process.
+
+    Args:
+        shard_ids (np.ndarray): (N,) shard (HEALPix) identifier of each galaxy.
+        galaxy_xyz (np.ndarray): (N, 3) galaxy positions.
+        catalog (VoidCatalog): The loaded void catalog.
+        algorithms (List[str]): Algorithms to classify against.
+        n_workers (int): Number of worker processes.
+
+    Yields:
+        Tuple[np.ndarray, dict]: Galaxy row indices of the shard and its results.
+    """
+    shards = pd.Series(shard_ids).groupby(shard_ids).indices
+    # Largest shards first, so the pool is not left waiting on one big straggler.
+    order = sorted(shards, key=lambda shard: len(shards[shard]), reverse=True)
+
+    if n_workers <= 1:
+        for shard in order:
+            yield shards[shard], classify_shard(galaxy_xyz[shards[shard]], catalog, algorithms, workers=-1)
+        return
+
+    handle = catalog.publish()
+    try:
+        tasks = ((shard, galaxy_xyz[shards[shard]], algorithms) for shard in order)
+        with Pool(n_workers, initializer=_init_worker, initargs=(handle,)) as pool:
+            for shard, results in pool.imap_unordered(_classify_shard_task, tasks):
+                yield shards[shard], results
+    finally:
+        catalog.unlink()
+
+
+# --- DATABASE I/O ---
+
+def load_galaxies(conn, z_min, z_max):
+    """Loads the galaxy positions needed for classification."""
+    query = (
+        f"SELECT targetid, ra, dec, z, x_mpc_h, y_mpc_h, z_mpc_h, healpix_id FROM {GALAXY_TABLE} "
+        f"WHERE z >= %s AND z <= %s ORDER BY targetid"
+    )
+    return fetch_dataframe(conn, query, params=(z_min, z_max), dtype={'targetid': np.int64})
+
+
+def galaxy_snapshot(conn, z_min, z_max):
+    """
+    Identifies the galaxy snapshot being classified without reading the rows.
+
+    The ETL truncates and reloads the table, so the row count and latest ingestion
+    timestamp of the redshift window change whenever the classified galaxies can.
+    """
+    df = fetch_dataframe(conn, (
+        f"SELECT COUNT(*) AS n_galaxies, MAX(ingestion_timestamp) AS ingested FROM {GALAXY_TABLE} "
+        f"WHERE z >= %s AND z <= %s"
+    ), params=(z_min, z_max))
+    return f"{df['n_galaxies'].iloc[0]}:{df['ingested'].iloc[0]}"
+
+
+def stored_run_keys(conn):
+    """Returns the cache key of the classification currently stored for each algorithm."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", (RUNS_TABLE,))
+        if cursor.fetchone()[0] is None:
+            return {}
+        cursor.execute(f"SELECT algorithm, cache_key FROM {RUNS_TABLE}")
+        return dict(cursor.fetchall())
+
+
+def write_classifications(conn, run_keys, frames):
+    """
+    Replaces the given algorithms' rows in the output table in a single transaction.
+
+    `frames` may be a generator: each DataFrame is streamed into the table with COPY as
+    soon as it is produced, and the transaction is committed only after the last one.
+    The cache key of each written algorithm is recorded in the same transaction.
+
+    Args:
+        conn: An open connection to the FastSpecFit database.
+        run_keys (Dict[str, str]): Cache key of each algorithm being replaced.
+        frames: Iterable of output DataFrames.
+    """
+    total = 0
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(OUTPUT_TABLE_DDL)
+            cursor.execute(f"DELETE FROM {OUTPUT_TABLE} WHERE algorithm = ANY(%s)", (list(run_keys),))
+            for df in frames:
+                copy_dataframe(cursor, df, OUTPUT_TABLE)
+                total += len(df)
+            for algorithm, key in run_keys.items():
+                cursor.execute(
+                    f"INSERT INTO {RUNS_TABLE} (algorithm, cache_key) VALUES (%s, %s) "
+                    f"ON CONFLICT (algorithm) DO UPDATE SET cache_key = EXCLUDED.cache_key, updated_at = NOW()",
+                    (algorithm, key)
+                )
+        conn.commit()
+        logging.info(f"✅ Wrote {total:,} classifications to {OUTPUT_TABLE}")
+    except Exception as error:
+        logging.error(f"❌ Error writing classifications: {error}")
+        conn.rollback()
+        raise
+
+
+# --- MAIN EXECUTION ---
+
+def main():
+    parser = argparse.ArgumentParser(description="KD-tree void/wall classification of FastSpecFit galaxies.")
+    parser.add_argument('--algorithms', nargs='+', choices=ALGORITHMS, default=ALGORITHMS,
+                        help="Void-finding algorithms to classify against (default: all four).")
+    parser.add_argument('--z-min', type=float, default=VOLLIM_Z_MIN, help="Minimum galaxy redshift to classify.")
+    parser.add_argument('--z-max', type=float, default=VOLLIM_Z_MAX, help="Maximum galaxy redshift to classify.")
+    parser.add_argument('--desivast-dir', help="Directory of DESIVAST FITS files, used for VoidFinder HOLES "
+                                               "(default: [paths] desivast_dir in config.ini).")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Worker processes for the HEALPix shards (default: all cores; 1 runs in-process).")
+    parser.add_argument('--refresh', action='store_true',
+                        help="Ignore cached and stored classifications and recompute everything.")
+    parser.add_argument('--dry-run', action='store_true', help="Classify but do not write to the database.")
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    desivast_dir = args.desivast_dir or config.get('paths', 'desivast_dir', fallback=None)
+
+    logging.info("🌌 STARTING GALAXY ENVIRONMENT CLASSIFICATION")
+    total_start = time.time()
+
+    void_conn = open_connection('dbname_desivast')
+    try:
+        catalog = VoidCatalog.from_database(void_conn, desivast_dir)
+    finally:
+        void_conn.close()
+    for algorithm in args.algorithms:
+        if len(catalog.voids(algorithm)) == 0:
+            logging.warning(f"⚠️ No {algorithm} voids found in {VOID_TABLE}: skipping")
+    if 'VoidFinder' in args.algorithms and catalog.hole_index() is None:
+        logging.warning("⚠️ No DESIVAST directory configured: VoidFinder voids approximated as spheres")
+
+    galaxy_conn = open_connection('dbname_fastspecfit')
+    try:
+        # One cache key per algorithm: its void catalog, the galaxy snapshot and the parameters.
+        snapshot = galaxy_snapshot(galaxy_conn, args.z_min, args.z_max)
+        params = {'z_min': args.z_min, 'z_max': args.z_max, 'omega_m': DESIVAST_OMEGA_M}
+        run_keys = {
+            algorithm: classification_key(algorithm, catalog.content_hash(algorithm), snapshot, params)
+            for algorithm in args.algorithms if len(catalog.voids(algorithm)) > 0
+        }
+
+        stored = {} if args.refresh else stored_run_keys(galaxy_conn)
+        for algorithm in [a for a in run_keys if stored.get(a) == run_keys[a]]:
+            logging.info(f"✅ {algorithm}: stored classification is current (key {run_keys[algorithm]}), skipping")
+            del run_keys[algorithm]
+
+        classified = {}
+        for algorithm, key in run_keys.items():
+            cached = None if args.refresh else load_cached_result(key)
+            if cached is not None:
+                logging.info(f"✅ {algorithm}: reusing cached classification (key {key})")
+                classified[algorithm] = cached
+
+        pending = [algorithm for algorithm in run_keys if algorithm not in classified]
+        if pending:
+            galaxies = load_galaxies(galaxy_conn, args.z_min, args.z_max)
+            galaxy_xyz = galaxy_cartesian(galaxies)
+            targetids = galaxies['targetid'].to_numpy()
+            shard_ids = galaxies['healpix_id'].to_numpy()
+            logging.info(f"Classifying {len(galaxies):,} galaxies against {', '.join(pending)} in "
+                         f"{len(np.unique(shard_ids))} HEALPix shards with {args.workers} worker(s)")
+
+        # Cached algorithms are written from their arrays; the others are streamed shard by
+        # shard as the pool finishes them, while their arrays are assembled for the cache.
+        merged = {}
+        n_void = {algorithm: int(result['in_void'].sum()) for algorithm, (_, result) in classified.items()}
+        n_rows = {algorithm: len(ids) for algorithm, (ids, _) in classified.items()}
+
+        def output_frames():
+            for algorithm, (cached_ids, result) in classified.items():
+                yield build_output_frame(cached_ids, algorithm, result)
+            if not pending:
+                return
+            shard_results = iter_shard_results(shard_ids, galaxy_xyz, catalog, pending, args.workers)
+            for rows, algorithm, result in merge_shard_results(len(galaxies), shard_results, merged):
+                n_void[algorithm] = n_void.get(algorithm, 0) + int(result['in_void'].sum())
+                n_rows[algorithm] = n_rows.get(algorithm, 0) + len(rows)
+                yield build_output_frame(targetids[rows], algorithm, result)
+
+        if not run_keys:
+            logging.info("Nothing to write: all requested classifications are current")
+        elif args.dry_run:
+            total_rows = sum(len(df) for df in output_frames())
+            logging.info(f"  [DRY RUN] Would COPY {total_rows:,} rows into '{OUTPUT_TABLE}'")
+        else:
+            write_classifications(galaxy_conn, run_keys, output_frames())
+
+        for algorithm in n_rows:
+            logging.info(f"{algorithm}: {n_void[algorithm]:,} void / {n_rows[algorithm] - n_void[algorithm]:,} wall galaxies")
+        # Only a classification covering every galaxy is cached; rows outside every shard
+        # (no HEALPix id) would otherwise be reloaded as sentinels.
+        for algorithm, result in merged.items():
+            if n_rows[algorithm] == len(targetids):
+                store_cached_result(run_keys[algorithm], targetids, result)
+            else:
+                logging.warning(f"⚠️ {algorithm}: {len(targetids) - n_rows[algorithm]:,} galaxies were in no "
+                                f"HEALPix shard; classification not cached")
+    finally:
+        galaxy_conn.close()
+
+    logging.info(f"Classification finished in {(time.time() - total_start) / 60:.2f} minutes.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
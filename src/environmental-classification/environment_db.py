@@ -0,0 +1,132 @@
+#
+# =================================================================================================
+#
+# File: environment_db.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Shared PostgreSQL helpers for the Phase 4 environmental classification tools. Every
+#   spatial job in this directory moves millions of rows between the database and NumPy,
+#   so all transfers use `COPY ... TO STDOUT` / `COPY ... FROM STDIN` through an in-memory
+#   buffer rather than row-by-row cursors or INSERT statements.
+#
+#   Connection details are read from the same `config.ini` used by the FastSpecFit ETL:
+#
+#       [database]
+#       user = ...
+#       password = ...
+#       host = ...
+#       port = ...
+#       dbname_fastspecfit = ...
+#       dbname_desivast = ...
+#
+# =================================================================================================
+#
+
+import configparser
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+GALAXY_TABLE = "raw_catalogs.fastspecfit_galaxies"
+VOID_TABLE = "raw_catalogs.desivast_voids"
+
+# The four DESIVAST void-finding algorithms, in the order used throughout the project.
+ALGORITHMS = ["VoidFinder", "REVOLVER", "VIDE", "ZOBOV"]
+
+
+def get_db_config(config_path='config.ini'):
+    """
+    Reads the `[database]` section of the shared configuration file.
+
+    Args:
+        config_path (str): Path to the configuration file.
+
+    Returns:
+        configparser.SectionProxy: The database connection parameters.
+    """
+    config = configparser.ConfigParser()
+    config.read(config_path)
+    return config['database']
+
+
+def open_connection(dbname_key, config_path='config.ini'):
+    """
+    Opens a psycopg2 connection to one of the project databases.
+
+    Args:
+        dbname_key (str): The config key holding the database name
+                          (e.g. 'dbname_fastspecfit' or 'dbname_desivast').
+        config_path (str): Path to the configuration file.
+
+    Returns:
+        psycopg2.extensions.connection: An open database connection.
+    """
+    db_config = get_db_config(config_path)
+    return psycopg2.connect(
+        dbname=db_config[dbname_key],
+        user=db_config['user'],
+        password=db_config['password'],
+        host=db_config['host'],
+        port=db_config['port']
+    )
+
+
+def fetch_dataframe(conn, query, params=None, dtype=None):
+    """
+    Streams the result of a SELECT into a pandas DataFrame using `COPY ... TO STDOUT`.
+
+    For multi-million-row extracts this is several times faster than iterating a
+    cursor, because rows are serialised server-side and parsed in C by pandas.
+
+    Args:
+        conn: An open psycopg2 connection.
+        query (str): The SELECT statement to export.
+        params (tuple, optional): Values bound into `query` with psycopg2 placeholders.
+        dtype (dict, optional): Column dtypes passed through to `pd.read_csv`.
+
+    Returns:
+        pd.DataFrame: The query result, with SQL NULLs as NaN.
+    """
+    buffer = StringIO()
+    with conn.cursor() as cursor:
+        if params is not None:
+            # COPY does not accept bind parameters, so interpolate them safely client-side.
+            query = cursor.mogrify(query, params).decode()
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT CSV, HEADER)", buffer)
+    buffer.seek(0)
+    return pd.read_csv(buffer, dtype=dtype)
+
+
+def copy_dataframe(cursor, df, table_name):
+    """
+    Bulk loads a DataFrame into a table with `COPY ... FROM STDIN`.
+
+    The caller owns the transaction, so a load can be paired with a DELETE of the
+    rows it replaces and committed atomically.
+
+    Args:
+        cursor: An open psycopg2 cursor.
+        df (pd.DataFrame): The rows to load; column names must match the table.
+        table_name (str): The fully-qualified target table.
+    """
+    buffer = StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep='\\N')
+    buffer.seek(0)
+    columns = ','.join(df.columns)
+    cursor.copy_expert(f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT CSV, NULL '\\N')", buffer)
+
+
+def nullable_int(values, valid):
+    """
+    Wraps an integer array as a nullable pandas array, masking entries where `valid` is False.
+
+    `copy_dataframe` writes the masked entries as SQL NULL instead of a sentinel value.
+    """
+    array = pd.array(np.asarray(values, dtype=np.int64), dtype='Int64')
+    array[~np.asarray(valid, dtype=bool)] = pd.NA
+    return array
@@ -0,0 +1,132 @@
+#
+# =================================================================================================
+#
+# File: survey_footprint.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   HEALPix survey-footprint mask with a precomputed distance-to-edge map.
+#
+#   Void `edge_flag` only describes voids; galaxies close to the survey boundary have
+#   truncated neighbourhoods too, and bias any void/wall comparison. Measuring each galaxy's
+#   angular distance to the footprint edge directly means a search over the boundary for
+#   millions of objects. Instead the footprint is rasterised once:
+#     - galaxy positions are binned into a HEALPix occupancy mask (`np.bincount` on pixels);
+#     - the boundary is the set of empty pixels that touch an occupied one;
+#     - one `cKDTree` query over boundary pixel centres (as unit vectors) gives every
+#       occupied pixel its angular distance to the edge.
+#   A galaxy's edge distance is then a single array lookup at its pixel, which the
+#   FastSpecFit ETL stores as `edge_distance_deg`.
+#
+#   healpy is optional for the rest of the pipeline: this module imports without it, and
+#   building or querying a footprint raises an ImportError with install instructions.
+#
+# =================================================================================================
+#
+
+import os
+from pathlib import Path
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from cosmology_distances import DEFAULT_CACHE_DIR
+
+# --- DEPENDENCY CHECK ---
+try:
+    import healpy as hp
+except ImportError:
+    hp = None
+
+# NSIDE=256 pixels are ~0.23 deg across and hold ~20 BGS galaxies each, so the mask has
+# no spurious holes while still resolving the footprint edge.
+FOOTPRINT_NSIDE = 256
+
+
+def _require_healpy():
+    if hp is None:
+        raise ImportError("healpy is required for the survey footprint. Install with: pip install healpy")
+
+
+def default_footprint_path(nside=FOOTPRINT_NSIDE):
+    """Location of the persisted footprint map for a given resolution."""
+    return DEFAULT_CACHE_DIR / f"footprint_nside{nside}.npz"
+
+
+class SurveyFootprint:
+    """
+    Occupancy mask and distance-to-edge map on a HEALPix (RING) grid.
+
+    Args:
+        nside (int): HEALPix resolution.
+        mask (np.ndarray): (npix,) True for pixels inside the footprint.
+        edge_distance (np.ndarray): (npix,) angular distance in degrees from each pixel
+            centre to the nearest empty boundary pixel; 0 outside the footprint.
+    """
+
+    def __init__(self, nside, mask, edge_distance):
+        self.nside = int(nside)
+        self.mask = np.asarray(mask, dtype=bool)
+        self.edge_distance = np.asarray(edge_distance, dtype=np.float32)
+
+    @classmethod
+    def from_positions(cls, ra, dec, nside=FOOTPRINT_NSIDE, min_count=1):
+        """
+        Rasterises sky positions into a footprint and computes its distance-to-edge map.
+
+        Args:
+            ra (np.ndarray): Right Ascension in degrees.
+            dec (np.ndarray): Declination in degrees.
+            nside (int): HEALPix resolution.
+            min_count (int): Objects a pixel needs to count as inside the footprint.
+
+        Returns:
+            SurveyFootprint: The built footprint.
+        """
+        _require_healpy()
+        npix = hp.nside2npix(nside)
+        pixels = hp.ang2pix(nside, np.asarray(ra), np.asarray(dec), lonlat=True)
+        mask = np.bincount(pixels, minlength=npix) >= min_count
+
+        # Boundary: empty pixels adjacent to at least one occupied pixel.
+        inside = np.flatnonzero(mask)
+        neighbours = hp.get_all_neighbours(nside, inside).ravel()
+        neighbours = neighbours[neighbours >= 0]
+        boundary = np.unique(neighbours[~mask[neighbours]])
+
+        edge_distance = np.zeros(npix, dtype=np.float32)
+        if len(boundary) == 0:
+            edge_distance[inside] = 180.0
+        else:
+            # Nearest boundary pixel by chord length between unit vectors, then to an angle.
+            boundary_tree = cKDTree(np.column_stack(hp.pix2vec(nside, boundary)))
+            chord, _ = boundary_tree.query(np.column_stack(hp.pix2vec(nside, inside)), k=1, workers=-1)
+            edge_distance[inside] = np.degrees(2.0 * np.arcsin(np.minimum(chord / 2.0, 1.0)))
+        return cls(nside, mask, edge_distance)
+
+    def contains(self, ra, dec):
+        """Returns True for positions inside the footprint."""
+        _require_healpy()
+        return self.mask[hp.ang2pix(self.nside, np.asarray(ra), np.asarray(dec), lonlat=True)]
+
+    def edge_distance_at(self, ra, dec):
+        """Returns the footprint edge distance (degrees) at each position: one array lookup."""
+        _require_healpy()
+        return self.edge_distance[hp.ang2pix(self.nside, np.asarray(ra), np.asarray(dec), lonlat=True)]
+
+    def save(self, path=None):
+        """Writes the footprint to an .npz file atomically and returns its path."""
+        path = Path(path or default_footprint_path(self.nside))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        np.savez_compressed(tmp_path, nside=self.nside, mask=self.mask, edge_distance=self.edge_distance)
+        tmp_path.replace(path)
+        return path
+
+    @classmethod
+    def load(cls, path=None, nside=FOOTPRINT_NSIDE):
+        """Loads a footprint written by `save()`."""
+        with np.load(path or default_footprint_path(nside)) as data:
+            return cls(int(data['nside']), data['mask'], data['edge_distance'])
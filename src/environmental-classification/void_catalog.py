@@ -0,0 +1,260 @@
+#
+# =================================================================================================
+#
+# File: void_catalog.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   In-memory DESIVAST void catalog shared between processes without copying.
+#
+#   Parallel spatial jobs would otherwise have every worker re-query Postgres (or re-read the
+#   FITS files) and rebuild its own indexes, multiplying memory by the worker count.
+#   `VoidCatalog` loads all algorithms and both galactic caps once into compact structured
+#   NumPy arrays, builds the VoidFinder union-of-holes index, and can publish everything into a
+#   single `multiprocessing.shared_memory` block. Workers attach with the small, picklable
+#   handle returned by `publish()` and get read-only NumPy views onto that block.
+#
+#   Void records are sorted by algorithm, so each algorithm's voids are a contiguous slice
+#   (a view, never a copy). The small per-algorithm centre trees are built lazily in each
+#   process: a few thousand points take well under a millisecond.
+#
+# =================================================================================================
+#
+
+import hashlib
+import json
+import logging
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from environment_db import ALGORITHMS, VOID_TABLE, fetch_dataframe
+from voidfinder_holes import HoleSphereIndex, read_voidfinder_holes
+
+GALACTIC_CAPS = ["NGC", "SGC"]
+
+# One record per void. Algorithm and cap are stored as indices into ALGORITHMS / GALACTIC_CAPS.
+VOID_DTYPE = np.dtype([
+    ('void_id', np.int64),
+    ('algorithm', np.int8),
+    ('galactic_cap', np.int8),
+    ('original_void_index', np.int64),
+    ('x', np.float64),
+    ('y', np.float64),
+    ('z', np.float64),
+    ('radius', np.float64),
+])
+
+# Shared-memory blocks are laid out on 64-byte boundaries so every view is well aligned.
+_ALIGNMENT = 64
+
+
+class VoidCatalog:
+    """
+    All DESIVAST voids plus their prebuilt indexes, optionally backed by shared memory.
+
+    Build one with `from_database()` in the parent process, `publish()` it, and pass the
+    returned handle to workers, which call `VoidCatalog.attach(handle)`.
+    """
+
+    def __init__(self, arrays, params, shm=None):
+        self._arrays = arrays
+        self._params = params
+        self._shm = shm
+        self._trees = {}
+
+        # Algorithm slices into the sorted void records.
+        codes = self._arrays['voids']['algorithm']
+        self._slices = {}
+        for code, algorithm in enumerate(ALGORITHMS):
+            start, stop = np.searchsorted(codes, [code, code + 1])
+            self._slices[algorithm] = slice(int(start), int(stop))
+
+    # --- Construction ---
+
+    @classmethod
+    def from_database(cls, conn, desivast_dir=None):
+        """
+        Loads every algorithm's voids from the void table.
+
+        VoidFinder stores its effective radius in `r_eff`; the V2 algorithms' `radius_mpc_h`
+        is already an effective radius. When `desivast_dir` is given, the VoidFinder HOLES
+        are read from FITS and indexed for exact union-of-spheres membership.
+
+        Args:
+            conn: An open connection to the DESIVAST database.
+            desivast_dir (str, optional): Directory containing the DESIVAST FITS files.
+
+        Returns:
+            VoidCatalog: The loaded catalog (process-local until published).
+        """
+        df = fetch_dataframe(conn, (
+            f"SELECT void_id, algorithm, galactic_cap, original_void_index, x_mpc_h, y_mpc_h, z_mpc_h, "
+            f"COALESCE(r_eff, radius_mpc_h) AS radius_mpc_h FROM {VOID_TABLE}"
+        ))
+        voids = np.zeros(len(df), dtype=VOID_DTYPE)
+        voids['void_id'] = df['void_id']
+        voids['algorithm'] = df['algorithm'].map({a: i for i, a in enumerate(ALGORITHMS)})
+        voids['galactic_cap'] = df['galactic_cap'].map({c: i for i, c in enumerate(GALACTIC_CAPS)})
+        voids['original_void_index'] = df['original_void_index']
+        voids['x'], voids['y'], voids['z'] = df['x_mpc_h'], df['y_mpc_h'], df['z_mpc_h']
+        voids['radius'] = df['radius_mpc_h']
+        voids = voids[np.lexsort((voids['void_id'], voids['algorithm']))]
+
+        arrays = {'voids': voids}
+        params = {}
+        if desivast_dir:
+            holes = read_voidfinder_holes(desivast_dir)
+            index_arrays, index_params = build_hole_index(holes, voids).state()
+            arrays.update({f"holes.{name}": array for name, array in index_arrays.items()})
+            params['holes'] = index_params
+        return cls(arrays, params)
+
+    # --- Accessors ---
+
+    def voids(self, algorithm):
+        """Returns one algorithm's void records as a zero-copy structured view."""
+        return self._arrays['voids'][self._slices[algorithm]]
+
+    def void_xyz(self, algorithm):
+        """Returns one algorithm's void centres as an (M, 3) array."""
+        voids = self.voids(algorithm)
+        return np.column_stack((voids['x'], voids['y'], voids['z']))
+
+    def void_tree(self, algorithm):
+        """Returns a (per-process, cached) KD-tree over one algorithm's void centres."""
+        if algorithm not in self._trees:
+            self._trees[algorithm] = cKDTree(self.void_xyz(algorithm))
+        return self._trees[algorithm]
+
+    def hole_index(self):
+        """
+        Returns the VoidFinder union-of-holes index, or None if HOLES were not loaded.
+
+        The index's void ids are row positions within `voids('VoidFinder')`.
+        """
+        if 'holes' not in self._params:
+            return None
+        arrays = {name: self._arrays[f"holes.{name}"] for name in HoleSphereIndex.STATE_ARRAYS}
+        return HoleSphereIndex.from_state(arrays, self._params['holes'])
+
+    def content_hash(self, algorithm):
+        """
+        Returns a hash of everything that determines membership for one algorithm.
+
+        This covers the algorithm's void records and, for VoidFinder, the HOLES index, so
+        a change to one algorithm's catalog leaves the other algorithms' hashes untouched.
+        """
+        digest = hashlib.sha1(np.ascontiguousarray(self.voids(algorithm)).tobytes())
+        if algorithm == 'VoidFinder' and 'holes' in self._params:
+            for name in HoleSphereIndex.STATE_ARRAYS:
+                digest.update(np.ascontiguousarray(self._arrays[f"holes.{name}"]).tobytes())
+            digest.update(json.dumps(self._params['holes'], sort_keys=True).encode())
+        return digest.hexdigest()
+
+    # --- Shared memory ---
+
+    def publish(self):
+        """
+        Copies every array into one shared-memory block.
+
+        Returns:
+            dict: A small picklable handle for `VoidCatalog.attach()`. The publishing
+                  catalog keeps the block alive; call `unlink()` when all workers are done.
+        """
+        layout = {}
+        offset = 0
+        for name, array in self._arrays.items():
+            offset = -(-offset // _ALIGNMENT) * _ALIGNMENT
+            layout[name] = {
+                'offset': offset,
+                'dtype': np.lib.format.dtype_to_descr(array.dtype),
+                'shape': list(array.shape),
+            }
+            offset += array.nbytes
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        published = {}
+        for name, array in self._arrays.items():
+            view = _view(self._shm, layout[name])
+            view[...] = array
+            published[name] = view
+        self._arrays = published
+        return {'shm_name': self._shm.name, 'layout': layout, 'params': self._params}
+
+    @classmethod
+    def attach(cls, handle):
+        """Attaches to a published catalog; all arrays are read-only views, nothing is copied."""
+        shm = _open_shared_memory(handle['shm_name'])
+        arrays = {}
+        for name, spec in handle['layout'].items():
+            view = _view(shm, spec)
+            view.flags.writeable = False
+            arrays[name] = view
+        return cls(arrays, handle['params'], shm=shm)
+
+    def close(self):
+        """Detaches this process from the shared-memory block (if any)."""
+        if self._shm is not None:
+            self._arrays = {}
+            self._trees = {}
+            self._shm.close()
+
+    def unlink(self):
+        """Closes and destroys the shared-memory block; call once, from the publisher."""
+        if self._shm is not None:
+            shm = self._shm
+            self.close()
+            shm.unlink()
+            self._shm = None
+
+
+def build_hole_index(holes, voids):
+    """
+    Builds the union-of-holes index for VoidFinder, keyed by row within its void slice.
+
+    Holes are matched to their maximal void through (galactic_cap, original_void_index),
+    since MAXIMALS indices restart in each cap's file.
+
+    Args:
+        holes (pd.DataFrame): Output of `read_voidfinder_holes()`.
+        voids (np.ndarray): Sorted VOID_DTYPE records for all algorithms.
+
+    Returns:
+        HoleSphereIndex: The built index.
+    """
+    voidfinder = voids[voids['algorithm'] == ALGORITHMS.index('VoidFinder')]
+    cap_codes = holes['galactic_cap'].map({c: i for i, c in enumerate(GALACTIC_CAPS)}).to_numpy()
+
+    # Composite (cap, index) keys joined with a single sorted lookup.
+    void_keys = voidfinder['galactic_cap'].astype(np.int64) << 40 | voidfinder['original_void_index']
+    hole_keys = cap_codes.astype(np.int64) << 40 | holes['void'].to_numpy()
+    order = np.argsort(void_keys)
+    pos = np.minimum(np.searchsorted(void_keys[order], hole_keys), max(len(order) - 1, 0))
+    matched = (void_keys[order][pos] == hole_keys) if len(order) else np.zeros(len(holes), dtype=bool)
+    if not matched.all():
+        logging.warning(f"⚠️ {(~matched).sum():,} VoidFinder holes have no matching maximal void")
+
+    return HoleSphereIndex(
+        holes.loc[matched, ['x', 'y', 'z']].to_numpy(),
+        holes.loc[matched, 'radius'].to_numpy(),
+        order[pos[matched]]
+    )
+
+
+def _view(shm, spec):
+    dtype = np.lib.format.descr_to_dtype(spec['dtype'])
+    return np.ndarray(tuple(spec['shape']), dtype=dtype, buffer=shm.buf, offset=spec['offset'])
+
+
+def _open_shared_memory(name):
+    # Attaching must not hand the block to the resource tracker, or an unrelated process
+    # exiting could unlink it. Python >= 3.13 exposes this directly; on older versions pool
+    # workers share the publisher's tracker, so a duplicate registration is harmless.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
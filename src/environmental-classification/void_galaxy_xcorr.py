@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+#
+# =================================================================================================
+#
+# File: void_galaxy_xcorr.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Void-galaxy cross-correlation function xi_vg(r) for each DESIVAST algorithm, as a
+#   robustness check on the membership-based analysis.
+#
+#   Pair counts use dual-tree `cKDTree.count_neighbors` over all radial bins at once rather
+#   than brute-force distances. Galaxies (and galaxy randoms) are sharded by HEALPix pixel
+#   and each shard is counted against the small void and void-random trees in a process pool;
+#   pair counts are additive, so the shard sums are exact.
+#
+#   Random catalogs follow the survey selection by construction ("shuffled" randoms):
+#     - galaxy randoms pair the line of sight of one random galaxy with the comoving distance
+#       of another, reproducing both the angular footprint and n(z);
+#     - void randoms pair random galaxy lines of sight with the distances of the voids.
+#   The cross-correlation is the Landy-Szalay estimator
+#       xi = (DvDg - DvRg - RvDg + RvRg) / RvRg
+#   with every pair count normalised by the product of its catalog sizes.
+#
+# =================================================================================================
+#
+
+import argparse
+import logging
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from classify_galaxy_environment import VOLLIM_Z_MAX, VOLLIM_Z_MIN, galaxy_cartesian, load_galaxies
+from environment_db import ALGORITHMS, copy_dataframe, open_connection
+from void_catalog import VoidCatalog
+
+# --- SCRIPT CONFIGURATION ---
+OUTPUT_TABLE = "science_analysis.void_galaxy_xcorr"
+
+XCORR_R_MAX = 120.0
+XCORR_BINS = 24
+
+# Random catalog sizes relative to the data catalogs. Voids are few, so their randoms can be
+# dense; galaxy randoms dominate the cost of the pair counts.
+GALAXY_RANDOM_FACTOR = 2
+VOID_RANDOM_FACTOR = 20
+RANDOM_SEED = 20250818
+
+PAIR_TERMS = ('dd', 'dr', 'rd', 'rr')
+
+OUTPUT_TABLE_DDL = f"""
+CREATE SCHEMA IF NOT EXISTS science_analysis;
+CREATE TABLE IF NOT EXISTS {OUTPUT_TABLE} (
+    algorithm VARCHAR(20) NOT NULL,
+    r_lo REAL NOT NULL,
+    r_hi REAL NOT NULL,
+    dd DOUBLE PRECISION NOT NULL,
+    dr DOUBLE PRECISION NOT NULL,
+    rd DOUBLE PRECISION NOT NULL,
+    rr DOUBLE PRECISION NOT NULL,
+    xi REAL,
+    PRIMARY KEY (algorithm, r_lo)
+);
+"""
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+
+
+# --- RANDOM CATALOGS ---
+
+def shuffled_randoms(sight_xyz, distances, n_randoms, rng):
+    """
+    Draws random points on the survey's lines of sight at the given comoving distances.
+
+    Args:
+        sight_xyz (np.ndarray): (N, 3) positions whose directions define the footprint.
+        distances (np.ndarray): (M,) comoving distances defining the radial distribution.
+        n_randoms (int): Number of random points.
+        rng (np.random.Generator): Random number generator.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (n_randoms, 3) positions and the row of
+            `sight_xyz` each direction was taken from.
+    """
+    sight = rng.integers(len(sight_xyz), size=n_randoms)
+    direction = sight_xyz[sight] / np.linalg.norm(sight_xyz[sight], axis=1)[:, None]
+    radius = distances[rng.integers(len(distances), size=n_randoms)]
+    return direction * radius[:, None], sight
+
+
+# --- PAIR COUNTING ---
+
+_WORKER_VOID_TREES = None
+
+
+def _init_worker(void_sets, edges):
+    """Pool initializer: build the (small) void and void-random trees once per worker."""
+    global _WORKER_VOID_TREES
+    _WORKER_VOID_TREES = build_void_trees(void_sets), edges
+
+
+def build_void_trees(void_sets):
+    """Builds (data, random) trees over the void centres of every algorithm."""
+    return {algorithm: (cKDTree(voids), cKDTree(randoms)) for algorithm, (voids, randoms) in void_sets.items()}
+
+
+def binned_pairs(tree, other, edges):
+    """Pair counts between two trees in each radial bin (edges[i], edges[i + 1]], as count_neighbors counts d <= r."""
+    cumulative = tree.count_neighbors(other, edges).astype(np.float64)
+    return np.diff(cumulative)
+
+
+def count_shard(galaxy_xyz, random_xyz, void_trees, edges):
+    """
+    Counts the four cross-pair terms for one shard of galaxies and galaxy randoms.
+
+    Returns:
+        Dict[str, Dict[str, np.ndarray]]: Per algorithm, binned 'dd', 'dr', 'rd' and 'rr'
+            (void data/random x galaxy data/random) pair counts.
+    """
+    galaxy_tree = cKDTree(galaxy_xyz)
+    random_tree = cKDTree(random_xyz)
+    counts = {}
+    for algorithm, (void_tree, void_random_tree) in void_trees.items():
+        counts[algorithm] = {
+            'dd': binned_pairs(void_tree, galaxy_tree, edges),
+            'dr': binned_pairs(void_tree, random_tree, edges),
+            'rd': binned_pairs(void_random_tree, galaxy_tree, edges),
+            'rr': binned_pairs(void_random_tree, random_tree, edges),
+        }
+    return counts
+
+
+def _count_shard_task(task):
+    galaxy_xyz, random_xyz = task
+    void_trees, edges = _WORKER_VOID_TREES
+    return count_shard(galaxy_xyz, random_xyz, void_trees, edges)
+
+
+def count_all_pairs(galaxy_xyz, galaxy_shards, random_xyz, random_shards, void_sets, edges, n_workers):
+    """
+    Sums the pair counts of every shard, in a process pool when `n_workers` > 1.
+
+    Args:
+        galaxy_xyz, random_xyz (np.ndarray): Galaxy and galaxy-random positions.
+        galaxy_shards, random_shards (np.ndarray): Shard (HEALPix) id of each point.
+        void_sets (Dict[str, Tuple[np.ndarray, np.ndarray]]): Void and void-random centres.
+        edges (np.ndarray): Radial bin edges in Mpc/h.
+        n_workers (int): Number of worker processes.
+
+    Returns:
+        Dict[str, Dict[str, np.ndarray]]: Total binned pair counts per algorithm and term.
+    """
+    galaxy_rows = pd.Series(galaxy_shards).groupby(galaxy_shards).indices
+    random_rows = pd.Series(random_shards).groupby(random_shards).indices
+    shards = sorted(set(galaxy_rows) | set(random_rows),
+                    key=lambda shard: len(galaxy_rows.get(shard, [])) + len(random_rows.get(shard, [])),
+                    reverse=True)
+    empty = np.array([], dtype=np.int64)
+    tasks = ((galaxy_xyz[galaxy_rows.get(shard, empty)], random_xyz[random_rows.get(shard, empty)])
+             for shard in shards)
+
+    totals = {algorithm: {term: np.zeros(len(edges) - 1) for term in PAIR_TERMS} for algorithm in void_sets}
+    if n_workers <= 1:
+        void_trees = build_void_trees(void_sets)
+        results = (count_shard(galaxy, random, void_trees, edges) for galaxy, random in tasks)
+        for counts in results:
+            _accumulate(totals, counts)
+    else:
+        with Pool(n_workers, initializer=_init_worker, initargs=(void_sets, edges)) as pool:
+            for counts in pool.imap_unordered(_count_shard_task, tasks):
+                _accumulate(totals, counts)
+    return totals
+
+
+def _accumulate(totals, counts):
+    for algorithm, terms in counts.items():
+        for term, values in terms.items():
+            totals[algorithm][term] += values
+
+
+def landy_szalay(counts, n_void, n_void_random, n_galaxy, n_galaxy_random):
+    """
+    Landy-Szalay cross-correlation estimate from raw binned pair counts.
+
+    Returns:
+        np.ndarray: xi(r) per bin, NaN where the random-random count is zero.
+    """
+    dd = counts['dd'] / (n_void * n_galaxy)
+    dr = counts['dr'] / (n_void * n_galaxy_random)
+    rd = counts['rd'] / (n_void_random * n_galaxy)
+    rr = counts['rr'] / (n_void_random * n_galaxy_random)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(rr > 0, (dd - dr - rd + rr) / rr, np.nan)
+
+
+# --- MAIN EXECUTION ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Void-galaxy cross-correlation with tree-based pair counts.")
+    parser.add_argument('--algorithms', nargs='+', choices=ALGORITHMS, default=ALGORITHMS,
+                        help="Void-finding algorithms to correlate (default: all four).")
+    parser.add_argument('--r-max', type=float, default=XCORR_R_MAX, help="Maximum separation in Mpc/h.")
+    parser.add_argument('--bins', type=int, default=XCORR_BINS, help="Number of separation bins.")
+    parser.add_argument('--z-min', type=float, default=VOLLIM_Z_MIN, help="Minimum galaxy redshift.")
+    parser.add_argument('--z-max', type=float, default=VOLLIM_Z_MAX, help="Maximum galaxy redshift.")
+    parser.add_argument('--galaxy-randoms', type=float, default=GALAXY_RANDOM_FACTOR,
+                        help="Galaxy randoms per galaxy.")
+    parser.add_argument('--void-randoms', type=float, default=VOID_RANDOM_FACTOR, help="Void randoms per void.")
+    parser.add_argument('--seed', type=int, default=RANDOM_SEED, help="Seed for the random catalogs.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help="Worker processes for the HEALPix shards (default: all cores; 1 runs in-process).")
+    parser.add_argument('--dry-run', action='store_true', help="Compute xi but do not write to the database.")
+    args = parser.parse_args()
+
+    logging.info("🔗 STARTING VOID-GALAXY CROSS-CORRELATION")
+    total_start = time.time()
+    edges = np.linspace(0.0, args.r_max, args.bins + 1)
+    rng = np.random.default_rng(args.seed)
+
+    void_conn = open_connection('dbname_desivast')
+    try:
+        catalog = VoidCatalog.from_database(void_conn)
+    finally:
+        void_conn.close()
+
+    galaxy_conn = open_connection('dbname_fastspecfit')
+    try:
+        galaxies = load_galaxies(galaxy_conn, args.z_min, args.z_max)
+        galaxy_xyz = galaxy_cartesian(galaxies)
+        galaxy_shards = galaxies['healpix_id'].to_numpy()
+        galaxy_distance = np.linalg.norm(galaxy_xyz, axis=1)
+
+        random_xyz, sight = shuffled_randoms(galaxy_xyz, galaxy_distance,
+                                             int(args.galaxy_randoms * len(galaxies)), rng)
+        random_shards = galaxy_shards[sight]
+        logging.info(f"Built {len(random_xyz):,} galaxy randoms for {len(galaxies):,} galaxies")
+
+        void_sets = {}
+        for algorithm in args.algorithms:
+            void_xyz = catalog.void_xyz(algorithm)
+            if len(void_xyz) == 0:
+                logging.warning(f"⚠️ No {algorithm} voids found: skipping")
+                continue
+            void_random_xyz, _ = shuffled_randoms(galaxy_xyz, np.linalg.norm(void_xyz, axis=1),
+                                                  int(args.void_randoms * len(void_xyz)), rng)
+            void_sets[algorithm] = (void_xyz, void_random_xyz)
+        if not void_sets:
+            return 1
+
+        start = time.time()
+        totals = count_all_pairs(galaxy_xyz, galaxy_shards, random_xyz, random_shards, void_sets, edges,
+                                 args.workers)
+        logging.info(f"Pair counts for {len(void_sets)} algorithm(s) finished in {time.time() - start:.1f} s "
+                     f"with {args.workers} worker(s)")
+
+        frames = []
+        for algorithm, (void_xyz, void_random_xyz) in void_sets.items():
+            counts = totals[algorithm]
+            frames.append(pd.DataFrame({
+                'algorithm': algorithm,
+                'r_lo': edges[:-1],
+                'r_hi': edges[1:],
+                **counts,
+                'xi': landy_szalay(counts, len(void_xyz), len(void_random_xyz), len(galaxy_xyz), len(random_xyz)),
+            }))
+        df = pd.concat(frames, ignore_index=True)
+
+        if args.dry_run:
+            logging.info(f"  [DRY RUN] Would COPY {len(df):,} rows into '{OUTPUT_TABLE}'")
+        else:
+            try:
+                with galaxy_conn.cursor() as cursor:
+                    cursor.execute(OUTPUT_TABLE_DDL)
+                    cursor.execute(f"DELETE FROM {OUTPUT_TABLE} WHERE algorithm = ANY(%s)", (list(void_sets),))
+                    copy_dataframe(cursor, df, OUTPUT_TABLE)
+                galaxy_conn.commit()
+                logging.info(f"✅ Wrote {len(df):,} xi rows to {OUTPUT_TABLE}")
+            except Exception as error:
+                logging.error(f"❌ Error writing cross-correlation: {error}")
+                galaxy_conn.rollback()
+                return 1
+    finally:
+        galaxy_conn.close()
+
+    logging.info(f"Cross-correlation finished in {(time.time() - total_start) / 60:.2f} minutes.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
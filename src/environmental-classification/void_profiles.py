@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+#
+# =================================================================================================
+#
+# File: void_profiles.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Stacked void radial profiles: galaxy number density, median stellar mass and median
+#   specific star formation rate as a function of r / R_eff, stacked over every void of each
+#   DESIVAST algorithm.
+#
+#   Looping over voids and measuring distances to every galaxy is O(N_void x N_galaxy). Here
+#   a single `cKDTree` over the galaxies answers a batch of voids at once with
+#   `query_ball_point` (each void searched out to r_max x R_eff), the (void, galaxy) pairs are
+#   flattened with `np.repeat`, and every reduction is a `np.bincount`:
+#     - galaxy counts per radial bin;
+#     - a 2D (radial bin x property bin) histogram per property, from which medians and
+#       percentiles are read off the cumulative distribution.
+#   Histograms are additive, so void batches are accumulated with bounded memory and the
+#   medians are exact to the property bin width (0.01 dex).
+#
+#   Void radii are the effective radii used by the classifier, `COALESCE(r_eff, radius_mpc_h)`.
+#
+# =================================================================================================
+#
+
+import argparse
+import logging
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from classify_galaxy_environment import VOLLIM_Z_MAX, VOLLIM_Z_MIN, galaxy_cartesian
+from environment_db import ALGORITHMS, GALAXY_TABLE, copy_dataframe, fetch_dataframe, open_connection
+from void_catalog import VoidCatalog
+
+# --- SCRIPT CONFIGURATION ---
+OUTPUT_TABLE = "science_analysis.void_radial_profiles"
+
+PROFILE_R_MAX = 3.0
+PROFILE_BINS = 30
+
+# Property histograms: (low edge, high edge, bin width) in dex.
+PROPERTY_GRIDS = {
+    'logmstar': (6.0, 13.0, 0.01),
+    'log_ssfr': (-14.0, -7.0, 0.01),
+}
+PROFILE_QUANTILES = {'p16': 0.16, 'median': 0.5, 'p84': 0.84}
+
+# Voids answered per `query_ball_point` batch; bounds the flattened pair arrays.
+VOID_BATCH_SIZE = 500
+
+OUTPUT_TABLE_DDL = f"""
+CREATE SCHEMA IF NOT EXISTS science_analysis;
+CREATE TABLE IF NOT EXISTS {OUTPUT_TABLE} (
+    algorithm VARCHAR(20) NOT NULL,
+    r_lo REAL NOT NULL,
+    r_hi REAL NOT NULL,
+    n_voids INTEGER NOT NULL,
+    n_galaxies BIGINT NOT NULL,
+    number_density_h3_mpc3 REAL NOT NULL,
+    logmstar_p16 REAL,
+    logmstar_median REAL,
+    logmstar_p84 REAL,
+    log_ssfr_p16 REAL,
+    log_ssfr_median REAL,
+    log_ssfr_p84 REAL,
+    PRIMARY KEY (algorithm, r_lo)
+);
+"""
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+
+
+# --- PROPERTY BINNING ---
+
+def log_ssfr(sfr, logmstar):
+    """Returns log10(SFR / M*) in yr^-1; NaN where SFR is not positive."""
+    sfr = np.asarray(sfr, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(sfr > 0, np.log10(sfr), np.nan) - np.asarray(logmstar, dtype=np.float64)
+
+
+def property_bin(values, grid):
+    """
+    Maps values onto a PROPERTY_GRIDS grid; NaN values map to -1.
+
+    Values beyond the grid are clipped into the end bins rather than dropped, so they still
+    count towards the quantiles of every radial bin.
+    """
+    lo, hi, step = grid
+    n_bins = int(round((hi - lo) / step))
+    with np.errstate(invalid='ignore'):
+        idx = np.floor((np.asarray(values, dtype=np.float64) - lo) / step)
+    valid = np.isfinite(idx)
+    return np.where(valid, np.clip(np.nan_to_num(idx), 0, n_bins - 1), -1).astype(np.int64)
+
+
+def histogram_quantile(hist, grid, q):
+    """
+    Reads a quantile off each row of a binned histogram.
+
+    Args:
+        hist (np.ndarray): (R, P) counts per radial bin and property bin.
+        grid (tuple): The property's (low, high, width) grid.
+        q (float): Quantile in [0, 1].
+
+    Returns:
+        np.ndarray: (R,) quantile at the bin centre, NaN for empty rows.
+    """
+    lo, _, step = grid
+    cdf = np.cumsum(hist, axis=1)
+    total = cdf[:, -1]
+    # First bin whose cumulative count reaches q of the total, for every row at once.
+    idx = (cdf < (q * total)[:, None]).sum(axis=1)
+    values = lo + (np.minimum(idx, hist.shape[1] - 1) + 0.5) * step
+    return np.where(total > 0, values, np.nan)
+
+
+# --- STACKING ENGINE ---
+
+def stack_profiles(galaxy_tree, property_bins, void_xyz, void_radius, edges,
+                   batch_size=VOID_BATCH_SIZE, workers=-1):
+    """
+    Accumulates stacked radial counts and property histograms over a set of voids.
+
+    Args:
+        galaxy_tree (cKDTree): Tree over galaxy positions (Mpc/h).
+        property_bins (Dict[str, np.ndarray]): Per-galaxy property bin index (-1 = missing).
+        void_xyz (np.ndarray): (M, 3) void centres.
+        void_radius (np.ndarray): (M,) void effective radii.
+        edges (np.ndarray): Radial bin edges in units of R_eff.
+        batch_size (int): Voids per batched tree query.
+        workers (int): Threads used by the tree query.
+
+    Returns:
+        Tuple[np.ndarray, Dict[str, np.ndarray]]: Galaxy counts per radial bin and a
+            (radial bin x property bin) histogram per property.
+    """
+    galaxy_xyz = galaxy_tree.data
+    n_radial = len(edges) - 1
+    counts = np.zeros(n_radial, dtype=np.int64)
+    hists = {name: np.zeros((n_radial, int(round((hi - lo) / step))), dtype=np.int64)
+             for name, (lo, hi, step) in PROPERTY_GRIDS.items()}
+
+    for start in range(0, len(void_xyz), batch_size):
+        centres = void_xyz[start:start + batch_size]
+        radii = void_radius[start:start + batch_size]
+        neighbours = galaxy_tree.query_ball_point(centres, r=edges[-1] * radii, workers=workers,
+                                                  return_sorted=False)
+
+        # Flatten the ragged neighbour lists into (void, galaxy) pairs.
+        lengths = np.fromiter((len(n) for n in neighbours), dtype=np.int64, count=len(neighbours))
+        if lengths.sum() == 0:
+            continue
+        pair_void = np.repeat(np.arange(len(centres)), lengths)
+        pair_galaxy = np.concatenate([np.asarray(n, dtype=np.int64) for n in neighbours])
+
+        r_scaled = np.linalg.norm(galaxy_xyz[pair_galaxy] - centres[pair_void], axis=1) / radii[pair_void]
+        radial_bin = np.searchsorted(edges, r_scaled, side='right') - 1
+        keep = (radial_bin >= 0) & (radial_bin < n_radial)
+        radial_bin, pair_galaxy = radial_bin[keep], pair_galaxy[keep]
+
+        counts += np.bincount(radial_bin, minlength=n_radial)
+        for name, hist in hists.items():
+            prop = property_bins[name][pair_galaxy]
+            ok = prop >= 0
+            n_prop = hist.shape[1]
+            hist += np.bincount(radial_bin[ok] * n_prop + prop[ok], minlength=hist.size).reshape(hist.shape)
+
+    return counts, hists
+
+
+def build_profile_frame(algorithm, edges, void_radius, counts, hists):
+    """Converts stacked counts and histograms into rows for the output table."""
+    # Volume of each stacked shell, summed over voids: (4/3) pi R^3 (r_hi^3 - r_lo^3).
+    shell_volume = 4.0 / 3.0 * np.pi * np.sum(void_radius ** 3) * np.diff(edges ** 3)
+    df = pd.DataFrame({
+        'algorithm': algorithm,
+        'r_lo': edges[:-1],
+        'r_hi': edges[1:],
+        'n_voids': len(void_radius),
+        'n_galaxies': counts,
+        'number_density_h3_mpc3': counts / shell_volume,
+    })
+    for name, hist in hists.items():
+        for label, q in PROFILE_QUANTILES.items():
+            df[f"{name}_{label}"] = histogram_quantile(hist, PROPERTY_GRIDS[name], q)
+    return df
+
+
+# --- DATA LOADING ---
+
+def load_galaxies(conn, z_min, z_max):
+    """Loads galaxy positions and the properties that are profiled."""
+    query = (
+        f"SELECT targetid, ra, dec, z, x_mpc_h, y_mpc_h, z_mpc_h, logmstar, sfr FROM {GALAXY_TABLE} "
+        f"WHERE z >= %s AND z <= %s"
+    )
+    return fetch_dataframe(conn, query, params=(z_min, z_max), dtype={'targetid': np.int64})
+
+
+# --- MAIN EXECUTION ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Stacked radial profiles of DESIVAST voids.")
+    parser.add_argument('--algorithms', nargs='+', choices=ALGORITHMS, default=ALGORITHMS,
+                        help="Void-finding algorithms to stack (default: all four).")
+    parser.add_argument('--r-max', type=float, default=PROFILE_R_MAX, help="Outer profile radius in units of R_eff.")
+    parser.add_argument('--bins', type=int, default=PROFILE_BINS, help="Number of radial bins.")
+    parser.add_argument('--z-min', type=float, default=VOLLIM_Z_MIN, help="Minimum galaxy redshift.")
+    parser.add_argument('--z-max', type=float, default=VOLLIM_Z_MAX, help="Maximum galaxy redshift.")
+    parser.add_argument('--workers', type=int, default=-1, help="Threads for tree queries (default: all cores).")
+    parser.add_argument('--dry-run', action='store_true', help="Compute profiles but do not write to the database.")
+    args = parser.parse_args()
+
+    logging.info("📈 STARTING STACKED VOID RADIAL PROFILES")
+    total_start = time.time()
+    edges = np.linspace(0.0, args.r_max, args.bins + 1)
+
+    void_conn = open_connection('dbname_desivast')
+    try:
+        catalog = VoidCatalog.from_database(void_conn)
+    finally:
+        void_conn.close()
+
+    galaxy_conn = open_connection('dbname_fastspecfit')
+    try:
+        galaxies = load_galaxies(galaxy_conn, args.z_min, args.z_max)
+        galaxy_tree = cKDTree(galaxy_cartesian(galaxies))
+        property_bins = {
+            'logmstar': property_bin(galaxies['logmstar'], PROPERTY_GRIDS['logmstar']),
+            'log_ssfr': property_bin(log_ssfr(galaxies['sfr'], galaxies['logmstar']), PROPERTY_GRIDS['log_ssfr']),
+        }
+        logging.info(f"Galaxy tree built over {len(galaxies):,} galaxies")
+
+        frames = []
+        for algorithm in args.algorithms:
+            voids = catalog.voids(algorithm)
+            if len(voids) == 0:
+                logging.warning(f"⚠️ No {algorithm} voids found: skipping")
+                continue
+            start = time.time()
+            counts, hists = stack_profiles(galaxy_tree, property_bins, catalog.void_xyz(algorithm),
+                                           voids['radius'], edges, workers=args.workers)
+            frames.append(build_profile_frame(algorithm, edges, voids['radius'], counts, hists))
+            logging.info(f"{algorithm}: stacked {len(voids):,} voids ({counts.sum():,} galaxy-void pairs) "
+                         f"in {time.time() - start:.1f} s")
+
+        if not frames:
+            return 1
+        df = pd.concat(frames, ignore_index=True)
+        if args.dry_run:
+            logging.info(f"  [DRY RUN] Would COPY {len(df):,} rows into '{OUTPUT_TABLE}'")
+        else:
+            try:
+                with galaxy_conn.cursor() as cursor:
+                    cursor.execute(OUTPUT_TABLE_DDL)
+                    cursor.execute(f"DELETE FROM {OUTPUT_TABLE} WHERE algorithm = ANY(%s)",
+                                   (list(df['algorithm'].unique()),))
+                    copy_dataframe(cursor, df, OUTPUT_TABLE)
+                galaxy_conn.commit()
+                logging.info(f"✅ Wrote {len(df):,} profile rows to {OUTPUT_TABLE}")
+            except Exception as error:
+                logging.error(f"❌ Error writing profiles: {error}")
+                galaxy_conn.rollback()
+                return 1
+    finally:
+        galaxy_conn.close()
+
+    logging.info(f"Void profiles finished in {time.time() - total_start:.1f} seconds.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+#
+# =================================================================================================
+#
+# File: zone_membership.py
+#
+# Author: VintageDon https://github.com/vintagedon/
+# Repository: https://github.com/Pxomox-Astronomy-Lab/desi-cosmic-void-galaxies
+#
+# Description:
+#   Exact galaxy-to-void membership for the V2 void finders (REVOLVER, VIDE, ZOBOV). These
+#   catalogs are built from a watershed over the galaxy tessellation, so membership is not a
+#   geometric question at all: it is already encoded in two HDUs of every V2 file:
+#     [2] BinTableHDU 'ZONEVOID' - ZONE, VOID0, VOID1    (zone -> void)
+#     [3] BinTableHDU 'GALZONE'  - TARGET, GAL, ZONE, ... (galaxy -> zone)
+#
+#   This script resolves galaxy -> zone -> void with sort/`searchsorted` joins in NumPy,
+#   cross-matches each galaxy's TARGET id against `fastspecfit_galaxies.targetid` the same
+#   way, maps the FITS void index to the database `void_id`, and bulk-loads the result into
+#   `science_analysis.zone_void_membership` with `COPY`. No spatial computation is involved,
+#   so all three algorithms and both caps complete in seconds.
+#
+#   A galaxy is assigned to VOID0, the void its zone belongs to at the lowest level of the
+#   watershed hierarchy, which is the void listed in the VOIDS HDU.
+#
+# =================================================================================================
+#
+
+import argparse
+import configparser
+import logging
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from astropy.io import fits
+
+from environment_db import GALAXY_TABLE, VOID_TABLE, copy_dataframe, fetch_dataframe, nullable_int, open_connection
+
+# --- SCRIPT CONFIGURATION ---
+OUTPUT_TABLE = "science_analysis.zone_void_membership"
+
+V2_ALGORITHMS = ["REVOLVER", "VIDE", "ZOBOV"]
+V2_FILE_TEMPLATE = "DESIVAST_BGS_VOLLIM_V2_{algorithm}_{cap}.fits"
+GALACTIC_CAPS = ["NGC", "SGC"]
+OUTPUT_COLUMNS = ['targetid', 'algorithm', 'galactic_cap', 'zone', 'void_id', 'original_void_index',
+                  'edge_flag', 'out_flag']
+
+OUTPUT_TABLE_DDL = f"""
+CREATE SCHEMA IF NOT EXISTS science_analysis;
+CREATE TABLE IF NOT EXISTS {OUTPUT_TABLE} (
+    targetid BIGINT NOT NULL,
+    algorithm VARCHAR(20) NOT NULL,
+    galactic_cap VARCHAR(3) NOT NULL,
+    zone BIGINT NOT NULL,
+    void_id INTEGER,
+    original_void_index BIGINT,
+    edge_flag INTEGER,
+    out_flag INTEGER,
+    PRIMARY KEY (targetid, algorithm)
+);
+"""
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    stream=sys.stdout
+)
+
+
+# --- VECTORIZED JOINS ---
+
+def lookup_sorted(keys, values, queries, missing=-1):
+    """
+    Vectorized dictionary lookup: returns `values[keys == q]` for every query.
+
+    `keys` are sorted once and every query is located with a single binary search, so a
+    join of millions of rows against thousands of keys is O((N + M) log M) with no Python
+    loop. Keys are assumed unique.
+
+    Args:
+        keys (np.ndarray): (M,) lookup keys.
+        values (np.ndarray): (M,) values associated with each key.
+        queries (np.ndarray): (N,) keys to look up.
+        missing: Value returned for queries not present in `keys`.
+
+    Returns:
+        np.ndarray: (N,) looked-up values.
+    """
+    keys = np.asarray(keys)
+    values = np.asarray(values)
+    queries = np.asarray(queries)
+    result = np.full(len(queries), missing, dtype=values.dtype)
+    if len(keys) == 0:
+        return result
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    pos = np.minimum(np.searchsorted(sorted_keys, queries), len(sorted_keys) - 1)
+    found = sorted_keys[pos] == queries
+    result[found] = values[order[pos[found]]]
+    return result
+
+
+def resolve_membership(galzone, zonevoid):
+    """
+    Resolves galaxy -> zone -> void for one V2 catalog file.
+
+    Args:
+        galzone (pd.DataFrame): GALZONE rows with 'target', 'zone', 'edge' and 'out' columns.
+        zonevoid (pd.DataFrame): ZONEVOID rows with 'zone' and 'void0' columns.
+
+    Returns:
+        pd.DataFrame: Galaxies that belong to a zone, with the original void index of
+                      that zone (-1 if the zone is not part of any void).
+    """
+    in_zone = galzone['zone'].to_numpy() >= 0
+    members = galzone.loc[in_zone, ['target', 'zone', 'edge', 'out']].reset_index(drop=True)
+    members['void0'] = lookup_sorted(zonevoid['zone'].to_numpy(), zonevoid['void0'].to_numpy(),
+                                     members['zone'].to_numpy())
+    return members
+
+
+# --- DATA LOADING ---
+
+def read_zone_tables(path):
+    """Reads the GALZONE and ZONEVOID HDUs of a V2 void catalog file."""
+    with fits.open(path, memmap=True) as hdul:
+        galzone = hdul['GALZONE'].data
+        zonevoid = hdul['ZONEVOID'].data
+        galzone_df = pd.DataFrame({
+            'target': galzone['TARGET'].astype(np.int64),
+            'zone': galzone['ZONE'].astype(np.int64),
+            'edge': galzone['EDGE'].astype(np.int32),
+            'out': galzone['OUT'].astype(np.int32),
+        })
+        zonevoid_df = pd.DataFrame({
+            'zone': zonevoid['ZONE'].astype(np.int64),
+            'void0': zonevoid['VOID0'].astype(np.int64),
+        })
+    return galzone_df, zonevoid_df
+
+
+def build_algorithm_membership(data_dir, algorithm, targetids, voids):
+    """
+    Builds the membership rows for one algorithm across both galactic caps.
+
+    Args:
+        data_dir (Path): Directory containing the DESIVAST FITS files.
+        algorithm (str): One of the V2 algorithms.
+        targetids (np.ndarray): Sorted FastSpecFit TARGETIDs.
+        voids (pd.DataFrame): The algorithm's rows of the void table.
+
+    Returns:
+        pd.DataFrame: Rows ready for the output table.
+    """
+    if len(targetids) == 0:
+        logging.warning(f"⚠️ {algorithm}: {GALAXY_TABLE} is empty, no galaxies to cross-match")
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+
+    frames = []
+    for cap in GALACTIC_CAPS:
+        path = Path(data_dir) / V2_FILE_TEMPLATE.format(algorithm=algorithm, cap=cap)
+        galzone, zonevoid = read_zone_tables(path)
+        members = resolve_membership(galzone, zonevoid)
+
+        # Cross-match against the FastSpecFit catalog with a binary search on sorted TARGETIDs.
+        pos = np.minimum(np.searchsorted(targetids, members['target'].to_numpy()), len(targetids) - 1)
+        matched = targetids[pos] == members['target'].to_numpy()
+        if not matched.all():
+            logging.warning(f"⚠️ {algorithm} {cap}: {(~matched).sum():,} galaxies not found in {GALAXY_TABLE}")
+        members = members[matched]
+
+        cap_voids = voids[voids['galactic_cap'] == cap]
+        void_id = lookup_sorted(cap_voids['original_void_index'].to_numpy(), cap_voids['void_id'].to_numpy(),
+                                members['void0'].to_numpy())
+        in_void = members['void0'].to_numpy() >= 0
+
+        frames.append(pd.DataFrame({
+            'targetid': members['target'].to_numpy(),
+            'algorithm': algorithm,
+            'galactic_cap': cap,
+            'zone': members['zone'].to_numpy(),
+            'void_id': nullable_int(void_id, void_id >= 0),
+            'original_void_index': nullable_int(members['void0'].to_numpy(), in_void),
+            'edge_flag': members['edge'].to_numpy(),
+            'out_flag': members['out'].to_numpy(),
+        }))
+        logging.info(f"{algorithm} {cap}: {matched.sum():,} zone members, {in_void.sum():,} in voids")
+    return pd.concat(frames, ignore_index=True)
+
+
+# --- MAIN EXECUTION ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact V2 void membership from GALZONE/ZONEVOID HDUs.")
+    parser.add_argument('--algorithms', nargs='+', choices=V2_ALGORITHMS, default=V2_ALGORITHMS,
+                        help="V2 algorithms to process (default: all three).")
+    parser.add_argument('--desivast-dir', help="Directory of DESIVAST FITS files "
+                                               "(default: [paths] desivast_dir in config.ini).")
+    parser.add_argument('--dry-run', action='store_true', help="Build memberships but do not write to the database.")
+    args = parser.parse_args()
+
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    desivast_dir = args.desivast_dir or config.get('paths', 'desivast_dir', fallback=None)
+    if not desivast_dir:
+        logging.error("❌ No DESIVAST directory given (--desivast-dir or [paths] desivast_dir)")
+        return 1
+
+    logging.info("🧩 STARTING ZONE-BASED V2 VOID MEMBERSHIP")
+    total_start = time.time()
+
+    galaxy_conn = open_connection('dbname_fastspecfit')
+    void_conn = open_connection('dbname_desivast')
+    try:
+        targetids = np.sort(fetch_dataframe(galaxy_conn, f"SELECT targetid FROM {GALAXY_TABLE}",
+                                            dtype={'targetid': np.int64})['targetid'].to_numpy())
+
+        for algorithm in args.algorithms:
+            start = time.time()
+            voids = fetch_dataframe(
+                void_conn,
+                f"SELECT void_id, galactic_cap, original_void_index FROM {VOID_TABLE} WHERE algorithm = %s",
+                params=(algorithm,)
+            )
+            df = build_algorithm_membership(desivast_dir, algorithm, targetids, voids)
+            logging.info(f"{algorithm}: {len(df):,} membership rows built in {time.time() - start:.1f} s")
+
+            if args.dry_run:
+                logging.info(f"  [DRY RUN] Would COPY {len(df):,} rows into '{OUTPUT_TABLE}'")
+                continue
+            try:
+                with galaxy_conn.cursor() as cursor:
+                    cursor.execute(OUTPUT_TABLE_DDL)
+                    cursor.execute(f"DELETE FROM {OUTPUT_TABLE} WHERE algorithm = %s", (algorithm,))
+                    copy_dataframe(cursor, df, OUTPUT_TABLE)
+                galaxy_conn.commit()
+                logging.info(f"✅ Wrote {len(df):,} {algorithm} rows to {OUTPUT_TABLE}")
+            except Exception as error:
+                logging.error(f"❌ Error writing {algorithm} membership: {error}")
+                galaxy_conn.rollback()
+                return 1
+    finally:
+        galaxy_conn.close()
+        void_conn.close()
+
+    logging.info(f"Zone membership finished in {time.time() - total_start:.1f} seconds.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())